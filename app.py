@@ -3,13 +3,33 @@ import threading
 import requests
 import configparser
 import logging
-from flask import Flask, render_template, request, redirect, session, url_for, flash
-from model_utils import (
-    load_model, pdf_to_text, build_prompt, generate_output, get_id, insertar_bd, recalcular_version,
-    comprobar_existencia_submision, crear_submision, modificar_submision, buscar_en_bd, buscar_titulos_bd,
-    subir_nueva_version, buscar_versiones_bd, convertir_objectids, buscar_version_bd
+import json
+import zipfile
+from flask import Flask, Response, render_template, request, redirect, session, url_for, flash, jsonify
+from prompts import LLM_MODEL_NAME, CHECKLIST, build_prompt
+from submissions import (
+    get_id, insertar_bd,
+    comprobar_existencia_submision, crear_submision, modificar_submision, buscar_titulos_bd,
+    subir_nueva_version, buscar_historial_bd, convertir_objectids, buscar_version_bd, buscar_ultima_version
+)
+from database import asegurar_indices
+import model_client
+from orcid_client import url_autorizacion, obtener_token, revocar_token, ORCID_BASE
+from evidence import seleccionar_evidencia, estimar_tokens
+from incremental import calcular_huellas, preguntas_a_revisar, combinar_respuestas
+from per_question import modo_por_preguntas, revisar_por_preguntas
+from pdf_store import guardar_pdf, texto_pdf
+from text_normalization import normalizar_texto
+from review_cache import clave_cache, buscar_en_cache, guardar_en_cache
+from streaming import crear_emisor, suscribir
+from metrics import span, anotar, resumen_actual, exportar
+from bulk import crear_lote, obtener_lote, estado_lote_json, iniciar_lote, recuperar_lotes, archivos_de_zip, BULK_MAX_TOTAL_BYTES
+from pdf_extraction import PDF_MAX_BYTES
+from jobs import (
+    encolar_trabajo, obtener_trabajo, existe_trabajo_pendiente, estado_trabajo_json, iniciar_workers,
+    admitir_trabajo, estado_cola,
+    ESTADO_TERMINADO, ESTADO_FALLIDO
 )
-from datetime import datetime
 
 config = configparser.ConfigParser()
 config.read("properties.txt")
@@ -29,20 +49,71 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-# Cargar modelo
-model, tokenizer, model_name = load_model()
+# El modelo se carga en segundo plano (ver model_loader.py): las páginas que no lo usan se sirven desde el arranque.
+# Si hay un servidor de modelo configurado (model_server.py) este proceso no carga el modelo
+model_name = LLM_MODEL_NAME
+tokenizer = None
+
+# El motor de inferencia y la carga del modelo importan torch y transformers: solo se importan si el modelo
+# se carga en este proceso, no con un servidor de modelo ni en los procesos de extracción de PDFs (__mp_main__,
+# ver iniciar_servicio), que así arrancan sin cargar esas librerías
+if __name__ != "__mp_main__" and not model_client.usar_servidor():
+    from inference_engine import iniciar_motor, generar, generar_grupo
+    from model_loader import iniciar_carga, modelo_listo, estado_carga
+
+# Las configuraciones del Orcid se leen del archivo properties.txt en orcid_client.py
+
+# Submissions por página del historial y segundos que el navegador guarda los datos de una versión
+HISTORY_PAGE_SIZE = max(config.getint("FLASK", "history.page_size", fallback=20), 1)
+VERSION_CACHE_SECONDS = config.getint("FLASK", "history.version_cache_seconds", fallback=31536000)
+
+# Tamaño máximo de una petición: Flask rechaza con un 413 las más grandes antes de leerlas. Por defecto cabe
+# una revisión masiva completa (o un PDF) y 1 MB para el resto del formulario y la codificación multipart
+app.config["MAX_CONTENT_LENGTH"] = (
+    config.getint("FLASK", "app.max_content_length", fallback=0) or max(PDF_MAX_BYTES, BULK_MAX_TOTAL_BYTES) + 1024 * 1024
+)
+
+
+
+# Estado del modelo, ya sea el cargado en este proceso o el del servidor de modelo
+def estado_modelo():
+    return model_client.estado_servidor() if model_client.usar_servidor() else estado_carga()
+
+def modelo_disponible():
+    return model_client.servidor_listo() if model_client.usar_servidor() else modelo_listo()
+
+# Respuesta de las rutas que necesitan el modelo mientras todavía se está cargando
+def respuesta_calentando():
+    return render_template("cargando_modelo.html", estado=estado_modelo(), model_name=model_name), 503, {"Retry-After": "10"}
+
+# Respuesta de las subidas cuando la cola de revisiones está llena (ver jobs.admitir_trabajo):
+# 429 con la espera estimada en Retry-After
+def respuesta_cola_llena(plantilla, segundos, user, **contexto):
+    logger.warning(f"Cola de revisiones llena, se rechaza la subida de {user} (Retry-After {segundos} s)")
+    flash(f"The review queue is full, please try again in about {max(1, round(segundos / 60))} minute(s)", "error")
+    return (render_template(plantilla, model_name=model_name, cola=estado_cola(), **contexto), 429,
+            {"Retry-After": str(segundos)})
 
-json_total = ""
-json_total_bd = ""
-version = 1
+# Subida más grande que MAX_CONTENT_LENGTH
+@app.errorhandler(413)
+def subida_demasiado_grande(error):
+    return "The upload is too large", 413
 
-# Leemos las configuraciones del Orcid desde el archivo properties.txt para aumentar la seguridad
-CLIENT_ID = config["ORCID"]["orcid.client_id"]
-CLIENT_SECRET = config["ORCID"]["orcid.client_secret"]
-REDIRECT_URI = config["ORCID"]["orcid.redirect_uri"]
-ORCID_BASE = config["ORCID"]["orcid.base_url"]
+# SALUD DEL SERVICIO: el proceso está vivo
+@app.route("/health/live")
+def health_live():
+    return jsonify({"status": "alive"})
 
+# SALUD DEL SERVICIO: el modelo está cargado y listo para revisar
+@app.route("/health/ready")
+def health_ready():
+    estado = estado_modelo()
+    return jsonify(estado), (200 if estado["ready"] else 503)
 
+# MÉTRICAS DEL PROCESO en formato Prometheus (ver metrics.py)
+@app.route("/metrics")
+def metricas():
+    return Response(exportar(), mimetype="text/plain; version=0.0.4")
 
 # PANTALLA INICIAL
 @app.route("/")
@@ -62,6 +133,8 @@ def dashboard():
             return redirect(url_for("nueva_version"))
         if(action == "explorar_resultados"):    
             return redirect(url_for("ver_historial"))
+        if(action == "revision_masiva"):
+            return redirect(url_for("revision_masiva"))
     return render_template("menu.html")
 
 
@@ -70,38 +143,21 @@ def dashboard():
 def logout():
     token = session.get("orcid_token")
     
-    # Revocar el token de acceso en ORCID
+    # Revocar el token de acceso en ORCID (en segundo plano, ver orcid_client.py)
     if token:
-        try:
-            revoke_url = f"{ORCID_BASE}/oauth/revoke"
-            requests.post(
-                revoke_url,
-                data={
-                    "client_id": CLIENT_ID,
-                    "client_secret": CLIENT_SECRET,
-                    "token": token
-                },
-                headers={"Accept": "application/json"}
-            )
-        except Exception as e:
-            print(f"Error al revocar token: {e}")
+        revocar_token(token)
     
     # Limpiar los datos de la sesión localmente
     session.clear()
     
     # Renderizar página intermedia que hace logout en ORCID y redirige al home
-    return render_template("intermedio.html")
+    return render_template("intermedio.html", orcid_base=ORCID_BASE)
 
 # LOGIN
 @app.route("/login")
 def login():
     # Redirigir al usuario a la página de autorización de ORCID
-    auth_url = (
-        "https://orcid.org/oauth/authorize?"
-        f"client_id={CLIENT_ID}&response_type=code&scope=/authenticate"
-        f"&prompt=login&max_age=0&redirect_uri={REDIRECT_URI}"
-    )
-    return redirect(auth_url)
+    return redirect(url_autorizacion())
 
 # CALLBACK DE ORCID
 @app.route("/callback")
@@ -110,23 +166,20 @@ def callback():
     if not code:
         return "Error: no se recibió código de autenticación", 400
     # Intercambiar el código por un token de acceso
-    token_url = f"{ORCID_BASE}/oauth/token"
-    data = {
-        "client_id": CLIENT_ID,
-        "client_secret": CLIENT_SECRET,
-        "grant_type": "authorization_code",
-        "code": code,
-        "redirect_uri": REDIRECT_URI
-    }
-    headers = {"Accept": "application/json"}
-
-    response = requests.post(token_url, data=data, headers=headers)
+    try:
+        response = obtener_token(code)
+    except requests.RequestException as e:
+        logger.warning(f"ORCID no responde al pedir el token: {e}")
+        return "Error: ORCID no responde, inténtalo de nuevo más tarde", 504
     print("Token response:", response.text)
 
     try:
         token_data = response.json()
     except ValueError:
         return f"Error: respuesta no válida de ORCID: {response.text}", 500
+    # Código caducado o ya usado (p.ej. al recargar la página del callback)
+    if response.status_code != 200 or not token_data.get("orcid"):
+        return f"Error: ORCID no ha aceptado el código de autenticación: {response.text}", 400
 
     # Guardar en sesión lo importante
     session["orcid_token"] = token_data.get("access_token")
@@ -140,14 +193,14 @@ def callback():
 # NUEVA SUBMISIÓN
 @app.route("/nueva_submision", methods=['GET', 'POST'])
 def nueva_submission():
-    global json_total, version
     result = None
     mensaje = ""
     if "orcid_id" not in session:
         logging.warning("Intento de acceso a nueva_submision sin estar autenticado.")
         return redirect(url_for("home")) 
     user = session["orcid_id"]
-    id_submision = get_id()
+    if not modelo_disponible():
+        return respuesta_calentando()
 
     if request.method == "POST":
         uploaded_file = request.files.get("pdf")
@@ -158,38 +211,82 @@ def nueva_submission():
         if uploaded_file and uploaded_file.filename.endswith(".pdf"):
             if accion == "nueva_submision":
                 titulo = request.form.get("titulo")
-                version = 1
-                fecha = str(datetime.now()).split(".")[0]
-                # Comprobar si ya existe una sumisión con ese título para el usuario en el caso de existencia => error
-                if(comprobar_existencia_submision(titulo, user) == False):
-                    # Procesar el PDF y generar el output
-                    logger.info(f"Iniciando el procesamiento del PDF subido por {user} con título '{titulo}'")
-                    text = pdf_to_text(uploaded_file)
-                    messages = build_prompt(text)
-                    logger.info(f"Generado correctamente el prompt. Llamando al modelo para generar la salida'")
-                    result = generate_output(model, tokenizer, messages)
-                    logger.info(f"Salida generada correctamente por el modelo para la sumisión '{titulo}'")
-                    print("Creando nueva sumisión")
-                    # Crear el JSON completo y guardarlo en la base de datos
-                    json_total = crear_submision(titulo, user, id_submision)
-                    json_total = modificar_submision(json_total, version, result, fecha)
-                    logger.info(f"Insertando la sumisión '{titulo}' en la base de datos para el usuario {user}")
-                    insertar_bd(json_total)
-                    logger.info(f"Sumisión '{titulo}' insertada correctamente en la base de datos para el usuario {user}")
-                    print(json_total)
-                    json_total = convertir_objectids(json_total)
-                    print("JSON TOTAL CONVERTIDO:", json_total)
-                    # Mostrar los resultados en la pantalla
-                    logger.info(f"Sumisión '{titulo}' creada correctamente para el usuario {user}, mostrando resultados")
-                    return render_template("resultados.html", json_result=json_total)
+                # Comprobar si ya existe una sumisión (o una en proceso) con ese título para el usuario en el caso de existencia => error
+                if(comprobar_existencia_submision(titulo, user) == False and
+                   existe_trabajo_pendiente(titulo, user, "nueva_submision") == False):
+                    # Encolar el PDF para que lo procese un worker y mostrar la página de espera
+                    espera = admitir_trabajo()
+                    if espera is not None:
+                        return respuesta_cola_llena("new_submission.html", espera, user, result=result, mensaje=mensaje)
+                    logger.info(f"Encolando el PDF subido por {user} con título '{titulo}'")
+                    try:
+                        job_id = encolar_trabajo("nueva_submision", user, titulo, uploaded_file.read())
+                    except ValueError as e:
+                        logger.warning(f"PDF rechazado para el usuario {user}: {e}")
+                        flash(str(e), "error")
+                    else:
+                        return redirect(url_for("ver_trabajo", job_id=job_id))
                 else:
                     logger.warning(f"El usuario {user} ha intentado subir una sumisión con título '{titulo}' que ya existe.")
                     flash("That submission already exists, please try uploading a new version", "error")
-                print(json_total)
         else:
             mensaje = "Por favor, sube un archivo PDF válido."
 
-    return render_template("new_submission.html", result=result, model_name=model_name, mensaje=mensaje)
+    return render_template("new_submission.html", result=result, model_name=model_name, mensaje=mensaje, cola=estado_cola())
+
+# REVISIÓN MASIVA: varios PDFs o un ZIP, cada PDF es una nueva submission (ver bulk.py)
+@app.route("/bulk", methods=['GET', 'POST'])
+def revision_masiva():
+    mensaje = ""
+    if "orcid_id" not in session:
+        return redirect(url_for("home"))
+    user = session["orcid_id"]
+    if not modelo_disponible():
+        return respuesta_calentando()
+
+    if request.method == "POST":
+        archivos = []
+        try:
+            for uploaded_file in request.files.getlist("pdfs"):
+                nombre = uploaded_file.filename.lower()
+                if nombre.endswith(".zip"):
+                    archivos.extend(archivos_de_zip(uploaded_file.read()))
+                elif nombre.endswith(".pdf"):
+                    archivos.append((uploaded_file.filename, uploaded_file.read()))
+            # Cada PDF del lote cuenta como un trabajo más en la cola de revisiones
+            espera = admitir_trabajo(len(archivos)) if archivos else None
+            if espera:
+                return respuesta_cola_llena("new_bulk.html", espera, user, mensaje=mensaje)
+            run_id = crear_lote(user, archivos)
+        except (ValueError, zipfile.BadZipFile) as e:
+            logger.warning(f"Lote rechazado para el usuario {user}: {e}")
+            mensaje = "Please upload valid PDF or ZIP files." if isinstance(e, zipfile.BadZipFile) else str(e)
+        else:
+            # El lote se procesa en segundo plano, la página de progreso consulta su estado
+            iniciar_lote(run_id, generar_revision, contar_tokens)
+            return redirect(url_for("ver_lote", run_id=run_id))
+
+    return render_template("new_bulk.html", model_name=model_name, mensaje=mensaje)
+
+# PROGRESO DE UNA REVISIÓN MASIVA
+@app.route("/bulk/<run_id>")
+def ver_lote(run_id):
+    if "orcid_id" not in session:
+        return redirect(url_for("home"))
+    lote = obtener_lote(run_id)
+    if not lote or lote["id_user"] != session["orcid_id"]:
+        return f"Not found '{run_id}'", 404
+    return render_template("procesando_lote.html", lote=estado_lote_json(lote), model_name=model_name)
+
+# ESTADO DE UNA REVISIÓN MASIVA (consultado periódicamente por la página de progreso)
+@app.route("/bulk/<run_id>/estado")
+def estado_lote(run_id):
+    if "orcid_id" not in session:
+        return jsonify({"error": "No autenticado"}), 401
+    lote = obtener_lote(run_id)
+    if not lote or lote["id_user"] != session["orcid_id"]:
+        return jsonify({"error": "Not found"}), 404
+    return jsonify(estado_lote_json(lote))
 
 # NUEVA VERSIÓN - SELECCIÓN DE TÍTULO
 @app.route("/nueva_version", methods=['GET', 'POST'])
@@ -208,9 +305,10 @@ def ver_archivo(titulo):
     if "orcid_id" not in session:
         return redirect(url_for("home")) 
     user = session["orcid_id"]
-    doc = buscar_en_bd(titulo, user)
-    if not doc:
+    if not comprobar_existencia_submision(titulo, user):
         return f"Not found '{titulo}'", 404
+    if not modelo_disponible():
+        return respuesta_calentando()
 
     if request.method == "POST":
         uploaded_file = request.files.get("pdf")
@@ -222,51 +320,225 @@ def ver_archivo(titulo):
         # comprobar que se ha subido un archivo PDF válido
         if uploaded_file and uploaded_file.filename.endswith(".pdf"):
             if accion == "nueva_version":
-                # Actualizar la información de la nueva versión
-                version = recalcular_version(titulo, user)
-                fecha = str(datetime.now()).split(".")[0]
-                # Procesar el PDF y generar el output
-                text = pdf_to_text(uploaded_file)
-                messages = build_prompt(text)
-                result = generate_output(model, tokenizer, messages)
-                # Subir la nueva versión a la base de datos
-                subir_nueva_version(titulo, user, result, fecha, version)
-                json_data = buscar_version_bd(titulo, user, version)
-                json_data = convertir_objectids(json_data)
-                print("JSON de la nueva versión:", json_data)
-                # Mostrar los resultados en la pantalla
-                return render_template("resultados.html", json_result=json_data)
-
-    return render_template("index.html", model_name = model_name)
+                # Encolar el PDF, el número de versión se calcula cuando el worker termina
+                espera = admitir_trabajo()
+                if espera is not None:
+                    return respuesta_cola_llena("index.html", espera, user)
+                try:
+                    job_id = encolar_trabajo("nueva_version", user, titulo, uploaded_file.read())
+                except ValueError as e:
+                    logger.warning(f"PDF rechazado para el usuario {user}: {e}")
+                    flash(str(e), "error")
+                else:
+                    return redirect(url_for("ver_trabajo", job_id=job_id))
+
+    return render_template("index.html", model_name = model_name, cola=estado_cola())
+
+# Número de tokens de un texto según el tokenizador del modelo (estimado si el modelo está en otro proceso)
+def contar_tokens(texto):
+    if tokenizer is None:
+        return estimar_tokens(texto)
+    return len(tokenizer(texto, add_special_tokens=False).input_ids)
+
+# Generar la revisión con el motor local o con el servidor de modelo.
+# codigos (opcional) son las preguntas del checklist que pide el prompt, si no son todas
+def generar_revision(messages, on_text=None, codigos=None):
+    if model_client.usar_servidor():
+        return model_client.generate_output(messages, on_text=on_text, codigos=codigos)
+    return generar(tokenizer, messages, on_text=on_text, codigos=codigos)
+
+# Generar juntos los prompts de la revisión por preguntas (ver per_question.py), cada uno con sus preguntas.
+# Con el servidor de modelo no se publica el texto a medida que se genera
+def generar_grupo_revision(lista_messages, codigos_filas, max_tokens, callbacks=None, reintento=False):
+    if model_client.usar_servidor():
+        return model_client.generate_group(lista_messages, codigos_filas, max_tokens, reintento=reintento)
+    return generar_grupo(
+        tokenizer, lista_messages, max_tokens, callbacks=callbacks, codigos_filas=codigos_filas, reintento=reintento
+    )
+
+# PROCESAMIENTO DE UN TRABAJO DE REVISIÓN (lo ejecutan los workers de jobs.py)
+def procesar_trabajo(trabajo):
+    titulo = trabajo["titulo"]
+    user = trabajo["id_user"]
+    fecha = str(trabajo["creado"]).split(".")[0]
+    anotar("cola_s", (trabajo["iniciado"] - trabajo["creado"]).total_seconds())
+    # Si ya se revisó este mismo PDF con el mismo modelo y prompt, reutilizamos el resultado
+    with span("cache"):
+        # Los trabajos encolados antes del almacén de PDFs llevan el PDF en el propio trabajo
+        pdf_hash = trabajo.get("pdf_hash") or guardar_pdf(trabajo["pdf"])
+        clave = clave_cache(pdf_hash)
+        entrada = buscar_en_cache(clave)
+    anotar("cache_hit", entrada is not None)
+    # En caché también están las huellas de las secciones, que se guardan con la versión
+    result, huellas = entrada or (None, None)
+    # Preguntas sin respuesta válida en la revisión por preguntas: la revisión se guarda sin ellas y no va a la caché
+    fallidas = []
+    if result is None:
+        # Procesar el PDF (o reutilizar su texto ya extraído) y generar el output
+        with span("extraccion_pdf"):
+            text = texto_pdf(pdf_hash)
+        # Sin bibliografía, cabeceras, números de página ni afiliaciones (ver text_normalization.py)
+        with span("normalizacion"):
+            text, _ = normalizar_texto(text, contar_tokens=contar_tokens)
+        # Huellas de las secciones: en una nueva versión solo se regeneran las preguntas cuya evidencia ha cambiado
+        with span("secciones"):
+            huellas = calcular_huellas(text)
+            anterior = buscar_ultima_version(titulo, user) if trabajo["tipo"] == "nueva_version" else None
+            codigos = preguntas_a_revisar(huellas, anterior)
+        # None = checklist completo, el prompt de siempre
+        pedidas = codigos if len(codigos) < len(CHECKLIST) else None
+        anotar("preguntas_regeneradas", len(codigos))
+        if codigos:
+            # Solo los pasajes relevantes para esas preguntas, dentro del presupuesto de tokens
+            with span("evidencias"):
+                text = seleccionar_evidencia(text, contar_tokens=contar_tokens, codigos=pedidas)
+            if modo_por_preguntas():
+                # Un prompt corto por pregunta, generados en un solo lote; cada respuesta se publica al cerrarse
+                logger.info(f"Llamando al modelo con un prompt por pregunta ({len(codigos)}) para '{titulo}'")
+                with span("generacion"):
+                    result, fallidas = revisar_por_preguntas(
+                        generar_grupo_revision, text, codigos, lambda: crear_emisor(trabajo["_id"], tokens=False)
+                    )
+            else:
+                with span("prompt"):
+                    messages = build_prompt(text, pedidas)
+                logger.info(f"Generado correctamente el prompt. Llamando al modelo para generar la salida de '{titulo}'")
+                # La salida se va publicando para la página de espera (Server-Sent Events)
+                with span("generacion"):
+                    result = generar_revision(messages, on_text=crear_emisor(trabajo["_id"]), codigos=pedidas)
+            anotar("json_valido", "error" not in result)
+            logger.info(f"Salida generada correctamente por el modelo para la sumisión '{titulo}'")
+        else:
+            logger.info(f"La evidencia de '{titulo}' no ha cambiado, se mantienen las respuestas de la versión anterior")
+            result = {}
+        if pedidas is not None:
+            result = combinar_respuestas(anterior["preguntas_respuestas"], result, codigos)
+        if "error" not in result and not fallidas:
+            guardar_en_cache(clave, pdf_hash, result, huellas)
+    else:
+        logger.info(f"Reutilizando la revisión en caché para la sumisión '{titulo}'")
+
+    # Resumen de tiempos que se guarda con la versión para diagnosticar revisiones lentas
+    tiempos = resumen_actual()
+    logger.info(f"Tiempos de la revisión de '{titulo}': {tiempos}")
+
+    if trabajo["tipo"] == "nueva_submision":
+        # Crear el JSON completo y guardarlo en la base de datos
+        version = 1
+        json_total = crear_submision(titulo, user, get_id(), pdf_hash)
+        json_total = modificar_submision(json_total, version, result, fecha, tiempos, huellas, pdf_hash)
+        logger.info(f"Insertando la sumisión '{titulo}' en la base de datos para el usuario {user}")
+        insertar_bd(json_total)
+    else:
+        # Subir la nueva versión a la base de datos, el número lo asigna MongoDB de forma atómica
+        nueva = subir_nueva_version(titulo, user, result, fecha, tiempos, huellas, pdf_hash)
+        if nueva is None:
+            raise ValueError(f"No existe la submission '{titulo}'")
+        version = nueva["versiones"][0]["numero"]
+    return version
+
+# PÁGINA DE ESPERA DE UN TRABAJO
+@app.route("/trabajo/<job_id>")
+def ver_trabajo(job_id):
+    if "orcid_id" not in session:
+        return redirect(url_for("home"))
+    trabajo = obtener_trabajo(job_id)
+    if not trabajo or trabajo["id_user"] != session["orcid_id"]:
+        return f"Not found '{job_id}'", 404
+    return render_template("procesando.html", trabajo=estado_trabajo_json(trabajo), model_name=model_name)
+
+# ESTADO DE UN TRABAJO (consultado periódicamente por la página de espera)
+@app.route("/trabajo/<job_id>/estado")
+def estado_trabajo(job_id):
+    if "orcid_id" not in session:
+        return jsonify({"error": "No autenticado"}), 401
+    trabajo = obtener_trabajo(job_id)
+    if not trabajo or trabajo["id_user"] != session["orcid_id"]:
+        return jsonify({"error": "Not found"}), 404
+    return jsonify(estado_trabajo_json(trabajo))
+
+# SALIDA DEL MODELO EN DIRECTO (Server-Sent Events)
+@app.route("/trabajo/<job_id>/stream")
+def stream_trabajo(job_id):
+    if "orcid_id" not in session:
+        return jsonify({"error": "No autenticado"}), 401
+    trabajo = obtener_trabajo(job_id)
+    if not trabajo or trabajo["id_user"] != session["orcid_id"]:
+        return jsonify({"error": "Not found"}), 404
+
+    # Por si el trabajo terminó antes de conectarse el cliente o en otro proceso
+    def estado_final():
+        actual = obtener_trabajo(job_id)
+        if actual and actual["estado"] in (ESTADO_TERMINADO, ESTADO_FALLIDO):
+            return {"estado": actual["estado"], "version": actual.get("version"), "error": actual.get("error")}
+        return None
+
+    def eventos():
+        final = estado_final()
+        if final is not None:
+            yield f"event: fin\ndata: {json.dumps(final)}\n\n"
+            return
+        for tipo, datos in suscribir(job_id, estado_final):
+            if tipo == "ping":
+                yield ": ping\n\n"
+            else:
+                yield f"event: {tipo}\ndata: {json.dumps(datos)}\n\n"
+
+    return Response(eventos(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+# RESULTADO DE UN TRABAJO TERMINADO
+@app.route("/trabajo/<job_id>/resultado")
+def resultado_trabajo(job_id):
+    if "orcid_id" not in session:
+        return redirect(url_for("home"))
+    user = session["orcid_id"]
+    trabajo = obtener_trabajo(job_id)
+    if not trabajo or trabajo["id_user"] != user:
+        return f"Not found '{job_id}'", 404
+    if trabajo["estado"] != ESTADO_TERMINADO:
+        return redirect(url_for("ver_trabajo", job_id=job_id))
+    json_data = buscar_version_bd(trabajo["titulo"], user, trabajo["version"])
+    # Mostrar los resultados en la pantalla
+    return render_template("resultados.html", json_result=convertir_objectids(json_data))
 
 # VER HISTORIAL DE SUBMISIÓNES Y VERSIONES
+# Una sola consulta por página con el número y la fecha de cada versión; las respuestas de una versión
+# se cargan al abrirla desde /ver_version/datos
 @app.route("/ver_historial",methods = ['GET', 'POST'])
 def ver_historial():
-    # Almacenar en un diccionario los títulos y sus respectivas versiones previamente subidas
-    dict = []
     if "orcid_id" not in session:
         return redirect(url_for("home")) 
     user = session["orcid_id"]
-    titulos = buscar_titulos_bd(user)
-    for titulo in titulos:
-        versiones = buscar_versiones_bd(titulo, user)
-        entrada = {"titulo": titulo, "versiones": versiones}
-        dict.append(entrada)
+    pagina = max(request.args.get("pagina", 1, type=int), 1)
+    submisiones, total = buscar_historial_bd(user, pagina, HISTORY_PAGE_SIZE)
+    paginas = max((total + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE, 1)
     if request.method == "POST":
         print("POST en ver_historial")
         accion = request.form.get("action")
         print("Acción recibida:", accion)
     # Mostrar en un desplegable los títulos y versiones previas
-    return render_template("mostrador_versiones_previas.html", versiones = dict)
+    return render_template("mostrador_versiones_previas.html", versiones=submisiones, pagina=pagina, paginas=paginas)
 
 # VER VERSIÓN ESPECÍFICA
-@app.route("/ver_version", methods=["POST"])
+# Con GET (enlaces del historial) la página pide la versión a /ver_version/datos, que el navegador guarda en caché
+@app.route("/ver_version", methods=["GET", "POST"])
 def ver_version():
+    if "orcid_id" not in session:
+        return redirect(url_for("home")) 
+    if request.method == "GET":
+        titulo = request.args.get("titulo", "")
+        numero = request.args.get("numero", type=int)
+        if numero is None:
+            return redirect(url_for("ver_historial"))
+        return render_template("resultados.html", json_result=None,
+                               json_url=url_for("datos_version", titulo=titulo, numero=numero))
+
     # Consulta en la base de datos la versión específica solicitada
     titulo = request.form.get("titulo")
     numero = request.form.get("numero")
-    if "orcid_id" not in session:
-        return redirect(url_for("home")) 
     user = session["orcid_id"]
     json_datos = buscar_version_bd(titulo, user, int(numero))
 
@@ -276,6 +548,28 @@ def ver_version():
     # Mostrar los resultados en la pantalla
     return render_template("resultados.html", json_result=convertir_objectids(json_datos))
 
+# DATOS DE UNA VERSIÓN EN JSON
+# Una versión guardada no cambia nunca: se puede guardar en la caché del navegador y, con el ETag,
+# una nueva petición de la misma versión se responde con 304 sin volver a enviarla
+@app.route("/ver_version/datos")
+def datos_version():
+    if "orcid_id" not in session:
+        return jsonify({"error": "No autenticado"}), 401
+    titulo = request.args.get("titulo", "")
+    numero = request.args.get("numero", type=int)
+    if numero is None:
+        return jsonify({"error": "Missing version number"}), 400
+    doc = buscar_version_bd(titulo, session["orcid_id"], numero)
+    if not doc or not doc.get("versiones"):
+        return jsonify({"error": "Not found"}), 404
+
+    respuesta = jsonify(convertir_objectids(doc))
+    respuesta.add_etag()
+    # private y Vary: Cookie, la respuesta es de la sesión del usuario
+    respuesta.headers["Cache-Control"] = f"private, max-age={VERSION_CACHE_SECONDS}, immutable"
+    respuesta.vary.add("Cookie")
+    return respuesta.make_conditional(request)
+
 
 # RUTA SOLO PARA TESTING
 # NOS SALTAMOS EL LOGIN DE ORCID PARA HACER EL TESTING YA QUE ORCID TIENE PUEDE DETECTAR AUTOMATIZACIÓN
@@ -286,6 +580,31 @@ def ver_version():
 #     session["name"] = "Usuario Test"
 #     return "Login simulado OK"
 
+# Cuando el modelo está cargado arrancamos el motor de inferencia, los workers de la cola de revisiones
+# y los lotes de revisión masiva que quedaron a medias
+def al_cargar_modelo(model, tokenizer_cargado):
+    global tokenizer
+    tokenizer = tokenizer_cargado
+    iniciar_motor(model, tokenizer)
+    iniciar_workers(procesar_trabajo)
+    recuperar_lotes(generar_revision, contar_tokens)
+
+# Arranque del servicio: índices de MongoDB que falten (un único pool de conexiones por proceso, ver database.py)
+# y carga del modelo, o workers y lotes directamente si hay un servidor de modelo
+def iniciar_servicio():
+    asegurar_indices()
+    if model_client.usar_servidor():
+        iniciar_workers(procesar_trabajo)
+        recuperar_lotes(generar_revision, contar_tokens)
+    else:
+        iniciar_carga(al_cargar_modelo)
+
+# Se arranca al importar (gunicorn app:app) y con python app.py, pero no en los procesos de extracción de PDFs
+# (ver pdf_extraction.py): "spawn" vuelve a ejecutar este módulo en cada uno con el nombre __mp_main__
+# y no deben cargar el modelo ni hacer de workers de la cola
+if __name__ != "__mp_main__":
+    iniciar_servicio()
+
 #  ABRIR NAVEGADOR AUTOMÁTICAMENTE
 def open_browser():
     webbrowser.open_new("http://127.0.0.1:5000/")
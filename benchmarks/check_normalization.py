@@ -0,0 +1,153 @@
+import os
+import sys
+import json
+from datetime import datetime
+
+# Comprobación de regresiones de la normalización del texto (text_normalization.py): revisa cada PDF de un corpus
+# con el texto extraído tal cual y con el texto normalizado, y compara las respuestas del checklist
+#   python -m benchmarks.check_normalization [--pdfs directorio] [--modelo configurado|minimo] [--max-tokens 1500]
+#                                            [--umbral 0.9] [--salida normalization_check.json]
+# Sin --pdfs se usa un corpus de artículos sintéticos con ruido (benchmarks/corpus.py). Termina con código 1
+# si la concordancia de las respuestas es menor que --umbral o si la normalización produce más JSON inválidos.
+# Con --modelo minimo (pesos aleatorios) solo sirve para probar el script, las respuestas no tienen sentido
+
+
+def _opcion(argumentos, nombre, defecto):
+    if nombre in argumentos:
+        return argumentos[argumentos.index(nombre) + 1]
+    return defecto
+
+
+def _corpus(directorio):
+    if directorio is None:
+        from benchmarks.corpus import generar_articulos
+        return generar_articulos()
+    corpus = {}
+    for nombre in sorted(os.listdir(directorio)):
+        if nombre.lower().endswith(".pdf"):
+            with open(os.path.join(directorio, nombre), "rb") as f:
+                corpus[nombre] = f.read()
+    return corpus
+
+
+def _respuesta(resultado, codigo):
+    respuesta = resultado.get(codigo)
+    if isinstance(respuesta, dict):
+        respuesta = respuesta.get("answer")
+    return str(respuesta).strip().lower() if respuesta is not None else None
+
+
+# Concordancia entre las respuestas con el texto original y con el normalizado, por pregunta
+def comparar_respuestas(originales, normalizadas, checklist):
+    comparadas = coincidentes = 0
+    por_pregunta = {}
+    for codigo in checklist:
+        iguales = [
+            _respuesta(a, codigo) == _respuesta(b, codigo)
+            for a, b in zip(originales, normalizadas)
+            if "error" not in a and "error" not in b
+        ]
+        por_pregunta[codigo] = sum(iguales) / len(iguales) if iguales else None
+        comparadas += len(iguales)
+        coincidentes += sum(iguales)
+    return (coincidentes / comparadas if comparadas else None), por_pregunta
+
+
+def main(argumentos):
+    if not os.path.exists("properties.txt"):
+        print("No se encuentra properties.txt: ejecuta desde la raíz del proyecto (basta con copiar properties_ej.txt)")
+        return 2
+    directorio = _opcion(argumentos, "--pdfs", None)
+    modelo = _opcion(argumentos, "--modelo", "configurado")
+    max_tokens = int(_opcion(argumentos, "--max-tokens", 1500))
+    umbral = float(_opcion(argumentos, "--umbral", 0.9))
+    salida = _opcion(argumentos, "--salida", "normalization_check.json")
+
+    import model_utils
+    from pdf_extraction import extraer_texto
+    from evidence import seleccionar_evidencia
+    from text_normalization import normalizar_texto, NORMALIZE_STEPS
+
+    print(f"Cargando el modelo ({modelo})...")
+    if modelo == "configurado":
+        model, tokenizer, nombre_modelo = model_utils.load_model()
+    else:
+        from benchmarks.modelo_minimo import cargar_modelo_minimo
+        model, tokenizer = cargar_modelo_minimo()
+        nombre_modelo = "minimo"
+        if model_utils.CONSTRAINED_DECODING:
+            model_utils.preparar_automata(model, tokenizer)
+
+    def contar(texto):
+        return len(tokenizer(texto, add_special_tokens=False).input_ids)
+
+    corpus = _corpus(directorio)
+    if not corpus:
+        print(f"No hay PDFs en {directorio}")
+        return 2
+
+    documentos = {}
+    originales, normalizadas = [], []
+    for nombre, pdf in corpus.items():
+        texto, _ = extraer_texto(pdf)
+        normalizado, informe = normalizar_texto(texto, contar_tokens=contar)
+        # Las dos versiones pasan por la selección de evidencias igual que en una revisión real
+        resultados = model_utils.generate_outputs_batch(model, tokenizer, [
+            model_utils.build_prompt(seleccionar_evidencia(texto, contar_tokens=contar)),
+            model_utils.build_prompt(seleccionar_evidencia(normalizado, contar_tokens=contar))
+        ], max_tokens=max_tokens)
+        originales.append(resultados[0])
+        normalizadas.append(resultados[1])
+        documentos[nombre] = {
+            "tokens_antes": informe["tokens_antes"],
+            "tokens_despues": informe["tokens_despues"],
+            "caracteres_quitados": informe["pasos"],
+            "respuestas_original": {codigo: _respuesta(resultados[0], codigo) for codigo in model_utils.CHECKLIST},
+            "respuestas_normalizado": {codigo: _respuesta(resultados[1], codigo) for codigo in model_utils.CHECKLIST},
+            "json_valido": ["error" not in resultados[0], "error" not in resultados[1]]
+        }
+        reduccion = 1 - informe["tokens_despues"] / max(informe["tokens_antes"], 1)
+        print(f"{nombre:40} {informe['tokens_antes']:7} -> {informe['tokens_despues']:7} tokens ({reduccion:6.1%})")
+
+    concordancia, por_pregunta = comparar_respuestas(originales, normalizadas, model_utils.CHECKLIST)
+    errores_original = sum("error" in r for r in originales)
+    errores_normalizado = sum("error" in r for r in normalizadas)
+    tokens_antes = sum(d["tokens_antes"] for d in documentos.values())
+    tokens_despues = sum(d["tokens_despues"] for d in documentos.values())
+
+    print(f"\n{'pregunta':10} {'concordancia':>12}")
+    for codigo, valor in por_pregunta.items():
+        print(f"{codigo:10} {'-' if valor is None else f'{valor:.0%}':>12}")
+    print(f"\nTokens del texto: {tokens_antes} -> {tokens_despues} ({1 - tokens_despues / max(tokens_antes, 1):.1%} menos)")
+    if concordancia is None:
+        print("Ninguna respuesta comparable: todas las salidas tienen el JSON inválido (¿--max-tokens demasiado bajo?)")
+    else:
+        print(f"Concordancia de las respuestas: {concordancia:.1%} (umbral {umbral:.0%})")
+    print(f"JSON inválidos: {errores_original} con el texto original, {errores_normalizado} con el normalizado")
+
+    with open(salida, "w") as f:
+        json.dump({
+            "metadatos": {
+                "fecha": datetime.now().isoformat(timespec="seconds"),
+                "modelo": nombre_modelo,
+                "pasos": NORMALIZE_STEPS,
+                "corpus": directorio or "sintetico",
+                "umbral": umbral
+            },
+            "concordancia": concordancia,
+            "concordancia_por_pregunta": por_pregunta,
+            "tokens_antes": tokens_antes,
+            "tokens_despues": tokens_despues,
+            "json_invalidos": {"original": errores_original, "normalizado": errores_normalizado},
+            "documentos": documentos
+        }, f, indent=4)
+    print(f"Resultados guardados en {salida}")
+
+    if concordancia is None or concordancia < umbral or errores_normalizado > errores_original:
+        print("\nLa normalización empeora las respuestas del checklist")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
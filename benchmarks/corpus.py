@@ -0,0 +1,120 @@
+import random
+
+# Generador de PDFs sintéticos para los benchmarks: páginas de texto plano con frases del tipo
+# de las que busca el checklist, sin depender de ninguna librería para escribir PDFs
+
+FRASES = [
+    "The null hypothesis states that there is no difference between the two treatments.",
+    "Subjects were randomly assigned to the control and experimental groups.",
+    "A power analysis was used to calculate the required sample size.",
+    "Normality was checked with the Shapiro-Wilk test and homoscedasticity with Levene's test.",
+    "We fitted a linear mixed model with the participant as a random effect.",
+    "The results were significant (p < 0.05) with a 95% confidence interval of [0.12, 0.48].",
+    "The Bonferroni correction was applied to account for multiple comparisons.",
+    "Table 1 reports the means, standard deviations and counts for each group.",
+    "Related work on software testing is discussed in the next section.",
+    "The threats to validity of the experiment are described below.",
+    "Participants were students from a software engineering course.",
+    "The tasks consisted of writing unit tests for a small Java project."
+]
+
+LINEAS_POR_PAGINA = 45
+
+
+def _escapar(linea):
+    return linea.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def texto_paginas(num_paginas, semilla=0):
+    aleatorio = random.Random(semilla)
+    paginas = []
+    for numero in range(num_paginas):
+        lineas = [f"Section {numero + 1}"]
+        while len(lineas) < LINEAS_POR_PAGINA:
+            lineas.append(aleatorio.choice(FRASES))
+        paginas.append(lineas)
+    return paginas
+
+
+# Artículo sintético con el ruido habitual de un PDF real: afiliaciones en la portada, cabecera y número
+# de página en cada página, palabras partidas a final de línea y la bibliografía en las últimas páginas
+def paginas_articulo(num_paginas, semilla=0):
+    aleatorio = random.Random(semilla)
+    cuerpo = [
+        "An Experiment on Unit Testing Practices",
+        "Jane Doe, John Roe",
+        "Department of Computer Science, University of Somewhere, Spain",
+        "{jane.doe, john.roe}@somewhere.edu",
+        "Abstract",
+        "We report a controlled experiment with students on unit testing.",
+        "1 Introduction"
+    ]
+    paginas_referencias = max(1, num_paginas // 4)
+    for seccion in range(2, num_paginas * 3):
+        if len(cuerpo) >= (num_paginas - paginas_referencias) * (LINEAS_POR_PAGINA - 3):
+            break
+        if seccion % 4 == 0:
+            cuerpo.append(f"{seccion // 4 + 1} Section {seccion}")
+        for _ in range(10):
+            frase = aleatorio.choice(FRASES)
+            if aleatorio.random() < 0.2:
+                # Partimos una palabra larga al final de la línea
+                palabras = frase.split()
+                larga = max(range(len(palabras)), key=lambda i: len(palabras[i]))
+                corte = len(palabras[larga]) // 2
+                cuerpo.append(" ".join(palabras[:larga] + [palabras[larga][:corte] + "-"]))
+                cuerpo.append(" ".join([palabras[larga][corte:]] + palabras[larga + 1:]))
+            else:
+                cuerpo.append(frase)
+    cuerpo.append("References")
+    numero = 1
+    while len(cuerpo) < num_paginas * (LINEAS_POR_PAGINA - 3):
+        cuerpo.append(f"[{numero}] A. Author and B. Author, \"A study of testing number {numero},\" in Proc. ICSE, 20{numero % 25:02d}, pp. 1-10.")
+        numero += 1
+
+    paginas = []
+    por_pagina = LINEAS_POR_PAGINA - 3
+    for numero_pagina in range(num_paginas):
+        lineas = cuerpo[numero_pagina * por_pagina:(numero_pagina + 1) * por_pagina]
+        cabecera = "Empirical Software Engineering (2024) 29:101" if numero_pagina % 2 else "J. Doe et al."
+        paginas.append([cabecera] + lineas + [str(numero_pagina + 1)])
+    return paginas
+
+
+# Construimos un PDF mínimo (una fuente Helvetica y un flujo de texto por página)
+def generar_pdf(num_paginas, semilla=0, paginas=None):
+    paginas = paginas or texto_paginas(num_paginas, semilla)
+    num_paginas = len(paginas)
+    objetos = [b"<< /Type /Catalog /Pages 2 0 R >>"]
+    hijos = " ".join(f"{3 + 2 * i} 0 R" for i in range(num_paginas))
+    objetos.append(f"<< /Type /Pages /Kids [{hijos}] /Count {num_paginas} >>".encode())
+    for i, lineas in enumerate(paginas):
+        contenido = "BT /F1 10 Tf 50 750 Td 14 TL " + " ".join(f"({_escapar(l)}) Tj T*" for l in lineas) + " ET"
+        objetos.append((
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R "
+            "/Resources << /Font << /F1 << /Type /Font /Subtype /Type1 /BaseFont /Helvetica >> >> >> >>"
+        ).encode())
+        datos = contenido.encode("latin-1")
+        objetos.append(b"<< /Length %d >>\nstream\n" % len(datos) + datos + b"\nendstream")
+
+    salida = b"%PDF-1.4\n"
+    posiciones = []
+    for numero, objeto in enumerate(objetos, start=1):
+        posiciones.append(len(salida))
+        salida += b"%d 0 obj\n" % numero + objeto + b"\nendobj\n"
+    inicio_xref = len(salida)
+    salida += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objetos) + 1)
+    salida += b"".join(b"%010d 00000 n \n" % posicion for posicion in posiciones)
+    salida += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF" % (len(objetos) + 1, inicio_xref)
+    return salida
+
+
+# Corpus de PDFs de distintos tamaños: {número de páginas: bytes del PDF}
+def generar_corpus(tamanos=(1, 5, 20, 60)):
+    return {paginas: generar_pdf(paginas, semilla=paginas) for paginas in tamanos}
+
+
+# Corpus de artículos con ruido: {nombre: bytes del PDF}
+def generar_articulos(tamanos=(4, 8, 12, 20)):
+    return {f"articulo_{paginas}p": generar_pdf(paginas, paginas=paginas_articulo(paginas, semilla=paginas))
+            for paginas in tamanos}
@@ -0,0 +1,90 @@
+import sys
+import json
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from benchmarks.run_benchmarks import percentiles
+
+# Prueba de carga del login con ORCID sin conexión: la aplicación (app.py o gunicorn) debe estar arrancada con
+# orcid.base_url apuntando al ORCID de pruebas (orcid_stub.py) y orcid.redirect_uri al /callback de la aplicación.
+# Cada usuario simulado repite login -> autorización -> callback -> logout y se miden los percentiles de cada paso
+#   python -m benchmarks.login_load [--app http://127.0.0.1:5000] [--usuarios 20] [--iteraciones 10]
+#                                   [--salida login_load.json]
+
+PASOS = ("login", "authorize", "callback", "logout")
+
+
+def _opcion(argumentos, nombre, defecto):
+    if nombre in argumentos:
+        return argumentos[argumentos.index(nombre) + 1]
+    return defecto
+
+
+def _paso(sesion, url, tiempos, paso, estado_esperado):
+    inicio = time.perf_counter()
+    respuesta = sesion.get(url, allow_redirects=False, timeout=30)
+    tiempos[paso].append(time.perf_counter() - inicio)
+    if respuesta.status_code != estado_esperado:
+        raise RuntimeError(f"{paso}: {respuesta.status_code} en lugar de {estado_esperado}")
+    return respuesta
+
+
+# Un usuario simulado: su propia sesión (cookies) y sus tiempos por paso
+def _usuario(app_url, iteraciones):
+    tiempos = {paso: [] for paso in PASOS}
+    errores = []
+    sesion = requests.Session()
+    for _ in range(iteraciones):
+        try:
+            autorizacion = _paso(sesion, f"{app_url}/login", tiempos, "login", 302).headers["Location"]
+            callback = _paso(sesion, autorizacion, tiempos, "authorize", 302).headers["Location"]
+            _paso(sesion, callback, tiempos, "callback", 302)
+            _paso(sesion, f"{app_url}/logout", tiempos, "logout", 200)
+        except (requests.RequestException, RuntimeError, KeyError) as e:
+            errores.append(str(e))
+    return tiempos, errores
+
+
+def main(argumentos):
+    app_url = _opcion(argumentos, "--app", "http://127.0.0.1:5000").rstrip("/")
+    usuarios = int(_opcion(argumentos, "--usuarios", 20))
+    iteraciones = int(_opcion(argumentos, "--iteraciones", 10))
+    salida = _opcion(argumentos, "--salida", "login_load.json")
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=usuarios) as pool:
+        resultados = list(pool.map(lambda _: _usuario(app_url, iteraciones), range(usuarios)))
+    duracion = time.perf_counter() - inicio
+
+    tiempos = {paso: [t for r, _ in resultados for t in r[paso]] for paso in PASOS}
+    errores = [e for _, r in resultados for e in r]
+    etapas = {paso: percentiles(muestras) for paso, muestras in tiempos.items() if muestras}
+    completados = len(tiempos["logout"])
+
+    print(f"{'paso':10} {'n':>6} {'p50 (ms)':>10} {'p95 (ms)':>10} {'max (ms)':>10}")
+    for paso, datos in etapas.items():
+        print(f"{paso:10} {datos['n']:6} {datos['p50'] * 1000:10.1f} {datos['p95'] * 1000:10.1f} {datos['max'] * 1000:10.1f}")
+    print(f"\n{completados} logins completos en {duracion:.1f} s ({completados / duracion:.1f}/s), {len(errores)} errores")
+    for error in sorted(set(errores))[:10]:
+        print(f"  {error}")
+
+    with open(salida, "w") as f:
+        json.dump({
+            "metadatos": {
+                "fecha": datetime.now().isoformat(timespec="seconds"),
+                "app": app_url,
+                "usuarios": usuarios,
+                "iteraciones": iteraciones
+            },
+            "duracion_s": duracion,
+            "logins_completos": completados,
+            "errores": len(errores),
+            "etapas": etapas
+        }, f, indent=4)
+    print(f"Resultados guardados en {salida}")
+    return 1 if errores else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,52 @@
+import torch
+from tokenizers import Tokenizer, models, trainers, pre_tokenizers, decoders
+from transformers import PreTrainedTokenizerFast, Qwen2Config, Qwen2ForCausalLM
+from prompts import build_prompt
+from benchmarks.corpus import FRASES
+
+# Modelo diminuto con pesos aleatorios y la misma arquitectura que Qwen2.5, construido sin descargar nada.
+# Sus respuestas no tienen sentido, pero recorre el mismo código (plantilla de chat, generate, KV-cache...)
+# y sirve para medir el coste de todo lo que rodea al modelo
+
+PLANTILLA_CHAT = (
+    "{% for m in messages %}<|im_start|>{{ m['role'] }}\n{{ m['content'] }}<|im_end|>\n{% endfor %}"
+    "{% if add_generation_prompt %}<|im_start|>assistant\n{% endif %}"
+)
+
+
+def crear_tokenizer(tamano_vocabulario=2000):
+    corpus = [build_prompt(" ".join(FRASES))[1]["content"]] * 5 + FRASES
+    tokenizer = Tokenizer(models.BPE())
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    entrenador = trainers.BpeTrainer(
+        vocab_size=tamano_vocabulario,
+        special_tokens=["<|endoftext|>", "<|im_start|>", "<|im_end|>"],
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet()
+    )
+    tokenizer.train_from_iterator(corpus, entrenador)
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=tokenizer, eos_token="<|im_end|>", pad_token="<|endoftext|>")
+    tokenizer.chat_template = PLANTILLA_CHAT
+    tokenizer.padding_side = "left"
+    return tokenizer
+
+
+def crear_modelo(tokenizer, capas=2, dimension=64, semilla=0):
+    torch.manual_seed(semilla)
+    configuracion = Qwen2Config(
+        vocab_size=len(tokenizer),
+        hidden_size=dimension,
+        intermediate_size=dimension * 2,
+        num_hidden_layers=capas,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+        max_position_embeddings=32768,
+        eos_token_id=tokenizer.eos_token_id,
+        pad_token_id=tokenizer.pad_token_id
+    )
+    return Qwen2ForCausalLM(configuracion).eval()
+
+
+def cargar_modelo_minimo():
+    tokenizer = crear_tokenizer()
+    return crear_modelo(tokenizer), tokenizer
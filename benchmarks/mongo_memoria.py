@@ -0,0 +1,116 @@
+import mongomock
+import mongomock.gridfs
+from pymongo import ReturnDocument
+
+# Sustituto en memoria de MongoDB para los benchmarks, basado en mongomock.
+# mongomock no evalúa las actualizaciones de tipo pipeline (las usa subir_nueva_version),
+# así que las colecciones las resuelven aquí con los operadores que usa la aplicación
+
+
+# Valor de un campo con notación de puntos; sobre un array devuelve la lista de valores de sus elementos
+def _campo(doc, ruta):
+    valor = doc
+    for parte in ruta.split("."):
+        if isinstance(valor, list):
+            valor = [elemento.get(parte) for elemento in valor if isinstance(elemento, dict)]
+        elif isinstance(valor, dict):
+            valor = valor.get(parte)
+        else:
+            return None
+    return valor
+
+
+def _evaluar(expresion, doc):
+    if isinstance(expresion, str) and expresion.startswith("$"):
+        return _campo(doc, expresion[1:])
+    if isinstance(expresion, list):
+        return [_evaluar(e, doc) for e in expresion]
+    if not isinstance(expresion, dict):
+        return expresion
+    if len(expresion) == 1:
+        operador, argumento = next(iter(expresion.items()))
+        if operador == "$literal":
+            return argumento
+        if operador == "$ifNull":
+            for e in argumento:
+                valor = _evaluar(e, doc)
+                if valor is not None:
+                    return valor
+            return None
+        if operador == "$max":
+            valores = [v for v in _evaluar(argumento, doc) or [] if v is not None]
+            return max(valores) if valores else None
+        if operador == "$add":
+            return sum(_evaluar(e, doc) for e in argumento)
+        if operador == "$concatArrays":
+            return [elemento for lista in _evaluar(argumento, doc) for elemento in lista]
+        if operador.startswith("$"):
+            raise NotImplementedError(f"Operador no soportado en el pipeline: {operador}")
+    return {clave: _evaluar(valor, doc) for clave, valor in expresion.items()}
+
+
+def _aplicar_pipeline(doc, pipeline):
+    for etapa in pipeline:
+        (nombre, campos), = etapa.items()
+        if nombre not in ("$set", "$addFields"):
+            raise NotImplementedError(f"Etapa no soportada en el pipeline: {nombre}")
+        doc = dict(doc)
+        for clave, expresion in campos.items():
+            doc[clave] = _evaluar(expresion, doc)
+    return doc
+
+
+class ColeccionMemoria:
+    def __init__(self, coleccion):
+        self._coleccion = coleccion
+
+    def __getattr__(self, nombre):
+        return getattr(self._coleccion, nombre)
+
+    def find_one_and_update(self, filtro, update, projection=None, return_document=ReturnDocument.BEFORE, **opciones):
+        if not isinstance(update, list):
+            return self._coleccion.find_one_and_update(
+                filtro, update, projection=projection, return_document=return_document, **opciones
+            )
+        doc = self._coleccion.find_one(filtro)
+        if doc is None:
+            return None
+        self._coleccion.replace_one({"_id": doc["_id"]}, _aplicar_pipeline(doc, update))
+        if return_document == ReturnDocument.BEFORE:
+            return doc
+        return self._coleccion.find_one({"_id": doc["_id"]}, projection)
+
+    def update_one(self, filtro, update, **opciones):
+        if not isinstance(update, list):
+            return self._coleccion.update_one(filtro, update, **opciones)
+        doc = self._coleccion.find_one(filtro)
+        if doc is not None:
+            self._coleccion.replace_one({"_id": doc["_id"]}, _aplicar_pipeline(doc, update))
+
+
+class BaseDatosMemoria:
+    def __init__(self, base_datos):
+        self._base_datos = base_datos
+        self._colecciones = {}
+
+    def __getitem__(self, nombre):
+        if nombre not in self._colecciones:
+            self._colecciones[nombre] = ColeccionMemoria(self._base_datos[nombre])
+        return self._colecciones[nombre]
+
+
+# Cliente con la misma interfaz que usa database.py: cliente[base_datos][coleccion]
+class ClienteMemoria:
+    def __init__(self):
+        # Permite usar gridfs (pdf_store.py) sobre las bases de datos de mongomock
+        mongomock.gridfs.enable_gridfs_integration()
+        self._cliente = mongomock.MongoClient()
+        self._bases = {}
+
+    def __getitem__(self, nombre):
+        if nombre not in self._bases:
+            self._bases[nombre] = BaseDatosMemoria(self._cliente[nombre])
+        return self._bases[nombre]
+
+    def close(self):
+        pass
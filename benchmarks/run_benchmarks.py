@@ -0,0 +1,296 @@
+import io
+import os
+import sys
+import json
+import time
+import platform
+import statistics
+import subprocess
+import contextlib
+from datetime import datetime
+
+# Benchmarks de cada etapa de la revisión, sin servidor, sin GPU y sin MongoDB:
+#   python -m benchmarks.run_benchmarks [--modelo minimo|configurado] [--repeticiones 5] [--max-tokens 300]
+#                                       [--salida benchmark_results.json] [--comparar anterior.json] [--umbral 1.2]
+# Se ejecuta desde la raíz del proyecto con un properties.txt (basta una copia de properties_ej.txt).
+# Los resultados se guardan en JSON con los percentiles de cada etapa para poder comparar commits
+
+TAMANOS_CORPUS = (1, 5, 20, 60)
+# Tamaños del corpus con los que se mide la generación (el de 60 páginas pasa por la selección de evidencias)
+TAMANOS_GENERACION = (1, 60)
+
+
+def _opcion(argumentos, nombre, defecto):
+    if nombre in argumentos:
+        return argumentos[argumentos.index(nombre) + 1]
+    return defecto
+
+
+# Percentiles de una lista de duraciones en segundos
+def percentiles(muestras):
+    ordenadas = sorted(muestras)
+    if len(ordenadas) > 1:
+        cortes = statistics.quantiles(ordenadas, n=100, method="inclusive")
+        p50, p90, p95, p99 = cortes[49], cortes[89], cortes[94], cortes[98]
+    else:
+        p50 = p90 = p95 = p99 = ordenadas[0]
+    return {
+        "n": len(ordenadas),
+        "media": statistics.fmean(ordenadas),
+        "min": ordenadas[0],
+        "p50": p50,
+        "p90": p90,
+        "p95": p95,
+        "p99": p99,
+        "max": ordenadas[-1]
+    }
+
+
+def cronometrar(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ---------------- ETAPAS ----------------
+
+def medir_pdf(corpus, repeticiones, etapas):
+    from model_utils import pdf_to_text
+    # La primera extracción arranca el pool de procesos, no la contamos
+    pdf_to_text(io.BytesIO(corpus[min(corpus)]))
+    textos = {}
+    for paginas, pdf in corpus.items():
+        textos[paginas] = pdf_to_text(io.BytesIO(pdf))
+        etapas[f"pdf_to_text.{paginas}p"] = percentiles(cronometrar(lambda: pdf_to_text(io.BytesIO(pdf)), repeticiones))
+    return textos
+
+
+def medir_prompt(tokenizer, textos, repeticiones, etapas, tokens):
+    from prompts import build_prompt
+    from evidence import seleccionar_evidencia
+
+    def contar(texto):
+        return len(tokenizer(texto, add_special_tokens=False).input_ids)
+
+    def tokenizar(messages):
+        texto = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+        return tokenizer(texto).input_ids
+
+    prompts = {}
+    for paginas, texto in textos.items():
+        etapas[f"build_prompt.{paginas}p"] = percentiles(cronometrar(lambda: build_prompt(texto), repeticiones))
+        etapas[f"seleccionar_evidencia.{paginas}p"] = percentiles(
+            cronometrar(lambda: seleccionar_evidencia(texto, contar_tokens=contar), repeticiones)
+        )
+        completo = build_prompt(texto)
+        prompts[paginas] = build_prompt(seleccionar_evidencia(texto, contar_tokens=contar))
+        etapas[f"tokenizacion.{paginas}p"] = percentiles(cronometrar(lambda: tokenizar(prompts[paginas]), repeticiones))
+        tokens[f"{paginas}p"] = {
+            "caracteres_texto": len(texto),
+            "tokens_texto": contar(texto),
+            "tokens_prompt_completo": len(tokenizar(completo)),
+            "tokens_prompt_enviado": len(tokenizar(prompts[paginas]))
+        }
+    return prompts
+
+
+# Medimos la generación con ganchos en el modelo: la primera pasada es el prefill del prompt
+# y cada pasada siguiente decodifica un token
+def medir_generacion(model, tokenizer, prompts, repeticiones, max_tokens, etapas, tokens):
+    from model_utils import generate_output
+
+    pasadas = []
+    ganchos = [
+        model.register_forward_pre_hook(lambda modulo, entradas: pasadas.append([time.perf_counter(), None])),
+        model.register_forward_hook(lambda modulo, entradas, salida: pasadas[-1].__setitem__(1, time.perf_counter()))
+    ]
+    try:
+        generate_output(model, tokenizer, prompts[min(prompts)], max_tokens=8)
+        for paginas in TAMANOS_GENERACION:
+            prefill, decode, total, generados = [], [], [], []
+            for _ in range(repeticiones):
+                pasadas.clear()
+                inicio = time.perf_counter()
+                generate_output(model, tokenizer, prompts[paginas], max_tokens=max_tokens)
+                total.append(time.perf_counter() - inicio)
+                prefill.append(pasadas[0][1] - pasadas[0][0])
+                decode.extend(fin - comienzo for comienzo, fin in pasadas[1:])
+                generados.append(len(pasadas))
+            etapas[f"generate_output.prefill.{paginas}p"] = percentiles(prefill)
+            etapas[f"generate_output.decode_token.{paginas}p"] = percentiles(decode)
+            etapas[f"generate_output.total.{paginas}p"] = percentiles(total)
+            tokens[f"{paginas}p"]["tokens_generados"] = statistics.fmean(generados)
+    finally:
+        for gancho in ganchos:
+            gancho.remove()
+
+
+def medir_bd(repeticiones, etapas):
+    import submissions
+    from prompts import CHECKLIST
+    import review_cache
+    import jobs
+    import user_cache
+
+    respuesta = {codigo: {"answer": "Yes", "justification": "Benchmark."} for codigo in CHECKLIST}
+    fecha = datetime.now().isoformat()
+    usuario = "0000-0000-0000-0000"
+    titulos = [f"Benchmark {i}" for i in range(repeticiones)]
+    contador = iter(range(repeticiones * 10))
+
+    def insertar():
+        titulo = titulos[next(contador) % repeticiones]
+        doc = submissions.crear_submision(titulo, usuario, submissions.get_id())
+        submissions.insertar_bd(submissions.modificar_submision(doc, 1, respuesta, fecha))
+
+    def cada_titulo(funcion):
+        indice = iter(range(repeticiones))
+        return lambda: funcion(titulos[next(indice)])
+
+    pruebas = [
+        ("insertar_bd", insertar),
+        ("comprobar_existencia_submision", cada_titulo(lambda t: submissions.comprobar_existencia_submision(t, usuario))),
+        ("subir_nueva_version", cada_titulo(lambda t: submissions.subir_nueva_version(t, usuario, respuesta, fecha))),
+        ("buscar_en_bd", cada_titulo(lambda t: submissions.buscar_en_bd(t, usuario))),
+        ("buscar_titulos_bd", lambda: submissions.buscar_titulos_bd(usuario)),
+        ("buscar_historial_bd", lambda: submissions.buscar_historial_bd(usuario)),
+        ("buscar_version_bd", cada_titulo(lambda t: submissions.buscar_version_bd(t, usuario, 2))),
+        ("guardar_en_cache", cada_titulo(lambda t: review_cache.guardar_en_cache(
+            review_cache.clave_cache(t), t, respuesta))),
+        ("buscar_en_cache", cada_titulo(lambda t: review_cache.buscar_en_cache(review_cache.clave_cache(t)))),
+        ("encolar_trabajo", cada_titulo(lambda t: jobs.encolar_trabajo("nueva_version", usuario, t, b"%PDF-1.4"))),
+        ("existe_trabajo_pendiente", cada_titulo(lambda t: jobs.existe_trabajo_pendiente(t, usuario, "nueva_version")))
+    ]
+    # Las lecturas de títulos e historial pasan por la caché por usuario (ver user_cache.py):
+    # se desactiva para medir las consultas a la base de datos y después se miden aparte con la caché ya llena
+    con_cache = [
+        ("buscar_titulos_bd", lambda: submissions.buscar_titulos_bd(usuario)),
+        ("buscar_historial_bd", lambda: submissions.buscar_historial_bd(usuario))
+    ]
+    cache = user_cache._cache
+    # Los helpers imprimen los documentos que encuentran, no queremos medir la consola
+    with contextlib.redirect_stdout(io.StringIO()):
+        user_cache._cache = None
+        try:
+            for nombre, funcion in pruebas:
+                etapas[f"bd.{nombre}"] = percentiles(cronometrar(funcion, repeticiones))
+        finally:
+            user_cache._cache = cache
+        if cache is not None:
+            for nombre, funcion in con_cache:
+                funcion()
+                etapas[f"bd.{nombre}.user_cache"] = percentiles(cronometrar(funcion, repeticiones))
+
+
+# ---------------- COMPARACIÓN ----------------
+
+# Comparamos la mediana de cada etapa con un fichero de resultados anterior.
+# Devuelve las etapas que son más lentas que el umbral (nueva / anterior)
+def comparar(anterior, actual, umbral):
+    regresiones = []
+    print(f"\n{'etapa':50} {'p50 anterior':>14} {'p50 actual':>14} {'ratio':>7}")
+    for nombre, datos in actual["etapas"].items():
+        previo = anterior.get("etapas", {}).get(nombre)
+        if not previo or not previo["p50"]:
+            continue
+        ratio = datos["p50"] / previo["p50"]
+        marca = "  <-- regresión" if ratio > umbral else ""
+        print(f"{nombre:50} {previo['p50'] * 1000:12.3f}ms {datos['p50'] * 1000:12.3f}ms {ratio:7.2f}{marca}")
+        if ratio > umbral:
+            regresiones.append(nombre)
+    return regresiones
+
+
+def main(argumentos):
+    if not os.path.exists("properties.txt"):
+        print("No se encuentra properties.txt: ejecuta desde la raíz del proyecto (basta con copiar properties_ej.txt)")
+        return 2
+    modelo = _opcion(argumentos, "--modelo", "minimo")
+    repeticiones = int(_opcion(argumentos, "--repeticiones", 5))
+    max_tokens = int(_opcion(argumentos, "--max-tokens", 300))
+    salida = _opcion(argumentos, "--salida", "benchmark_results.json")
+    anterior = _opcion(argumentos, "--comparar", None)
+    umbral = float(_opcion(argumentos, "--umbral", 1.2))
+
+    # Todas las colecciones pasan a la base de datos en memoria antes de la primera conexión
+    import database
+    from benchmarks.mongo_memoria import ClienteMemoria
+    database._client = ClienteMemoria()
+
+    import torch
+    import transformers
+    import model_utils
+    from benchmarks.corpus import generar_corpus
+
+    print(f"Cargando el modelo ({modelo})...")
+    if modelo == "configurado":
+        model, tokenizer, nombre_modelo = model_utils.load_model()
+    else:
+        from benchmarks.modelo_minimo import cargar_modelo_minimo
+        model, tokenizer = cargar_modelo_minimo()
+        nombre_modelo = "minimo"
+        if model_utils.CONSTRAINED_DECODING:
+            model_utils.preparar_automata(model, tokenizer)
+        if model_utils.PREFIX_CACHE:
+            model_utils.preparar_prefijo(model, tokenizer)
+
+    resultados = {
+        "metadatos": {
+            "commit": _commit(),
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "transformers": transformers.__version__,
+            "plataforma": platform.platform(),
+            "modelo": nombre_modelo,
+            "repeticiones": repeticiones,
+            "max_tokens": max_tokens,
+            "prefix_cache": model_utils.PREFIX_CACHE,
+            "constrained_decoding": model_utils.CONSTRAINED_DECODING
+        },
+        "etapas": {},
+        "tokens": {}
+    }
+    etapas, tokens = resultados["etapas"], resultados["tokens"]
+
+    corpus = generar_corpus(TAMANOS_CORPUS)
+    print("Extracción de texto...")
+    textos = medir_pdf(corpus, repeticiones, etapas)
+    print("Prompt y tokenización...")
+    prompts = medir_prompt(tokenizer, textos, repeticiones, etapas, tokens)
+    print("Generación...")
+    medir_generacion(model, tokenizer, prompts, repeticiones, max_tokens, etapas, tokens)
+    print("Base de datos...")
+    medir_bd(max(repeticiones, 50), etapas)
+
+    with open(salida, "w") as f:
+        json.dump(resultados, f, indent=4)
+
+    print(f"\n{'etapa':50} {'p50':>10} {'p95':>10} {'n':>5}")
+    for nombre, datos in etapas.items():
+        print(f"{nombre:50} {datos['p50'] * 1000:8.3f}ms {datos['p95'] * 1000:8.3f}ms {datos['n']:5}")
+    print(f"\nResultados guardados en {salida}")
+
+    if anterior:
+        with open(anterior) as f:
+            regresiones = comparar(json.load(f), resultados, umbral)
+        if regresiones:
+            print(f"\n{len(regresiones)} etapas más lentas que el umbral ({umbral}x)")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,509 @@
+import io
+import os
+import sys
+import time
+import zipfile
+import logging
+import threading
+import configparser
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import ReturnDocument, ASCENDING
+from database import connect_bd, registrar_indice, asegurar_indices
+from prompts import build_prompt
+from submissions import get_id, crear_submision, modificar_submision, insertar_varios_bd
+from pdf_extraction import PDF_MAX_BYTES, comprobar_pdf
+from pdf_store import guardar_pdf, textos_pdfs
+from text_normalization import normalizar_texto
+from evidence import seleccionar_evidencia
+from incremental import calcular_huellas
+from review_cache import clave_cache, buscar_en_cache, guardar_en_cache
+from jobs import ejecutar_en_turno, registrar_pendientes, registrar_concesiones, fin_concesion, INSTANCE_ID
+from metrics import Contador, iniciar_resumen, terminar_resumen, anotar, span
+
+# Modo masivo: revisar muchos PDFs de una vez (un ZIP o varios archivos desde la web, o un directorio desde la
+# línea de comandos). Cada lote se guarda en MongoDB con el estado de cada PDF y se procesa por bloques:
+# extracción en paralelo, generación de todo el bloque a la vez (el motor de inferencia lo agrupa en lotes)
+# e inserción de las submissions con insert_many. Tras cada bloque se guarda el progreso, así un lote
+# interrumpido continúa por el primer PDF pendiente
+#
+#   python bulk.py <directorio> --user <orcid>     revisar todos los PDFs del directorio
+#   python bulk.py --reanudar <run_id>             continuar un lote interrumpido
+
+# Cargamos configuraciones para leer properties.txt
+config = configparser.ConfigParser()
+config.read("properties.txt")
+
+# Colección de los lotes (los PDFs se guardan en el almacén de pdf_store.py)
+BULK_COLLECTION = config.get("MONGODB", "mongo.bulk_collection", fallback="bulk_runs")
+# PDFs que se procesan juntos en cada bloque, máximo de PDFs por lote y de bytes entre todos sus PDFs
+BULK_CHUNK_SIZE = config.getint("BULK", "bulk.chunk_size", fallback=8)
+BULK_MAX_FILES = config.getint("BULK", "bulk.max_files", fallback=200)
+BULK_MAX_TOTAL_BYTES = config.getint("BULK", "bulk.max_total_bytes", fallback=500 * 1024 * 1024)
+
+# Estados de un lote y de cada PDF del lote
+ESTADO_EN_COLA = "queued"
+ESTADO_EJECUTANDO = "running"
+ESTADO_TERMINADO = "done"
+ESTADO_PENDIENTE = "pending"
+ESTADO_FALLIDO = "failed"
+ESTADO_OMITIDO = "skipped"
+
+logger = logging.getLogger(__name__)
+
+registrar_indice(BULK_COLLECTION, [("id_user", ASCENDING), ("creado", ASCENDING)], name="usuario_creado")
+registrar_indice(BULK_COLLECTION, [("estado", ASCENDING), ("lease_hasta", ASCENDING)], name="estado_lease")
+registrar_indice(BULK_COLLECTION, [("propietario", ASCENDING), ("estado", ASCENDING)], name="propietario_estado")
+
+PDFS_MASIVOS = Contador("bulk_items_total", "PDFs processed in bulk runs, by state")
+
+
+def connect_lotes():
+    return connect_bd(BULK_COLLECTION)
+
+
+# PDFs pendientes de los lotes en cola o en curso de todos los procesos: cuentan como trabajos en cola
+# para el control de admisión de jobs.py
+def pdfs_pendientes():
+    resultado = list(connect_lotes().aggregate([
+        {"$match": {"estado": {"$in": [ESTADO_EN_COLA, ESTADO_EJECUTANDO]}}},
+        {"$unwind": "$items"},
+        {"$match": {"items.estado": ESTADO_PENDIENTE}},
+        {"$count": "pendientes"}
+    ]))
+    return resultado[0]["pendientes"] if resultado else 0
+
+
+registrar_pendientes(pdfs_pendientes)
+
+
+# Comprobar el número de PDFs de un lote y los bytes entre todos ellos
+def _comprobar_limites(num_archivos, total_bytes):
+    if num_archivos > BULK_MAX_FILES:
+        raise ValueError(f"Se han subido {num_archivos} PDFs, el máximo por lote es {BULK_MAX_FILES}")
+    if total_bytes > BULK_MAX_TOTAL_BYTES:
+        raise ValueError(f"Los PDFs ocupan {total_bytes} bytes, el máximo por lote es {BULK_MAX_TOTAL_BYTES}")
+
+
+# PDFs de un ZIP como [(nombre, bytes)], sin directorios ni ficheros ocultos (p.ej. __MACOSX).
+# Los límites se comprueban con los tamaños declarados en el ZIP antes de descomprimir nada
+# (zipfile no descomprime de un miembro más bytes de los que declara)
+def archivos_de_zip(datos):
+    with zipfile.ZipFile(io.BytesIO(datos)) as zip_pdfs:
+        miembros = []
+        for info in zip_pdfs.infolist():
+            nombre = os.path.basename(info.filename)
+            if info.is_dir() or nombre.startswith(".") or "__MACOSX" in info.filename:
+                continue
+            if not nombre.lower().endswith(".pdf"):
+                continue
+            if info.file_size > PDF_MAX_BYTES:
+                raise ValueError(f"'{nombre}' ocupa {info.file_size} bytes, el máximo permitido es {PDF_MAX_BYTES}")
+            miembros.append((nombre, info))
+        _comprobar_limites(len(miembros), sum(info.file_size for _, info in miembros))
+        return [(nombre, zip_pdfs.read(info)) for nombre, info in miembros]
+
+
+# PDFs de un directorio como [(nombre, bytes)], ordenados por nombre
+def archivos_de_directorio(directorio):
+    archivos = []
+    for nombre in sorted(os.listdir(directorio)):
+        ruta = os.path.join(directorio, nombre)
+        if os.path.isfile(ruta) and nombre.lower().endswith(".pdf"):
+            with open(ruta, "rb") as f:
+                archivos.append((nombre, f.read()))
+    return archivos
+
+
+# Registrar un lote con sus PDFs. El título de cada submission es el nombre del archivo sin extensión;
+# los títulos repetidos dentro del lote se marcan como omitidos
+def crear_lote(user, archivos):
+    if not archivos:
+        raise ValueError("No se ha subido ningún PDF")
+    _comprobar_limites(len(archivos), sum(len(pdf_bytes) for _, pdf_bytes in archivos))
+    # Se comprueban todos antes de guardar ninguno
+    for nombre, pdf_bytes in archivos:
+        comprobar_pdf(pdf_bytes, f"'{nombre}'")
+
+    run_id = get_id()
+    ahora = datetime.now()
+    items, vistos = [], set()
+    for nombre, pdf_bytes in archivos:
+        titulo = os.path.splitext(nombre)[0].strip()
+        item = {"nombre": nombre, "titulo": titulo, "id_sub": get_id(), "pdf_hash": None,
+                "estado": ESTADO_PENDIENTE, "version": None, "error": None}
+        if titulo in vistos:
+            item.update({"estado": ESTADO_OMITIDO, "error": "Duplicated title in the upload"})
+        else:
+            vistos.add(titulo)
+            item["pdf_hash"] = guardar_pdf(pdf_bytes, nombre)
+        items.append(item)
+
+    lote = {
+        "_id": run_id,
+        "id_user": user,
+        "estado": ESTADO_EN_COLA,
+        # El lote pertenece al proceso que lo crea, igual que los trabajos (ver la concesión en jobs.py)
+        "propietario": INSTANCE_ID,
+        "lease_hasta": fin_concesion(),
+        "items": items,
+        "total": len(items),
+        "creado": ahora,
+        "iniciado": None,
+        "actualizado": ahora,
+        "terminado": None,
+        "error": None
+    }
+    connect_lotes().insert_one(lote)
+    logger.info(f"Lote {run_id} creado para el usuario {user} con {len(items)} PDFs")
+    return run_id
+
+
+def obtener_lote(run_id):
+    return connect_lotes().find_one({"_id": run_id})
+
+
+# Progreso del lote en un formato serializable en JSON
+def estado_lote_json(lote):
+    contadores = {estado: 0 for estado in (ESTADO_PENDIENTE, ESTADO_TERMINADO, ESTADO_FALLIDO, ESTADO_OMITIDO)}
+    for item in lote["items"]:
+        contadores[item["estado"]] += 1
+    creado, iniciado, terminado = lote.get("creado"), lote.get("iniciado"), lote.get("terminado")
+    return {
+        "id": lote["_id"],
+        "estado": lote["estado"],
+        "total": lote["total"],
+        "procesados": lote["total"] - contadores[ESTADO_PENDIENTE],
+        "contadores": contadores,
+        "items": [
+            {clave: item[clave] for clave in ("nombre", "titulo", "estado", "version", "error")}
+            for item in lote["items"]
+        ],
+        "error": lote.get("error"),
+        "creado": creado.isoformat() if creado else None,
+        "iniciado": iniciado.isoformat() if iniciado else None,
+        "terminado": terminado.isoformat() if terminado else None
+    }
+
+
+# Lotes pendientes cuya concesión caducó (su proceso murió) o que no tienen concesión
+def _filtro_caducados():
+    return {
+        "estado": {"$in": [ESTADO_EN_COLA, ESTADO_EJECUTANDO]},
+        "$or": [{"lease_hasta": {"$lt": datetime.now()}}, {"lease_hasta": None}]
+    }
+
+
+# Reclamar un lote para procesarlo: en cola y de este proceso, o pendiente con la concesión caducada
+def _reclamar(run_id):
+    ahora = datetime.now()
+    return connect_lotes().find_one_and_update(
+        {"_id": run_id, "$or": [
+            {"estado": ESTADO_EN_COLA, "propietario": INSTANCE_ID},
+            _filtro_caducados()
+        ]},
+        {"$set": {"estado": ESTADO_EJECUTANDO, "iniciado": ahora, "actualizado": ahora,
+                  "propietario": INSTANCE_ID, "lease_hasta": fin_concesion()}},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+# Renovar la concesión de los lotes de este proceso (lo llama periódicamente el hilo de concesiones de jobs.py)
+def renovar_concesiones_lotes():
+    connect_lotes().update_many(
+        {"propietario": INSTANCE_ID, "estado": {"$in": [ESTADO_EN_COLA, ESTADO_EJECUTANDO]}},
+        {"$set": {"lease_hasta": fin_concesion()}}
+    )
+
+
+# Guardar el estado de los PDFs de un bloque (el punto de control desde el que se reanuda)
+def _guardar_progreso(run_id, cambios):
+    actualizacion = {"actualizado": datetime.now()}
+    for posicion, item in cambios.items():
+        for clave in ("estado", "version", "error"):
+            actualizacion[f"items.{posicion}.{clave}"] = item[clave]
+    connect_lotes().update_one({"_id": run_id}, {"$set": actualizacion})
+    for item in cambios.values():
+        PDFS_MASIVOS.inc(state=item["estado"])
+
+
+# Revisión de un PDF del bloque (se ejecuta en un hilo por PDF para que el motor los agrupe)
+def _revisar(texto, segundos_extraccion, generar_revision, contar_tokens):
+    iniciar_resumen()
+    try:
+        anotar("extraccion_pdf_s", segundos_extraccion)
+        with span("normalizacion"):
+            texto, _ = normalizar_texto(texto, contar_tokens=contar_tokens)
+        # Huellas de las secciones para revisar de forma incremental las versiones siguientes
+        with span("secciones"):
+            huellas = calcular_huellas(texto)
+        with span("evidencias"):
+            texto = seleccionar_evidencia(texto, contar_tokens=contar_tokens)
+        with span("prompt"):
+            messages = build_prompt(texto)
+        with span("generacion"):
+            result = generar_revision(messages)
+        anotar("json_valido", "error" not in result)
+    finally:
+        tiempos = terminar_resumen()
+    return result, tiempos, huellas
+
+
+# Procesar un bloque de PDFs pendientes. Devuelve {posición: item actualizado}
+def _procesar_bloque(lote, bloque, generar_revision, contar_tokens):
+    user = lote["id_user"]
+    fecha = str(datetime.now()).split(".")[0]
+    cambios = {}
+
+    # Submissions que ya existen: si es la de este lote (se insertó antes de guardar el progreso) está hecha
+    existentes = {
+        doc["titulo"]: doc.get("id_sub")
+        for doc in connect_bd().find(
+            {"id_user": user, "titulo": {"$in": [item["titulo"] for _, item in bloque]}},
+            {"titulo": 1, "id_sub": 1}
+        )
+    }
+    pendientes = []
+    for posicion, item in bloque:
+        if item["titulo"] in existentes:
+            if existentes[item["titulo"]] == item["id_sub"]:
+                cambios[posicion] = dict(item, estado=ESTADO_TERMINADO, version=1)
+            else:
+                cambios[posicion] = dict(item, estado=ESTADO_OMITIDO, error="A submission with this title already exists")
+        else:
+            pendientes.append((posicion, item))
+
+    # Revisiones ya generadas para el mismo PDF, modelo y prompt
+    resultados = {}
+    sin_cache = []
+    for posicion, item in pendientes:
+        # Los lotes siempre hacen la revisión completa, sea cual sea review_mode
+        clave = clave_cache(item["pdf_hash"], modo="full")
+        entrada = buscar_en_cache(clave)
+        if entrada is not None:
+            result, huellas = entrada
+            resultados[posicion] = (result, {"cache_hit": True}, huellas)
+        else:
+            sin_cache.append((posicion, item, clave))
+
+    if sin_cache:
+        # Texto ya extraído de los PDFs guardados; los que faltan se extraen a la vez en el pool de procesos
+        extraidos = textos_pdfs([item["pdf_hash"] for _, item, _ in sin_cache])
+
+        # Generación concurrente: cada PDF espera en un hilo su turno en la cola de revisiones (ver jobs.py),
+        # así el lote no pasa por delante de las subidas de otros usuarios, y el motor forma los lotes
+        with ThreadPoolExecutor(max_workers=max(1, len(sin_cache))) as pool:
+            futuros = {}
+            for (posicion, item, clave), (texto, informe) in zip(sin_cache, extraidos):
+                if texto is None:
+                    cambios[posicion] = dict(item, estado=ESTADO_FALLIDO, error=informe["error"])
+                    continue
+                segundos = sum(informe.get("tiempos_paginas", []))
+                futuros[posicion] = (item, clave, pool.submit(
+                    ejecutar_en_turno, user, _revisar, texto, segundos, generar_revision, contar_tokens
+                ))
+            for posicion, (item, clave, futuro) in futuros.items():
+                try:
+                    result, tiempos, huellas = futuro.result()
+                except Exception as e:
+                    logger.exception(f"Error revisando '{item['titulo']}' en el lote {lote['_id']}")
+                    cambios[posicion] = dict(item, estado=ESTADO_FALLIDO, error=str(e))
+                    continue
+                if "error" not in result:
+                    guardar_en_cache(clave, item["pdf_hash"], result, huellas)
+                resultados[posicion] = (result, tiempos, huellas)
+
+    # Todas las submissions del bloque en un solo insert_many
+    posiciones = sorted(resultados)
+    docs = []
+    for posicion in posiciones:
+        item = lote["items"][posicion]
+        result, tiempos, huellas = resultados[posicion]
+        json_total = crear_submision(item["titulo"], user, item["id_sub"], item["pdf_hash"])
+        docs.append(modificar_submision(json_total, 1, result, fecha, tiempos, huellas, item["pdf_hash"]))
+    errores = insertar_varios_bd(docs)
+    for indice, posicion in enumerate(posiciones):
+        item = lote["items"][posicion]
+        if indice in errores:
+            # Clave duplicada: otra subida creó la submission con ese título mientras se revisaba
+            if errores[indice].get("code") == 11000:
+                cambios[posicion] = dict(item, estado=ESTADO_OMITIDO, error="A submission with this title already exists")
+            else:
+                cambios[posicion] = dict(item, estado=ESTADO_FALLIDO, error=errores[indice].get("errmsg", "write error"))
+        else:
+            cambios[posicion] = dict(item, estado=ESTADO_TERMINADO, version=1)
+    return cambios
+
+
+# Procesar los PDFs pendientes de un lote por bloques. progreso(estado_json) se llama tras cada bloque.
+# Devuelve el estado final del lote, o None si otro proceso lo está procesando
+def procesar_lote(run_id, generar_revision, contar_tokens, progreso=None):
+    lote = _reclamar(run_id)
+    if lote is None:
+        logger.info(f"El lote {run_id} no está pendiente o lo procesa otro proceso")
+        return None
+
+    inicio = time.perf_counter()
+    pendientes = [(posicion, item) for posicion, item in enumerate(lote["items"]) if item["estado"] == ESTADO_PENDIENTE]
+    logger.info(f"Procesando el lote {run_id}: {len(pendientes)} de {lote['total']} PDFs pendientes")
+    try:
+        for desde in range(0, len(pendientes), BULK_CHUNK_SIZE):
+            bloque = pendientes[desde:desde + BULK_CHUNK_SIZE]
+            cambios = _procesar_bloque(lote, bloque, generar_revision, contar_tokens)
+            _guardar_progreso(run_id, cambios)
+            for posicion, item in cambios.items():
+                lote["items"][posicion] = item
+            logger.info(f"Lote {run_id}: {desde + len(bloque)}/{len(pendientes)} PDFs pendientes procesados")
+            if progreso:
+                progreso(estado_lote_json(lote))
+    except Exception as e:
+        # Los PDFs ya procesados quedan guardados, el lote se puede reanudar
+        logger.exception(f"Error procesando el lote {run_id}")
+        connect_lotes().update_one(
+            {"_id": run_id},
+            {"$set": {"estado": ESTADO_FALLIDO, "error": str(e), "terminado": datetime.now()}}
+        )
+        raise
+
+    connect_lotes().update_one(
+        {"_id": run_id},
+        {"$set": {"estado": ESTADO_TERMINADO, "terminado": datetime.now(), "actualizado": datetime.now()}}
+    )
+    logger.info(f"Lote {run_id} terminado en {time.perf_counter() - inicio:.1f} s")
+    return estado_lote_json(obtener_lote(run_id))
+
+
+# Volver a poner en cola un lote fallido o interrumpido para continuar por sus PDFs pendientes; los PDFs
+# que fallaron se vuelven a intentar (desde la línea de comandos, quien lo pide sabe que ningún otro
+# proceso lo está ejecutando)
+def reanudar_lote(run_id):
+    lote = obtener_lote(run_id)
+    if lote is None:
+        return False
+    items = [
+        dict(item, estado=ESTADO_PENDIENTE, error=None) if item["estado"] == ESTADO_FALLIDO else item
+        for item in lote["items"]
+    ]
+    resultado = connect_lotes().update_one(
+        {"_id": run_id, "estado": {"$in": [ESTADO_EJECUTANDO, ESTADO_FALLIDO, ESTADO_TERMINADO]}},
+        {"$set": {"estado": ESTADO_EN_COLA, "error": None, "terminado": None, "items": items,
+                  "propietario": INSTANCE_ID, "lease_hasta": fin_concesion()}}
+    )
+    return resultado.modified_count > 0
+
+
+# Procesar un lote en segundo plano (desde la web)
+def iniciar_lote(run_id, generar_revision, contar_tokens):
+    def ejecutar():
+        try:
+            procesar_lote(run_id, generar_revision, contar_tokens)
+        except Exception:
+            pass  # el error ya queda guardado en el lote
+
+    hilo = threading.Thread(target=ejecutar, name=f"bulk-{run_id}", daemon=True)
+    hilo.start()
+    return hilo
+
+
+# Retomar los lotes con la concesión caducada (se reclaman de forma atómica en procesar_lote)
+def retomar_caducados(generar_revision, contar_tokens):
+    total = 0
+    for lote in connect_lotes().find(_filtro_caducados(), {"_id": 1}):
+        iniciar_lote(lote["_id"], generar_revision, contar_tokens)
+        total += 1
+    if total:
+        logger.info(f"Retomados {total} lotes de procesos cuya concesión caducó")
+    return total
+
+
+# Al arrancar, retomamos los lotes que este proceso dejó en cola o a medias en una ejecución anterior (mismo
+# INSTANCE_ID) y los de otros procesos con la concesión caducada. Después el hilo de concesiones de jobs.py
+# renueva las de los lotes de este proceso y retoma periódicamente los caducados
+def recuperar_lotes(generar_revision, contar_tokens):
+    propios = connect_lotes().find(
+        {"propietario": INSTANCE_ID, "estado": {"$in": [ESTADO_EN_COLA, ESTADO_EJECUTANDO]}}, {"_id": 1}
+    )
+    run_ids = [lote["_id"] for lote in propios]
+    connect_lotes().update_many(
+        {"_id": {"$in": run_ids}, "estado": ESTADO_EJECUTANDO}, {"$set": {"estado": ESTADO_EN_COLA}}
+    )
+    renovar_concesiones_lotes()
+    for run_id in run_ids:
+        iniciar_lote(run_id, generar_revision, contar_tokens)
+    if run_ids:
+        logger.info(f"Retomados {len(run_ids)} lotes de una ejecución anterior")
+    retomar_caducados(generar_revision, contar_tokens)
+    registrar_concesiones(renovar_concesiones_lotes, lambda: retomar_caducados(generar_revision, contar_tokens))
+
+
+# ---------------- LÍNEA DE COMANDOS ----------------
+
+def _opcion(argumentos, nombre, defecto=None):
+    if nombre in argumentos:
+        return argumentos[argumentos.index(nombre) + 1]
+    return defecto
+
+
+# Función de generación y de conteo de tokens para la línea de comandos: el servidor de modelo si está
+# configurado, o el modelo cargado en este proceso con su motor de inferencia
+def _preparar_modelo():
+    import model_client
+    from evidence import estimar_tokens
+    if model_client.usar_servidor():
+        return (lambda messages: model_client.generate_output(messages)), estimar_tokens
+
+    from model_loader import iniciar_carga, esperar_carga, estado_carga, obtener_modelo
+    from inference_engine import iniciar_motor, generar
+    iniciar_carga(iniciar_motor)
+    while not esperar_carga(5):
+        estado = estado_carga()
+        if estado["phase"] == "failed":
+            raise RuntimeError(f"No se pudo cargar el modelo: {estado['error']}")
+        print(f"Cargando el modelo: {estado['phase']} ({estado['progress']}%)")
+    _, tokenizer, _ = obtener_modelo()
+
+    def contar_tokens(texto):
+        return len(tokenizer(texto, add_special_tokens=False).input_ids)
+
+    return (lambda messages: generar(tokenizer, messages)), contar_tokens
+
+
+def _imprimir_progreso(estado):
+    contadores = estado["contadores"]
+    print(f"[{estado['procesados']}/{estado['total']}] done={contadores[ESTADO_TERMINADO]} "
+          f"failed={contadores[ESTADO_FALLIDO]} skipped={contadores[ESTADO_OMITIDO]}")
+
+
+def main(argumentos):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', datefmt='%m-%d %H:%M:%S')
+    asegurar_indices()
+    # Mientras se carga el modelo y se procesa, el lote mantiene su concesión para que los procesos web no lo retomen
+    registrar_concesiones(renovar_concesiones_lotes)
+    run_id = _opcion(argumentos, "--reanudar")
+    if run_id:
+        lote = obtener_lote(run_id)
+        if lote is None:
+            print(f"No existe el lote {run_id}")
+            return 2
+        reanudar_lote(run_id)
+    else:
+        user = _opcion(argumentos, "--user")
+        if not argumentos or argumentos[0].startswith("--") or not user:
+            print("Uso: python bulk.py <directorio> --user <orcid> | python bulk.py --reanudar <run_id>")
+            return 2
+        run_id = crear_lote(user, archivos_de_directorio(argumentos[0]))
+        print(f"Lote {run_id} creado (para continuarlo si se interrumpe: python bulk.py --reanudar {run_id})")
+
+    generar_revision, contar_tokens = _preparar_modelo()
+    estado = procesar_lote(run_id, generar_revision, contar_tokens, progreso=_imprimir_progreso)
+    if estado is None:
+        print(f"El lote {run_id} lo está procesando otro proceso")
+        return 1
+    for item in estado["items"]:
+        if item["estado"] != ESTADO_TERMINADO:
+            print(f"  {item['nombre']}: {item['estado']} ({item['error']})")
+    return 0 if estado["contadores"][ESTADO_FALLIDO] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
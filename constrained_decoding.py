@@ -0,0 +1,254 @@
+import bisect
+import threading
+import torch
+from transformers import LogitsProcessor
+
+# Respuestas válidas para cada pregunta del checklist
+RESPUESTAS = ("Yes", "No", "N/A")
+
+# Tablas de vocabulario ya calculadas, una por tokenizador
+_tablas = {}
+_lock = threading.Lock()
+
+
+# ---------------- PLANTILLA ----------------
+
+# La salida esperada es una secuencia fija de piezas:
+#   ("lit", texto)       texto que se copia tal cual
+#   ("opc", opciones)    una de las opciones
+#   ("libre", maximo)    texto de una cadena JSON de como mucho `maximo` caracteres, incluida su comilla de cierre
+def plantilla_checklist(codigos, max_caracteres):
+    piezas = []
+
+    def literal(texto):
+        if piezas and piezas[-1][0] == "lit":
+            piezas[-1] = ("lit", piezas[-1][1] + texto)
+        else:
+            piezas.append(("lit", texto))
+
+    # Mismo formato que el ejemplo del prompt, así la restricción casi nunca contradice al modelo
+    for n, codigo in enumerate(codigos):
+        literal(("{" if n == 0 else ",") + f'\n    "{codigo}": {{\n        "answer": "')
+        piezas.append(("opc", RESPUESTAS))
+        literal('",\n        "justification": "')
+        piezas.append(("libre", max_caracteres))
+        literal("\n    }")
+    literal("\n}")
+    return piezas
+
+
+# Carácter que puede ir dentro de una cadena JSON sin escaparlo
+def es_plano(c):
+    return c >= " " and c not in '"\\\x7f\ufffd'
+
+
+def _inicio(piezas, i):
+    return "" if i < len(piezas) and piezas[i][0] == "opc" else 0
+
+
+# Estado tras añadir `texto` a la salida, None si el texto no encaja en la plantilla.
+# Un estado es (índice de la pieza, progreso dentro de ella); índice == len(piezas) significa terminado
+def avanzar(piezas, estado, texto):
+    i, p = estado
+    for c in texto:
+        if i == len(piezas):
+            return None
+        tipo, valor = piezas[i]
+        if tipo == "lit":
+            if valor[p] != c:
+                return None
+            p += 1
+            if p == len(valor):
+                i += 1
+                p = _inicio(piezas, i)
+        elif tipo == "opc":
+            p += c
+            if not any(opcion.startswith(p) for opcion in valor):
+                return None
+            if p in valor and not any(opcion != p and opcion.startswith(p) for opcion in valor):
+                i += 1
+                p = _inicio(piezas, i)
+        else:
+            if c == '"':
+                i += 1
+                p = _inicio(piezas, i)
+            elif p < valor and es_plano(c):
+                p += 1
+            else:
+                return None
+    return i, p
+
+
+# Caracteres que pueden seguir en una pieza literal o de opciones
+def _siguientes(piezas, estado):
+    i, p = estado
+    tipo, valor = piezas[i]
+    if tipo == "lit":
+        return [valor[p]]
+    return sorted({opcion[len(p)] for opcion in valor if opcion.startswith(p) and len(opcion) > len(p)})
+
+
+# ---------------- VOCABULARIO ----------------
+
+# Texto de cada token del vocabulario, preparado para buscar rápido los tokens compatibles con la plantilla
+class TablaVocabulario:
+    def __init__(self, tokenizer):
+        especiales = set(tokenizer.all_special_ids)
+        textos = tokenizer.batch_decode([[i] for i in range(len(tokenizer))])
+        # Los tokens especiales y los que dejan un carácter UTF-8 a medias nunca se permiten
+        self.textos = [
+            "" if i in especiales or "\ufffd" in texto else texto
+            for i, texto in enumerate(textos)
+        ]
+        self.exactos = {}
+        for i, texto in enumerate(self.textos):
+            if texto:
+                self.exactos.setdefault(texto, []).append(i)
+        self.ordenados = sorted(self.exactos)
+        self.largos = torch.tensor([len(texto) for texto in self.textos])
+        self.planos = torch.tensor([bool(texto) and all(es_plano(c) for c in texto) for texto in self.textos])
+        # Tokens que pueden cerrar una cadena: texto plano, comilla y lo que venga después
+        self.cierres = []
+        for i, texto in enumerate(self.textos):
+            k = texto.find('"')
+            if k >= 0 and all(es_plano(c) for c in texto[:k]):
+                self.cierres.append((i, k, texto[k + 1:]))
+
+    def hay_prefijo(self, prefijo):
+        k = bisect.bisect_left(self.ordenados, prefijo)
+        return k < len(self.ordenados) and self.ordenados[k].startswith(prefijo)
+
+
+def tabla_vocabulario(tokenizer):
+    with _lock:
+        if id(tokenizer) not in _tablas:
+            _tablas[id(tokenizer)] = TablaVocabulario(tokenizer)
+        return _tablas[id(tokenizer)]
+
+
+# ---------------- AUTÓMATA ----------------
+
+# Calcula qué tokens pueden seguir en cada estado de la plantilla (con memoria para los estados fijos)
+class AutomataJSON:
+    def __init__(self, piezas, tabla, eos_ids):
+        self.piezas = piezas
+        self.tabla = tabla
+        self.eos_ids = list(eos_ids)
+        self.memoria = {}
+        self.cierres = {}
+        # Caracteres fijos que quedan desde el principio de cada pieza hasta el final (una comilla por cadena libre)
+        self.pendientes = [0] * (len(piezas) + 1)
+        for i in range(len(piezas) - 1, -1, -1):
+            tipo, valor = piezas[i]
+            largo = len(valor) if tipo == "lit" else max(map(len, valor)) if tipo == "opc" else 1
+            self.pendientes[i] = self.pendientes[i + 1] + largo
+
+    def inicial(self):
+        return 0, _inicio(self.piezas, 0)
+
+    def avanzar(self, estado, token_id):
+        return avanzar(self.piezas, estado, self.tabla.textos[token_id])
+
+    def terminado(self, estado):
+        return estado[0] == len(self.piezas)
+
+    # Máscara de los tokens permitidos en un estado. Si solo quedan `quedan` tokens, las cadenas libres se cierran
+    # a tiempo para que el resto de la plantilla quepa aunque cada carácter ocupe un token
+    def permitidos(self, estado, quedan=None):
+        i, p = estado
+        if i < len(self.piezas) and self.piezas[i][0] == "libre":
+            restante = self.piezas[i][1] - p
+            if quedan is not None and quedan <= self.pendientes[i]:
+                restante = 0
+            mascara = self.tabla.planos & (self.tabla.largos <= restante)
+            for token_id, largo in self._cierres(i):
+                if largo <= restante:
+                    mascara[token_id] = True
+            return mascara
+        if estado not in self.memoria:
+            mascara = torch.zeros(len(self.tabla.textos), dtype=torch.bool)
+            if self.terminado(estado):
+                mascara[self.eos_ids] = True
+            else:
+                ids = []
+                self._explorar("", estado, ids)
+                mascara[ids] = True
+            self.memoria[estado] = mascara
+        return self.memoria[estado]
+
+    # Recorremos los textos compatibles con la plantilla que son prefijo de algún token.
+    # Un token puede terminar justo donde empieza una cadena libre pero no entrar en ella
+    def _explorar(self, prefijo, estado, ids):
+        if prefijo:
+            ids.extend(self.tabla.exactos.get(prefijo, []))
+        if self.terminado(estado) or self.piezas[estado[0]][0] == "libre":
+            return
+        for c in _siguientes(self.piezas, estado):
+            if self.tabla.hay_prefijo(prefijo + c):
+                self._explorar(prefijo + c, avanzar(self.piezas, estado, c), ids)
+
+    # Tokens que cierran la cadena libre de la pieza i y continúan bien la plantilla, con su parte plana
+    def _cierres(self, i):
+        if i not in self.cierres:
+            siguiente = (i + 1, _inicio(self.piezas, i + 1))
+            self.cierres[i] = [
+                (token_id, largo) for token_id, largo, resto in self.tabla.cierres
+                if avanzar(self.piezas, siguiente, resto) is not None
+            ]
+        return self.cierres[i]
+
+
+# LogitsProcessor para generate: en cada paso solo deja elegir tokens que mantienen la salida dentro de la plantilla
+# y fuerza el fin de secuencia en cuanto se cierra el objeto JSON.
+# El estado de cada fila se deduce de los tokens generados que recibe, no del número de llamadas, porque en la
+# decodificación asistida el mismo procesador se usa con el modelo borrador y al verificar varios candidatos a la vez.
+# automata puede ser una lista con el autómata de cada fila, si las filas del lote piden preguntas distintas
+class ProcesadorJSON(LogitsProcessor):
+    def __init__(self, automata, max_tokens=None):
+        self.automata = automata
+        self.automatas = None
+        self.max_tokens = max_tokens
+        self.largo_prompt = None
+        self.historial = None
+
+    def __call__(self, input_ids, scores):
+        if self.largo_prompt is None:
+            self.largo_prompt = input_ids.shape[1]
+            filas = input_ids.shape[0]
+            self.automatas = list(self.automata) if isinstance(self.automata, (list, tuple)) else [self.automata] * filas
+            self.historial = [([], [self.automatas[fila].inicial()]) for fila in range(filas)]
+        generados = input_ids[:, self.largo_prompt:].tolist()
+        quedan = self.max_tokens - len(generados[0]) if self.max_tokens else None
+
+        mascara = torch.zeros(scores.shape, dtype=torch.bool)
+        for fila, ids in enumerate(generados):
+            estado = self._estado(fila, ids)
+            if estado is None:
+                mascara[fila] = True
+                continue
+            permitidos = self.automatas[fila].permitidos(estado, quedan)
+            n = min(len(permitidos), scores.shape[1])
+            mascara[fila, :n] = permitidos[:n]
+        return scores.masked_fill(~mascara.to(scores.device), float("-inf"))
+
+    # Estado de una fila tras sus tokens generados, reutilizando la parte común con la llamada anterior
+    def _estado(self, fila, ids):
+        tokens, estados = self.historial[fila]
+        comun = min(len(ids), len(tokens))
+        if ids[:comun] != tokens[:comun]:
+            comun = next(k for k in range(comun) if ids[k] != tokens[k])
+        del tokens[comun:]
+        del estados[comun + 1:]
+        for token_id in ids[comun:]:
+            estado = estados[-1]
+            # Las filas terminadas siguen recibiendo relleno hasta que acaba el lote
+            if estado is not None and not self.automatas[fila].terminado(estado):
+                estado = self.automatas[fila].avanzar(estado, token_id)
+            tokens.append(token_id)
+            estados.append(estado)
+        return estados[-1]
+
+
+# Autómata del checklist para un tokenizador (la tabla de vocabulario se calcula una sola vez)
+def automata_checklist(tokenizer, codigos, max_caracteres, eos_ids):
+    return AutomataJSON(plantilla_checklist(codigos, max_caracteres), tabla_vocabulario(tokenizer), eos_ids)
@@ -0,0 +1,91 @@
+import threading
+import logging
+import configparser
+from pymongo import MongoClient, monitoring
+from pymongo.errors import PyMongoError
+from metrics import Contador, Histograma, anotar
+
+# Cargamos configuraciones para leer properties.txt
+config = configparser.ConfigParser()
+config.read("properties.txt")
+
+# Leemos las configuraciones de la base de datos en properties.txt para aumentar la seguridad
+URL_BD = config["MONGODB"]["mongo.url"]
+DATABASE_NAME = config["MONGODB"]["mongo.database"]
+COLLECTION_NAME = config["MONGODB"]["mongo.collection"]
+
+# Tamaño del pool de conexiones y tiempos de espera (en milisegundos)
+MONGO_MAX_POOL_SIZE = config.getint("MONGODB", "mongo.max_pool_size", fallback=50)
+MONGO_MIN_POOL_SIZE = config.getint("MONGODB", "mongo.min_pool_size", fallback=1)
+MONGO_CONNECT_TIMEOUT_MS = config.getint("MONGODB", "mongo.connect_timeout_ms", fallback=5000)
+MONGO_SERVER_SELECTION_TIMEOUT_MS = config.getint("MONGODB", "mongo.server_selection_timeout_ms", fallback=5000)
+MONGO_SOCKET_TIMEOUT_MS = config.getint("MONGODB", "mongo.socket_timeout_ms", fallback=30000)
+
+logger = logging.getLogger(__name__)
+
+# Duración de cada comando enviado a MongoDB
+COMANDOS_SEGUNDOS = Histograma("mongo_command_seconds", "Duration of MongoDB commands by command name")
+COMANDOS_FALLIDOS = Contador("mongo_command_failures_total", "Failed MongoDB commands by command name")
+
+
+# Listener de pymongo que mide todos los comandos. Se llama en el hilo que ejecuta la operación,
+# así que el tiempo también se suma al resumen de la revisión que se esté procesando en ese hilo
+class MedidorComandos(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        segundos = event.duration_micros / 1_000_000
+        COMANDOS_SEGUNDOS.observar(segundos, command=event.command_name)
+        anotar("mongo_s", segundos, sumar=True)
+        anotar("mongo_ops", 1, sumar=True)
+
+    def failed(self, event):
+        COMANDOS_SEGUNDOS.observar(event.duration_micros / 1_000_000, command=event.command_name)
+        COMANDOS_FALLIDOS.inc(command=event.command_name)
+
+
+# Un único cliente (y por tanto un único pool de conexiones) por proceso
+_client = None
+_lock = threading.Lock()
+
+# Índices que cada módulo necesita en sus colecciones, se crean al arrancar con asegurar_indices()
+_indices = []
+
+
+# Cliente de MongoDB compartido, se crea en la primera llamada
+def get_client():
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = MongoClient(
+                    URL_BD,
+                    maxPoolSize=MONGO_MAX_POOL_SIZE,
+                    minPoolSize=MONGO_MIN_POOL_SIZE,
+                    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+                    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                    socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+                    event_listeners=[MedidorComandos()]
+                )
+    return _client
+
+
+# Nos conectamos a la bd de MongoDB (por defecto a la colección de submissions)
+def connect_bd(nombre_coleccion=COLLECTION_NAME):
+    return get_client()[DATABASE_NAME][nombre_coleccion]
+
+
+# Registrar un índice para crearlo al arrancar (claves en el formato de create_index)
+def registrar_indice(nombre_coleccion, claves, **opciones):
+    _indices.append((nombre_coleccion, claves, opciones))
+
+
+# Crear los índices registrados que aún no existan (create_index no hace nada si ya existe)
+def asegurar_indices():
+    for nombre_coleccion, claves, opciones in _indices:
+        try:
+            connect_bd(nombre_coleccion).create_index(claves, **opciones)
+        except PyMongoError as e:
+            logger.error(f"No se pudo crear el índice {claves} en '{nombre_coleccion}': {e}")
+    logger.info(f"Comprobados {len(_indices)} índices de MongoDB")
@@ -0,0 +1,165 @@
+import re
+import math
+import configparser
+from collections import Counter
+
+# Cargamos configuraciones para leer properties.txt
+config = configparser.ConfigParser()
+config.read("properties.txt")
+
+# Presupuesto de tokens para el texto del artículo que se envía al modelo (0 = enviar el texto completo)
+EVIDENCE_MAX_TOKENS = config.getint("LLM", "evidence_max_tokens", fallback=6000)
+# Tamaño aproximado (en palabras) de cada pasaje del índice
+EVIDENCE_PASSAGE_WORDS = config.getint("LLM", "evidence_passage_words", fallback=120)
+
+# Parámetros habituales de BM25
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Separador entre pasajes no consecutivos en el texto que recibe el modelo
+SEPARADOR_PASAJES = "\n\n[...]\n\n"
+
+# Consultas asociadas a cada pregunta del checklist
+CONSULTAS = {
+    "Q1.1": "null hypothesis hypotheses H0 no difference research question hypothesize",
+    "Q1.2": "alternative hypothesis hypotheses H1 Ha expected difference hypothesize",
+    "Q2": "sample size calculation power analysis a priori effect size participants subjects G*Power required",
+    "Q3": "random selection randomly selected sampling sample recruited convenience population participants",
+    "Q4": "random assignment randomly assigned randomized randomization treatment control group allocation blocking",
+    "Q5": "assumptions normality normal distribution Shapiro Wilk Kolmogorov heteroskedasticity homoscedasticity Levene variance",
+    "Q6": "linear model regression ANOVA mixed model GLM fixed effects random effects factors",
+    "Q7": "p-value significance significant confidence interval effect size power alpha statistically",
+    "Q8": "post hoc power observed power achieved power retrospective",
+    "Q9": "multiple testing multiple comparisons Bonferroni Holm correction family-wise false discovery adjusted",
+    "Q10": "descriptive statistics mean median standard deviation counts frequencies table boxplot"
+}
+
+
+# Pasamos un texto a una lista de términos en minúsculas
+def terminos(texto):
+    return re.findall(r"[a-z0-9]+", texto.lower())
+
+
+# Estimación de tokens cuando no se dispone del tokenizador
+def estimar_tokens(texto):
+    return int(len(texto.split()) * 1.3) + 1
+
+
+# Dividimos el texto extraído en pasajes de unas pocas líneas, sin partir las líneas
+def dividir_en_pasajes(texto, palabras_por_pasaje=EVIDENCE_PASSAGE_WORDS):
+    pasajes = []
+    actual = []
+    palabras = 0
+    for linea in texto.split("\n"):
+        if not linea.strip():
+            # Un salto de párrafo cierra el pasaje si ya tiene un tamaño razonable
+            if palabras >= palabras_por_pasaje // 2:
+                pasajes.append("\n".join(actual))
+                actual, palabras = [], 0
+            continue
+        actual.append(linea)
+        palabras += len(linea.split())
+        if palabras >= palabras_por_pasaje:
+            pasajes.append("\n".join(actual))
+            actual, palabras = [], 0
+    if actual:
+        pasajes.append("\n".join(actual))
+    return pasajes
+
+
+# Índice BM25 sobre los pasajes
+def construir_indice(pasajes):
+    documentos = [Counter(terminos(p)) for p in pasajes]
+    longitudes = [sum(d.values()) for d in documentos]
+    frecuencia_docs = Counter()
+    for d in documentos:
+        frecuencia_docs.update(d.keys())
+    return {
+        "documentos": documentos,
+        "longitudes": longitudes,
+        "media": (sum(longitudes) / len(longitudes)) if longitudes else 0,
+        "df": frecuencia_docs,
+        "n": len(documentos)
+    }
+
+
+# Puntuación BM25 de cada pasaje para una consulta
+def puntuar(indice, consulta):
+    n = indice["n"]
+    puntuaciones = [0.0] * n
+    for termino in set(terminos(consulta)):
+        df = indice["df"].get(termino, 0)
+        if df == 0:
+            continue
+        idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+        for i, documento in enumerate(indice["documentos"]):
+            tf = documento.get(termino, 0)
+            if tf == 0:
+                continue
+            norma = 1 - BM25_B + BM25_B * indice["longitudes"][i] / (indice["media"] or 1)
+            puntuaciones[i] += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * norma)
+    return puntuaciones
+
+
+# Elegimos los pasajes más relevantes para cada pregunta hasta agotar el presupuesto de tokens.
+# Devuelve los índices de los pasajes elegidos (en orden del documento) y, por pregunta, sus pasajes.
+# Con codigos solo se tienen en cuenta esas preguntas del checklist
+def seleccionar_pasajes(pasajes, max_tokens, contar_tokens=estimar_tokens, codigos=None):
+    consultas = {codigo: CONSULTAS[codigo] for codigo in (codigos or CONSULTAS)}
+    indice = construir_indice(pasajes)
+    costes = [contar_tokens(p) for p in pasajes]
+    rankings = {}
+    for codigo, consulta in consultas.items():
+        puntuaciones = puntuar(indice, consulta)
+        rankings[codigo] = [i for i in sorted(range(len(pasajes)), key=lambda i: -puntuaciones[i]) if puntuaciones[i] > 0]
+
+    # El primer pasaje (título y resumen) siempre se incluye para dar contexto
+    elegidos = {0} if pasajes else set()
+    usados = costes[0] if pasajes else 0
+    evidencias = {codigo: [] for codigo in consultas}
+
+    # Turnos: en cada ronda cada pregunta añade su siguiente mejor pasaje
+    posiciones = {codigo: 0 for codigo in consultas}
+    hay_candidatos = True
+    while hay_candidatos:
+        hay_candidatos = False
+        for codigo, ranking in rankings.items():
+            while posiciones[codigo] < len(ranking):
+                i = ranking[posiciones[codigo]]
+                posiciones[codigo] += 1
+                if i in elegidos:
+                    evidencias[codigo].append(i)
+                    continue
+                if usados + costes[i] > max_tokens:
+                    continue
+                elegidos.add(i)
+                usados += costes[i]
+                evidencias[codigo].append(i)
+                hay_candidatos = True
+                break
+
+    # El presupuesto sobrante se completa con los pasajes restantes en orden del documento
+    for i, coste in enumerate(costes):
+        if i not in elegidos and usados + coste <= max_tokens:
+            elegidos.add(i)
+            usados += coste
+    return sorted(elegidos), evidencias
+
+
+# Reducimos el texto del artículo a los pasajes relevantes para el checklist (o para las preguntas de codigos),
+# si el texto completo cabe en el presupuesto se devuelve tal cual
+def seleccionar_evidencia(texto, max_tokens=EVIDENCE_MAX_TOKENS, contar_tokens=estimar_tokens, codigos=None):
+    if not max_tokens or contar_tokens(texto) <= max_tokens:
+        return texto
+    pasajes = dividir_en_pasajes(texto)
+    elegidos, _ = seleccionar_pasajes(pasajes, max_tokens, contar_tokens, codigos)
+
+    # Unimos los pasajes en orden, marcando los huecos entre pasajes no consecutivos
+    partes = []
+    anterior = None
+    for i in elegidos:
+        if anterior is not None:
+            partes.append("\n" if i == anterior + 1 else SEPARADOR_PASAJES)
+        partes.append(pasajes[i])
+        anterior = i
+    return "".join(partes)
@@ -0,0 +1,124 @@
+import re
+import hashlib
+import logging
+import configparser
+from evidence import construir_indice, puntuar, dividir_en_pasajes, CONSULTAS
+from prompts import CHECKLIST, LLM_MODEL_NAME, PROMPT_VERSION
+
+# Revisión incremental de nuevas versiones: el texto de cada versión se divide en secciones y se guardan
+# sus huellas (hash del contenido de cada sección) y, por pregunta del checklist, la huella de las secciones
+# que le sirven de evidencia. En la versión siguiente solo se vuelven a preguntar al modelo las preguntas
+# cuya evidencia ha cambiado; el resto de respuestas se copian de la versión anterior
+
+# Cargamos configuraciones para leer properties.txt
+config = configparser.ConfigParser()
+config.read("properties.txt")
+
+INCREMENTAL_REVIEW = config.getboolean("LLM", "incremental_review", fallback=True)
+# Secciones más relevantes (BM25) que forman la evidencia de cada pregunta
+INCREMENTAL_EVIDENCE_SECTIONS = config.getint("LLM", "incremental_evidence_sections", fallback=3)
+
+# Las huellas calculadas con otro modelo, otro prompt u otra configuración no se comparan
+VERSION_HUELLAS = hashlib.sha256(
+    f"{LLM_MODEL_NAME}|{PROMPT_VERSION}|{INCREMENTAL_EVIDENCE_SECTIONS}".encode("utf-8")
+).hexdigest()[:12]
+
+# Títulos de sección habituales, con o sin numeración ("1 Introduction", "II. RELATED WORK", "Threats to Validity")
+_SECCIONES_HABITUALES = (
+    "abstract", "introduction", "background", "related work", "related works", "method", "methods", "methodology",
+    "experimental design", "experiment", "experiments", "study design", "research questions", "results",
+    "analysis", "discussion", "threats to validity", "limitations", "conclusion", "conclusions",
+    "future work", "acknowledgment", "acknowledgments", "acknowledgement", "acknowledgements",
+    "references", "bibliography", "appendix"
+)
+_NUMERACION = r"(?:\d{1,2}(?:\.\d{1,2}){0,3}\.?|[IVX]{1,5}\.)"
+_TITULO_HABITUAL = re.compile(
+    rf"^(?:{_NUMERACION}\s+)?(?:{'|'.join(re.escape(t) for t in _SECCIONES_HABITUALES)})\s*:?$", re.IGNORECASE
+)
+_TITULO_NUMERADO = re.compile(rf"^{_NUMERACION}\s+[A-Z][^.!?]*$")
+# Palabras máximas de una línea de título
+MAX_PALABRAS_TITULO = 10
+
+logger = logging.getLogger(__name__)
+
+
+def es_titulo(linea):
+    linea = linea.strip()
+    if not linea or len(linea.split()) > MAX_PALABRAS_TITULO:
+        return False
+    return bool(_TITULO_HABITUAL.match(linea) or _TITULO_NUMERADO.match(linea))
+
+
+# Dividimos el texto en secciones [(título, contenido)]; lo anterior al primer título (título del artículo,
+# autores, resumen...) es la sección "". Si el PDF no tiene títulos reconocibles se usan los pasajes de evidence.py
+def dividir_en_secciones(texto):
+    secciones = [["", []]]
+    for linea in texto.split("\n"):
+        if es_titulo(linea):
+            secciones.append([linea.strip(), []])
+        else:
+            secciones[-1][1].append(linea)
+    secciones = [(titulo, "\n".join(lineas).strip()) for titulo, lineas in secciones]
+    secciones = [(titulo, cuerpo) for titulo, cuerpo in secciones if titulo or cuerpo]
+    if len(secciones) < 2:
+        return [(f"#{i + 1}", pasaje) for i, pasaje in enumerate(dividir_en_pasajes(texto))]
+    return secciones
+
+
+# Hash del contenido sin tener en cuenta los espacios ni los saltos de línea de la extracción
+def huella(texto):
+    return hashlib.sha256(" ".join(texto.split()).encode("utf-8")).hexdigest()[:16]
+
+
+# Huellas de una versión: las de sus secciones (solo el contenido, así renumerar una sección no la cambia)
+# y, por pregunta, la del conjunto de secciones que le sirven de evidencia
+def calcular_huellas(texto):
+    secciones = dividir_en_secciones(texto)
+    hashes = [huella(cuerpo) for _, cuerpo in secciones]
+    indice = construir_indice([f"{titulo}\n{cuerpo}" for titulo, cuerpo in secciones])
+    evidencias = {}
+    for codigo in CHECKLIST:
+        puntuaciones = puntuar(indice, CONSULTAS[codigo])
+        relevantes = sorted(
+            (i for i in range(len(secciones)) if puntuaciones[i] > 0), key=lambda i: -puntuaciones[i]
+        )[:INCREMENTAL_EVIDENCE_SECTIONS]
+        evidencias[codigo] = huella("|".join(sorted(hashes[i] for i in relevantes)))
+    return {
+        "version": VERSION_HUELLAS,
+        "secciones": [{"titulo": titulo, "hash": h} for (titulo, _), h in zip(secciones, hashes)],
+        "evidencias": evidencias
+    }
+
+
+# Preguntas que hay que volver a hacer al modelo para una nueva versión: aquellas cuya evidencia ha cambiado
+# o que no tienen una respuesta válida en la versión anterior. Sin huellas comparables se hacen todas
+def preguntas_a_revisar(huellas, anterior):
+    if not INCREMENTAL_REVIEW or not anterior:
+        return list(CHECKLIST)
+    previas = anterior.get("huellas")
+    respuestas = anterior.get("preguntas_respuestas") or {}
+    if not previas or previas.get("version") != huellas["version"] or "error" in respuestas:
+        return list(CHECKLIST)
+
+    hashes_previos = {seccion["hash"] for seccion in previas["secciones"]}
+    cambiadas = [seccion["titulo"] or "(front matter)" for seccion in huellas["secciones"]
+                 if seccion["hash"] not in hashes_previos]
+    codigos = [
+        codigo for codigo in CHECKLIST
+        if previas["evidencias"].get(codigo) != huellas["evidencias"][codigo]
+        or not isinstance(respuestas.get(codigo), dict)
+    ]
+    logger.info(f"Secciones nuevas o modificadas: {cambiadas}. Preguntas a revisar: {codigos}")
+    return codigos
+
+
+# Respuestas de la nueva versión: las regeneradas para codigos y las de la versión anterior para el resto
+def combinar_respuestas(previas, nuevas, codigos):
+    if "error" in nuevas:
+        return nuevas
+    combinadas = {}
+    for codigo in CHECKLIST:
+        respuesta = nuevas.get(codigo) if codigo in codigos else previas.get(codigo)
+        if respuesta is not None:
+            combinadas[codigo] = respuesta
+    return combinadas
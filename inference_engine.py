@@ -0,0 +1,234 @@
+import os
+import threading
+import queue
+import time
+import logging
+import configparser
+from model_utils import generate_outputs_batch, DRAFT_MODEL_NAME
+from metrics import Histograma, Indicador, span, anotar
+
+# Cargamos configuraciones para leer properties.txt
+config = configparser.ConfigParser()
+config.read("properties.txt")
+
+# Parámetros del lote dinámico: tamaño máximo, presupuesto de tokens (prompts ya rellenados)
+# y ventana de espera para agrupar peticiones que llegan casi a la vez
+BATCH_MAX_SIZE = config.getint("LLM", "batch_max_size", fallback=4)
+BATCH_MAX_TOKENS = config.getint("LLM", "batch_max_tokens", fallback=32768)
+BATCH_WINDOW_MS = config.getint("LLM", "batch_window_ms", fallback=50)
+# La decodificación especulativa genera un prompt cada vez
+if DRAFT_MODEL_NAME:
+    BATCH_MAX_SIZE = 1
+
+logger = logging.getLogger(__name__)
+
+_pendientes = queue.Queue()
+_motor = None
+
+ESPERA_MOTOR = Histograma("llm_engine_wait_seconds", "Time a prompt waits in the inference engine before its batch starts")
+TAMANO_LOTE = Histograma("llm_batch_size", "Prompts per generate() call", cubos=(1, 2, 4, 8, 16, 32))
+Indicador("llm_engine_pending", "Prompts waiting in the inference engine queue", _pendientes.qsize)
+
+
+# Arrancar el hilo que agrupa las peticiones y llama al modelo
+def iniciar_motor(model, tokenizer):
+    global _motor
+    if _motor is not None:
+        return
+    _motor = threading.Thread(target=_bucle, args=(model, tokenizer), name="inference-engine", daemon=True)
+    _motor.start()
+    logger.info(f"Motor de inferencia iniciado (lote máximo {BATCH_MAX_SIZE}, {BATCH_MAX_TOKENS} tokens, ventana {BATCH_WINDOW_MS} ms)")
+
+
+# Encolar un prompt y esperar a que el motor devuelva su JSON.
+# on_text (opcional) recibe los fragmentos de texto a medida que el modelo los genera.
+# Los tiempos de la generación (espera en el motor, prefill, decode y tokens) se anotan en el resumen del hilo
+# y, si se pasa un diccionario en tiempos, también en él.
+# codigos (opcional) son las preguntas del checklist que pide el prompt, si no son todas
+def generar(tokenizer, messages, max_tokens=1500, on_text=None, tiempos=None, codigos=None):
+    if _motor is None:
+        raise RuntimeError("El motor de inferencia no está iniciado")
+    with span("tokenizacion"):
+        texto = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+        num_tokens = len(tokenizer(texto).input_ids)
+    peticion = {
+        "messages": messages,
+        "max_tokens": max_tokens,
+        "codigos": list(codigos) if codigos else None,
+        "num_tokens": num_tokens,
+        "on_text": on_text,
+        "encolado": time.perf_counter(),
+        "medidas": None,
+        "hecho": threading.Event(),
+        "resultado": None,
+        "error": None
+    }
+    _pendientes.put(peticion)
+    peticion["hecho"].wait()
+    if peticion["medidas"] is not None:
+        for clave, valor in peticion["medidas"].items():
+            anotar(clave, valor)
+        if tiempos is not None:
+            tiempos.update(peticion["medidas"])
+    if peticion["error"] is not None:
+        raise peticion["error"]
+    return peticion["resultado"]
+
+
+# Encolar un grupo de prompts que se generan juntos, en lotes solo suyos (sin mezclarse con otras peticiones)
+# para que compartan la KV-cache de su prefijo común (ver generate_outputs_batch). El grupo no cuenta para
+# batch_max_size, pero si no cabe en batch_max_tokens se reparte en varios lotes seguidos.
+# codigos_filas (opcional) son las preguntas que pide cada prompt y callbacks (opcional) reciben el texto de cada uno.
+# Devuelve la lista de JSON en el orden de los prompts; los tiempos se anotan como en generar (tokens sumados)
+def generar_grupo(tokenizer, lista_messages, max_tokens=1500, callbacks=None, tiempos=None, codigos_filas=None,
+                  reintento=False):
+    if _motor is None:
+        raise RuntimeError("El motor de inferencia no está iniciado")
+    with span("tokenizacion"):
+        ids = [
+            tokenizer(tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)).input_ids
+            for messages in lista_messages
+        ]
+    num_tokens = max(len(ids_prompt) for ids_prompt in ids)
+    # Los prompts de un grupo comparten el prefijo (el artículo) y su KV-cache se calcula una vez por lote
+    # (ver _prefijo_comun en model_utils.py): cada fila solo suma al presupuesto del lote lo que va detrás
+    comun = len(os.path.commonprefix(ids)) if len(ids) > 1 else 0
+    peticion = {
+        "grupo": True,
+        "messages": list(lista_messages),
+        "max_tokens": max_tokens,
+        "codigos_filas": [list(codigos) for codigos in codigos_filas] if codigos_filas else None,
+        "reintento": reintento,
+        "num_tokens": num_tokens,
+        "num_tokens_sufijo": num_tokens - comun,
+        "on_text": list(callbacks) if callbacks else [None] * len(lista_messages),
+        "encolado": time.perf_counter(),
+        "medidas": None,
+        "hecho": threading.Event(),
+        "resultado": None,
+        "error": None
+    }
+    _pendientes.put(peticion)
+    peticion["hecho"].wait()
+    if peticion["medidas"] is not None:
+        for clave, valor in peticion["medidas"].items():
+            anotar(clave, valor)
+        if tiempos is not None:
+            tiempos.update(peticion["medidas"])
+    if peticion["error"] is not None:
+        raise peticion["error"]
+    return peticion["resultado"]
+
+
+# Comprobamos si la petición cabe en el lote: con relleno a la izquierda
+# el coste es el número de prompts por la longitud del más largo.
+# Todas las peticiones del lote piden las mismas preguntas (comparten el autómata de la decodificación restringida)
+# y los grupos de generar_grupo van siempre solos
+def _cabe(lote, peticion):
+    if peticion.get("grupo") or len(lote) >= BATCH_MAX_SIZE:
+        return False
+    if peticion["max_tokens"] != lote[0]["max_tokens"] or peticion["codigos"] != lote[0]["codigos"]:
+        return False
+    longitud = max(max(p["num_tokens"] for p in lote), peticion["num_tokens"])
+    return (len(lote) + 1) * longitud <= BATCH_MAX_TOKENS
+
+
+# Reunir un lote: la primera petición espera sin límite, el resto solo durante la ventana
+def _formar_lote(aplazadas):
+    primera = aplazadas.pop(0) if aplazadas else _pendientes.get()
+    lote = [primera]
+    if primera.get("grupo"):
+        return lote
+    limite = time.monotonic() + BATCH_WINDOW_MS / 1000
+
+    # Primero las que se quedaron fuera del lote anterior
+    for peticion in list(aplazadas):
+        if _cabe(lote, peticion):
+            aplazadas.remove(peticion)
+            lote.append(peticion)
+
+    while len(lote) < BATCH_MAX_SIZE:
+        restante = limite - time.monotonic()
+        if restante <= 0:
+            break
+        try:
+            peticion = _pendientes.get(timeout=restante)
+        except queue.Empty:
+            break
+        if _cabe(lote, peticion):
+            lote.append(peticion)
+        else:
+            aplazadas.append(peticion)
+    return lote
+
+
+def _bucle(model, tokenizer):
+    aplazadas = []
+    while True:
+        lote = _formar_lote(aplazadas)
+        if lote[0].get("grupo"):
+            _generar_grupo(model, tokenizer, lote[0])
+            continue
+        inicio = time.monotonic()
+        comienzo = time.perf_counter()
+        TAMANO_LOTE.observar(len(lote))
+        medidas = []
+        try:
+            resultados = generate_outputs_batch(
+                model, tokenizer, [p["messages"] for p in lote], lote[0]["max_tokens"],
+                callbacks=[p["on_text"] for p in lote], medidas=medidas, codigos=lote[0]["codigos"]
+            )
+            for peticion, resultado, medida in zip(lote, resultados, medidas):
+                peticion["resultado"] = resultado
+                espera = comienzo - peticion["encolado"]
+                ESPERA_MOTOR.observar(espera)
+                peticion["medidas"] = dict(medida, espera_motor_s=espera)
+        except Exception as e:
+            logger.exception(f"Error generando un lote de {len(lote)} prompts")
+            for peticion in lote:
+                peticion["error"] = e
+        finally:
+            for peticion in lote:
+                peticion["hecho"].set()
+        logger.info(f"Lote de {len(lote)} prompts generado en {time.monotonic() - inicio:.1f} s")
+
+
+# Generar un grupo de prompts (ver generar_grupo) en lotes de tantas filas como quepan en batch_max_tokens,
+# contando de cada fila solo los tokens que siguen al prefijo común
+def _generar_grupo(model, tokenizer, peticion):
+    inicio = time.monotonic()
+    comienzo = time.perf_counter()
+    n = len(peticion["messages"])
+    filas = max(1, min(n, BATCH_MAX_TOKENS // max(peticion["num_tokens_sufijo"], 1)))
+    codigos_filas = peticion["codigos_filas"] or [None] * n
+    resultados, medidas = [], []
+    try:
+        for desde in range(0, n, filas):
+            hasta = desde + filas
+            TAMANO_LOTE.observar(len(peticion["messages"][desde:hasta]))
+            resultados.extend(generate_outputs_batch(
+                model, tokenizer, peticion["messages"][desde:hasta], peticion["max_tokens"],
+                callbacks=peticion["on_text"][desde:hasta], medidas=medidas,
+                codigos_filas=codigos_filas[desde:hasta] if peticion["codigos_filas"] else None,
+                reintento=peticion["reintento"]
+            ))
+        peticion["resultado"] = resultados
+        espera = comienzo - peticion["encolado"]
+        ESPERA_MOTOR.observar(espera)
+        # Los tiempos del grupo son los de sus lotes seguidos y los tokens, los de todas sus filas
+        peticion["medidas"] = {
+            "tokens_prompt": sum(m["tokens_prompt"] for m in medidas),
+            "tokens_generados": sum(m["tokens_generados"] for m in medidas),
+            "prefill_s": sum(m["prefill_s"] for m in medidas[::filas]),
+            "decode_s": sum(m["decode_s"] for m in medidas[::filas]),
+            "lote": n,
+            "espera_motor_s": espera
+        }
+        decode = peticion["medidas"]["decode_s"]
+        peticion["medidas"]["tokens_por_segundo"] = peticion["medidas"]["tokens_generados"] / decode if decode > 0 else 0.0
+    except Exception as e:
+        logger.exception(f"Error generando un grupo de {n} prompts")
+        peticion["error"] = e
+    finally:
+        peticion["hecho"].set()
+    logger.info(f"Grupo de {n} prompts generado en {time.monotonic() - inicio:.1f} s ({-(-n // filas)} lotes)")
@@ -0,0 +1,375 @@
+import os
+import math
+import time
+import socket
+import threading
+import logging
+import configparser
+from datetime import datetime, timedelta
+from collections import OrderedDict, deque
+from pymongo import ReturnDocument, ASCENDING
+from database import connect_bd, registrar_indice
+from pdf_store import guardar_pdf
+from pdf_extraction import comprobar_pdf
+from submissions import get_id
+from streaming import abrir_canal, cerrar_canal
+from metrics import Contador, Histograma, Indicador, iniciar_resumen, terminar_resumen
+
+# Cargamos configuraciones para leer properties.txt
+config = configparser.ConfigParser()
+config.read("properties.txt")
+
+# Colección donde se guarda el estado de los trabajos de revisión (junto a las submissions)
+JOBS_COLLECTION = config.get("MONGODB", "mongo.jobs_collection", fallback="jobs")
+
+# Número de hilos que procesan la cola de trabajos
+NUM_WORKERS = config.getint("JOBS", "jobs.workers", fallback=2)
+# Cada trabajo pendiente pertenece al proceso que lo tiene en su cola o lo ejecuta, que renueva su concesión (lease)
+# cada tercio de estos segundos. Si el proceso muere la concesión caduca y otro proceso recupera el trabajo
+LEASE_SECONDS = max(config.getint("JOBS", "jobs.lease_seconds", fallback=60), 3)
+# Identificador de este proceso como propietario de los trabajos. Si se mantiene entre reinicios (p.ej. con un
+# proceso por contenedor) al arrancar se recuperan sus trabajos sin esperar a que caduque la concesión
+INSTANCE_ID = config.get("JOBS", "jobs.instance_id", fallback="").strip() or f"{socket.gethostname()}:{os.getpid()}"
+# Máximo de trabajos en cola entre todos los usuarios: por encima se rechazan las subidas con un 429 (0 = sin límite)
+MAX_QUEUED = config.getint("JOBS", "jobs.max_queued", fallback=100)
+# Duración estimada de una revisión hasta que se mide la primera y peso de cada nueva medida en la media móvil
+SERVICE_SECONDS_INITIAL = config.getfloat("JOBS", "jobs.service_seconds_initial", fallback=60.0)
+SERVICE_SECONDS_ALPHA = config.getfloat("JOBS", "jobs.service_seconds_alpha", fallback=0.2)
+
+# Estados posibles de un trabajo
+ESTADO_EN_COLA = "queued"
+ESTADO_EJECUTANDO = "running"
+ESTADO_TERMINADO = "done"
+ESTADO_FALLIDO = "failed"
+
+logger = logging.getLogger(__name__)
+
+# Índices para recuperar los pendientes al arrancar y para detectar trabajos duplicados
+registrar_indice(JOBS_COLLECTION, [("estado", ASCENDING), ("creado", ASCENDING)], name="estado_creado")
+registrar_indice(JOBS_COLLECTION, [("id_user", ASCENDING), ("titulo", ASCENDING), ("estado", ASCENDING)], name="usuario_titulo_estado")
+registrar_indice(JOBS_COLLECTION, [("propietario", ASCENDING), ("estado", ASCENDING)], name="propietario_estado")
+registrar_indice(JOBS_COLLECTION, [("estado", ASCENDING), ("lease_hasta", ASCENDING)], name="estado_lease")
+
+
+# Cola en memoria de los trabajos pendientes con una cola por usuario (orcid). Los workers sacan los trabajos
+# por turnos: uno del primer usuario de la ronda, que pasa al final, así quien sube muchos PDFs seguidos
+# no retrasa a los demás más de un trabajo por turno. El estado real de los trabajos vive en MongoDB.
+# Además de ids de trabajos la cola guarda los turnos de los PDFs de las revisiones masivas (ver ejecutar_en_turno)
+class ColaJusta:
+    def __init__(self):
+        self._colas = OrderedDict()
+        self._cond = threading.Condition()
+
+    def poner(self, user, job_id):
+        with self._cond:
+            self._colas.setdefault(user, deque()).append(job_id)
+            self._cond.notify()
+
+    # Siguiente trabajo de la ronda, espera si no hay ninguno
+    def sacar(self):
+        with self._cond:
+            while not self._colas:
+                self._cond.wait()
+            user, cola = self._colas.popitem(last=False)
+            job_id = cola.popleft()
+            if cola:
+                self._colas[user] = cola
+            return job_id
+
+    # Posición (desde 1) de un trabajo en el orden en que se van a sacar, None si no está en la cola
+    def posicion(self, job_id):
+        with self._cond:
+            colas = list(self._colas.values())
+            for i, cola in enumerate(colas):
+                if job_id in cola:
+                    k = cola.index(job_id)
+                    # Antes salen k trabajos de su usuario y, de cada otro usuario, k + 1 si va antes en la ronda o k si va después
+                    return k + 1 + sum(min(len(otra), k + 1 if j < i else k) for j, otra in enumerate(colas) if j != i)
+            return None
+
+    def tamano(self):
+        with self._cond:
+            return sum(len(cola) for cola in self._colas.values())
+
+
+_cola = ColaJusta()
+_workers = []
+
+# Funciones que devuelven otros trabajos pendientes de todos los procesos que cuentan para el control de
+# admisión, además de los de la colección de trabajos (los PDFs de las revisiones masivas, ver bulk.py)
+_otros_pendientes = []
+
+# Funciones que llama periódicamente el hilo de concesiones: renuevan las de este proceso y recuperan las caducadas
+# de otros, de los trabajos (ver iniciar_workers) y de los lotes de revisión masiva (ver bulk.py)
+_concesiones = []
+_hilo_concesiones = None
+
+# Media móvil exponencial de la duración de las revisiones, para estimar la espera en la cola
+_servicio = {"segundos": SERVICE_SECONDS_INITIAL}
+_servicio_lock = threading.Lock()
+
+TRABAJOS = Contador("review_jobs_total", "Review jobs finished, by type and state")
+DURACION_TRABAJOS = Histograma("review_job_seconds", "Processing time of a review job, by type")
+RECHAZADOS = Contador("review_jobs_rejected_total", "Uploads rejected because the review queue was full")
+RECUPERADOS = Contador("review_jobs_reclaimed_total", "Review jobs taken over from a process whose lease expired")
+Indicador("review_jobs_queued", "Review jobs waiting for a worker in this process", _cola.tamano)
+Indicador("review_job_service_seconds_ewma", "Moving average of the review processing time", lambda: _servicio["segundos"])
+
+
+def connect_jobs():
+    return connect_bd(JOBS_COLLECTION)
+
+
+def fin_concesion():
+    return datetime.now() + timedelta(seconds=LEASE_SECONDS)
+
+
+# Registrar un nuevo trabajo de revisión y ponerlo en la cola. El PDF se guarda en el almacén de pdf_store.py
+# y el trabajo solo lleva su hash. Lanza ValueError, sin guardar nada, si el PDF es demasiado grande o no es un PDF
+def encolar_trabajo(tipo, user, titulo, pdf_bytes):
+    comprobar_pdf(pdf_bytes)
+    job_id = get_id()
+    pdf_hash = guardar_pdf(pdf_bytes, f"{titulo}.pdf")
+    trabajo = {
+        "_id": job_id,
+        "tipo": tipo,
+        "id_user": user,
+        "titulo": titulo,
+        "estado": ESTADO_EN_COLA,
+        "pdf_hash": pdf_hash,
+        "propietario": INSTANCE_ID,
+        "lease_hasta": fin_concesion(),
+        "creado": datetime.now(),
+        "iniciado": None,
+        "terminado": None,
+        "version": None,
+        "error": None
+    }
+    connect_jobs().insert_one(trabajo)
+    _cola.poner(user, job_id)
+    logger.info(f"Trabajo {job_id} ({tipo}) encolado para el usuario {user} con título '{titulo}'")
+    return job_id
+
+
+# Consultar el estado de un trabajo (sin el PDF de los trabajos encolados antes del almacén de PDFs)
+def obtener_trabajo(job_id):
+    return connect_jobs().find_one({"_id": job_id}, {"pdf": 0})
+
+
+def registrar_pendientes(funcion):
+    _otros_pendientes.append(funcion)
+
+
+# Trabajos en cola de todos los procesos
+def _en_cola():
+    return connect_jobs().count_documents({"estado": ESTADO_EN_COLA}) + sum(funcion() for funcion in _otros_pendientes)
+
+
+# Control de admisión: None si se pueden encolar nuevos trabajos o, si la cola está llena, los segundos
+# estimados hasta que haya sitio (para la cabecera Retry-After). Cuenta los trabajos en cola de todos los procesos.
+# Con la cola vacía se admite siempre, aunque sean más trabajos que el máximo (una revisión masiva grande)
+def admitir_trabajo(nuevos=1):
+    if MAX_QUEUED <= 0:
+        return None
+    en_cola = _en_cola()
+    if en_cola == 0 or en_cola + nuevos <= MAX_QUEUED:
+        return None
+    RECHAZADOS.inc()
+    return segundos_espera(en_cola + nuevos - MAX_QUEUED)
+
+
+# Trabajos en cola (de todos los procesos) y espera estimada para uno nuevo, para las páginas de subida
+def estado_cola():
+    en_cola = _en_cola()
+    return {"en_cola": en_cola, "espera_estimada": segundos_espera(en_cola + 1), "llena": 0 < MAX_QUEUED <= en_cola}
+
+
+# Espera estimada hasta que un worker empiece el trabajo en esa posición de la cola
+def segundos_espera(posicion):
+    return max(1, math.ceil(posicion * _servicio["segundos"] / max(len(_workers), NUM_WORKERS, 1)))
+
+
+def _medir_servicio(segundos):
+    with _servicio_lock:
+        _servicio["segundos"] += SERVICE_SECONDS_ALPHA * (segundos - _servicio["segundos"])
+
+
+# Comprobamos si ya hay un trabajo pendiente para ese título y usuario
+def existe_trabajo_pendiente(titulo, user, tipo):
+    doc = connect_jobs().find_one({
+        "titulo": titulo,
+        "id_user": user,
+        "tipo": tipo,
+        "estado": {"$in": [ESTADO_EN_COLA, ESTADO_EJECUTANDO]}
+    }, {"_id": 1})
+    return doc is not None
+
+
+# Pasar las fechas del trabajo a un formato serializable en JSON con los tiempos de cola y proceso.
+# Un trabajo en la cola de este proceso lleva además su posición y la espera estimada
+def estado_trabajo_json(trabajo):
+    creado, iniciado, terminado = trabajo.get("creado"), trabajo.get("iniciado"), trabajo.get("terminado")
+    posicion = _cola.posicion(trabajo["_id"]) if trabajo["estado"] == ESTADO_EN_COLA else None
+    return {
+        "id": trabajo["_id"],
+        "tipo": trabajo["tipo"],
+        "titulo": trabajo["titulo"],
+        "estado": trabajo["estado"],
+        "version": trabajo.get("version"),
+        "error": trabajo.get("error"),
+        "creado": creado.isoformat() if creado else None,
+        "iniciado": iniciado.isoformat() if iniciado else None,
+        "terminado": terminado.isoformat() if terminado else None,
+        "tiempo_en_cola": (iniciado - creado).total_seconds() if iniciado and creado else None,
+        "tiempo_proceso": (terminado - iniciado).total_seconds() if terminado and iniciado else None,
+        "posicion": posicion,
+        "espera_estimada": segundos_espera(posicion) if posicion else None
+    }
+
+
+# Ejecutar un trabajo: se reclama de forma atómica para que nunca lo procesen dos workers
+def _ejecutar(job_id, procesador):
+    collection = connect_jobs()
+    trabajo = collection.find_one_and_update(
+        {"_id": job_id, "estado": ESTADO_EN_COLA},
+        {"$set": {"estado": ESTADO_EJECUTANDO, "iniciado": datetime.now(), "propietario": INSTANCE_ID, "lease_hasta": fin_concesion()}},
+        return_document=ReturnDocument.AFTER
+    )
+    if not trabajo:
+        return
+
+    logger.info(f"Procesando el trabajo {job_id} de {trabajo['id_user']} con título '{trabajo['titulo']}'")
+    # Canal por el que se emite la salida del modelo a medida que se genera
+    abrir_canal(job_id)
+    # Resumen de tiempos de la revisión, el procesador lo guarda con la versión (ver metrics.py)
+    iniciar_resumen()
+    inicio = time.perf_counter()
+    try:
+        version = procesador(trabajo)
+        collection.update_one(
+            {"_id": job_id},
+            {"$set": {"estado": ESTADO_TERMINADO, "terminado": datetime.now(), "version": version}}
+        )
+        logger.info(f"Trabajo {job_id} terminado, versión {version} guardada")
+        TRABAJOS.inc(type=trabajo["tipo"], state=ESTADO_TERMINADO)
+        # Solo las revisiones completas cuentan para estimar la espera
+        _medir_servicio(time.perf_counter() - inicio)
+        cerrar_canal(job_id, {"estado": ESTADO_TERMINADO, "version": version})
+    except Exception as e:
+        logger.exception(f"Error procesando el trabajo {job_id}")
+        collection.update_one(
+            {"_id": job_id},
+            {"$set": {"estado": ESTADO_FALLIDO, "terminado": datetime.now(), "error": str(e)}}
+        )
+        TRABAJOS.inc(type=trabajo["tipo"], state=ESTADO_FALLIDO)
+        cerrar_canal(job_id, {"estado": ESTADO_FALLIDO, "error": str(e)})
+    finally:
+        DURACION_TRABAJOS.observar(time.perf_counter() - inicio, type=trabajo["tipo"])
+        terminar_resumen()
+
+
+# Ejecutar funcion(*args) cuando le llegue el turno a user en la ronda de la cola, igual que un trabajo más:
+# así cada PDF de una revisión masiva espera su turno frente a las subidas de los demás usuarios.
+# El worker que saca el turno solo avisa y sigue con la cola; la función se ejecuta en el hilo que llama
+# (uno por PDF del bloque, ver bulk.py), así los PDFs de un bloque no ocupan workers y se generan todos juntos.
+# Devuelve su resultado (o lanza su excepción). Sin workers en este proceso (línea de comandos de bulk.py)
+# se ejecuta directamente
+def ejecutar_en_turno(user, funcion, *args):
+    if _workers:
+        turno = threading.Event()
+        _cola.poner(user, turno)
+        turno.wait()
+    return funcion(*args)
+
+
+def _worker(procesador):
+    while True:
+        tarea = _cola.sacar()
+        if isinstance(tarea, threading.Event):
+            tarea.set()
+        else:
+            _ejecutar(tarea, procesador)
+
+
+# Renovar la concesión de los trabajos de este proceso (en su cola o ejecutándose)
+def renovar_concesiones():
+    connect_jobs().update_many(
+        {"propietario": INSTANCE_ID, "estado": {"$in": [ESTADO_EN_COLA, ESTADO_EJECUTANDO]}},
+        {"$set": {"lease_hasta": fin_concesion()}}
+    )
+
+
+# Recuperar los trabajos pendientes cuya concesión caducó (su proceso murió o es anterior a las concesiones):
+# cada uno se reclama de forma atómica, vuelve a "queued" y pasa a la cola de este proceso
+def recuperar_caducados():
+    collection = connect_jobs()
+    filtro = {
+        "estado": {"$in": [ESTADO_EN_COLA, ESTADO_EJECUTANDO]},
+        "$or": [{"lease_hasta": {"$lt": datetime.now()}}, {"lease_hasta": None}]
+    }
+    total = 0
+    for doc in collection.find(filtro, {"_id": 1}).sort("creado", 1):
+        trabajo = collection.find_one_and_update(
+            {"_id": doc["_id"], **filtro},
+            {"$set": {"estado": ESTADO_EN_COLA, "iniciado": None, "propietario": INSTANCE_ID, "lease_hasta": fin_concesion()}},
+            projection={"id_user": 1}
+        )
+        if trabajo:
+            _cola.poner(trabajo["id_user"], trabajo["_id"])
+            total += 1
+    if total:
+        RECUPERADOS.inc(total)
+        logger.info(f"Recuperados {total} trabajos de procesos cuya concesión caducó")
+    return total
+
+
+# Añadir funciones al hilo de concesiones, que se arranca con las primeras
+def registrar_concesiones(*funciones):
+    global _hilo_concesiones
+    _concesiones.extend(funciones)
+    if _hilo_concesiones is None:
+        _hilo_concesiones = threading.Thread(target=_bucle_concesiones, name="leases", daemon=True)
+        _hilo_concesiones.start()
+
+
+# Cada tercio de la concesión: así se renueva dos veces antes de caducar aunque una vuelta se retrase
+def _bucle_concesiones():
+    while True:
+        time.sleep(LEASE_SECONDS / 3)
+        for funcion in list(_concesiones):
+            try:
+                funcion()
+            except Exception:
+                logger.exception("Error renovando o recuperando concesiones")
+
+
+# Al arrancar, volvemos a encolar los trabajos que este proceso tenía pendientes o a medias en una ejecución
+# anterior (mismo INSTANCE_ID) y los de otros procesos con la concesión caducada
+def recuperar_trabajos():
+    collection = connect_jobs()
+    collection.update_many(
+        {"propietario": INSTANCE_ID, "estado": ESTADO_EJECUTANDO},
+        {"$set": {"estado": ESTADO_EN_COLA, "iniciado": None}}
+    )
+    propios = collection.find({"propietario": INSTANCE_ID, "estado": ESTADO_EN_COLA}, {"_id": 1, "id_user": 1}).sort("creado", 1)
+    total = 0
+    for doc in propios:
+        _cola.poner(doc["id_user"], doc["_id"])
+        total += 1
+    renovar_concesiones()
+    if total:
+        logger.info(f"Recuperados {total} trabajos pendientes de una ejecución anterior")
+    recuperar_caducados()
+
+
+# Arrancar el pool de workers que vacía la cola llamando a procesador(trabajo)
+def iniciar_workers(procesador, num_workers=NUM_WORKERS):
+    if _workers:
+        return
+    recuperar_trabajos()
+    registrar_concesiones(renovar_concesiones, recuperar_caducados)
+    for i in range(num_workers):
+        hilo = threading.Thread(target=_worker, args=(procesador,), name=f"review-worker-{i}", daemon=True)
+        hilo.start()
+        _workers.append(hilo)
+    logger.info(f"Iniciados {num_workers} workers para la cola de revisiones")
@@ -0,0 +1,153 @@
+import time
+import threading
+from contextlib import contextmanager
+
+# Métricas del proceso (contadores, histogramas e indicadores) en memoria,
+# exportadas en el formato de texto de Prometheus por la ruta /metrics.
+# Además cada hilo puede llevar un resumen de tiempos de la revisión que está procesando,
+# que se guarda en la versión junto a preguntas_respuestas
+
+# Límites de los cubos de los histogramas de duración (segundos)
+CUBOS_SEGUNDOS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+_lock = threading.Lock()
+_metricas = []
+_local = threading.local()
+
+
+def _etiquetas(etiquetas):
+    return tuple(sorted(etiquetas.items()))
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _formatear(nombre, etiquetas, valor):
+    if etiquetas:
+        texto = ",".join(f'{clave}="{_escapar(v)}"' for clave, v in etiquetas)
+        return f"{nombre}{{{texto}}} {valor:g}"
+    return f"{nombre} {valor:g}"
+
+
+class Contador:
+    tipo = "counter"
+
+    def __init__(self, nombre, ayuda):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.valores = {}
+        _metricas.append(self)
+
+    def inc(self, valor=1, **etiquetas):
+        clave = _etiquetas(etiquetas)
+        with _lock:
+            self.valores[clave] = self.valores.get(clave, 0) + valor
+
+    def lineas(self):
+        return [_formatear(self.nombre, clave, valor) for clave, valor in sorted(self.valores.items())]
+
+
+class Histograma:
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, cubos=CUBOS_SEGUNDOS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.cubos = cubos
+        self.series = {}
+        _metricas.append(self)
+
+    def observar(self, valor, **etiquetas):
+        clave = _etiquetas(etiquetas)
+        with _lock:
+            serie = self.series.setdefault(clave, {"cubos": [0] * len(self.cubos), "suma": 0.0, "cuenta": 0})
+            for i, limite in enumerate(self.cubos):
+                if valor <= limite:
+                    serie["cubos"][i] += 1
+            serie["suma"] += valor
+            serie["cuenta"] += 1
+
+    def lineas(self):
+        lineas = []
+        for clave, serie in sorted(self.series.items()):
+            for limite, cuenta in zip(self.cubos, serie["cubos"]):
+                lineas.append(_formatear(f"{self.nombre}_bucket", clave + (("le", f"{limite:g}"),), cuenta))
+            lineas.append(_formatear(f"{self.nombre}_bucket", clave + (("le", "+Inf"),), serie["cuenta"]))
+            lineas.append(_formatear(f"{self.nombre}_sum", clave, serie["suma"]))
+            lineas.append(_formatear(f"{self.nombre}_count", clave, serie["cuenta"]))
+        return lineas
+
+
+# Valor instantáneo que se consulta al exportar (p.ej. el tamaño de una cola)
+class Indicador:
+    tipo = "gauge"
+
+    def __init__(self, nombre, ayuda, funcion):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.funcion = funcion
+        _metricas.append(self)
+
+    def lineas(self):
+        return [_formatear(self.nombre, (), self.funcion())]
+
+
+# Texto de todas las métricas en el formato de exposición de Prometheus
+def exportar():
+    lineas = []
+    with _lock:
+        for metrica in _metricas:
+            lineas.append(f"# HELP {metrica.nombre} {metrica.ayuda}")
+            lineas.append(f"# TYPE {metrica.nombre} {metrica.tipo}")
+            lineas.extend(metrica.lineas())
+    return "\n".join(lineas) + "\n"
+
+
+ETAPAS = Histograma("review_stage_seconds", "Duration of each stage of a review")
+
+
+# ---------------- RESUMEN POR REVISIÓN ----------------
+
+# Empezar el resumen de tiempos de la revisión que procesa este hilo
+def iniciar_resumen():
+    _local.resumen = {}
+    return _local.resumen
+
+
+# Copia del resumen del hilo, redondeada para guardarla
+def resumen_actual():
+    resumen = getattr(_local, "resumen", None)
+    if resumen is None:
+        return None
+    return {clave: round(valor, 4) if isinstance(valor, float) else valor for clave, valor in resumen.items()}
+
+
+# Terminar el resumen del hilo y devolverlo
+def terminar_resumen():
+    resumen = resumen_actual()
+    _local.resumen = None
+    return resumen
+
+
+# Añadir un valor al resumen del hilo (si hay uno abierto); con sumar=True se acumula
+def anotar(clave, valor, sumar=False):
+    resumen = getattr(_local, "resumen", None)
+    if resumen is None:
+        return
+    if sumar:
+        resumen[clave] = resumen.get(clave, 0) + valor
+    else:
+        resumen[clave] = valor
+
+
+# Medir una etapa: se observa en review_stage_seconds y se anota como "<etapa>_s" en el resumen del hilo
+@contextmanager
+def span(etapa):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        segundos = time.perf_counter() - inicio
+        ETAPAS.observar(segundos, stage=etapa)
+        anotar(f"{etapa}_s", segundos, sumar=True)
@@ -0,0 +1,115 @@
+import json
+import time
+import logging
+import configparser
+import requests
+from metrics import anotar
+
+# Cargamos configuraciones para leer properties.txt
+config = configparser.ConfigParser()
+config.read("properties.txt")
+
+# URL del servidor de modelo (model_server.py). Vacío = el modelo se carga dentro de la aplicación web
+MODEL_SERVER_URL = config.get("MODEL_SERVER", "server.url", fallback="").rstrip("/")
+# Tiempos de espera de conexión y lectura (segundos) y tiempo máximo esperando a que el modelo esté listo
+SERVER_CONNECT_TIMEOUT = config.getfloat("MODEL_SERVER", "server.connect_timeout", fallback=5)
+SERVER_READ_TIMEOUT = config.getfloat("MODEL_SERVER", "server.read_timeout", fallback=900)
+SERVER_WAIT_READY_SECONDS = config.getint("MODEL_SERVER", "server.wait_ready_seconds", fallback=900)
+
+# Cada cuánto se vuelve a preguntar al servidor si está listo
+CACHE_ESTADO_SEGUNDOS = 2
+
+logger = logging.getLogger(__name__)
+
+_sesion = requests.Session()
+_estado = {"datos": None, "consultado": 0}
+
+
+def usar_servidor():
+    return bool(MODEL_SERVER_URL)
+
+
+# Estado de carga del servidor de modelo (se guarda unos segundos para no consultarlo en cada petición)
+def estado_servidor():
+    if time.time() - _estado["consultado"] > CACHE_ESTADO_SEGUNDOS:
+        try:
+            respuesta = _sesion.get(f"{MODEL_SERVER_URL}/health/ready", timeout=SERVER_CONNECT_TIMEOUT)
+            _estado["datos"] = respuesta.json()
+        except (requests.RequestException, ValueError) as e:
+            _estado["datos"] = {
+                "ready": False, "phase": "unreachable", "progress": 0,
+                "model": None, "elapsed_seconds": 0, "error": str(e)
+            }
+        _estado["consultado"] = time.time()
+    return _estado["datos"]
+
+
+def servidor_listo():
+    return estado_servidor()["ready"]
+
+
+# Cliente ligero de generate_output: envía el prompt al servidor de modelo y devuelve el JSON de la revisión.
+# on_text (opcional) recibe el texto a medida que el servidor lo genera.
+# codigos (opcional) son las preguntas del checklist que pide el prompt, si no son todas.
+# Los tiempos de la generación que devuelve el servidor se anotan en el resumen del hilo (ver metrics.py)
+def generate_output(messages, max_tokens=1500, on_text=None, codigos=None):
+    datos = {"messages": messages, "max_tokens": max_tokens, "codigos": codigos}
+    respuesta = _enviar("/generate", datos, stream=bool(on_text))
+
+    if not on_text:
+        cuerpo = respuesta.json()
+        if respuesta.status_code != 200:
+            raise RuntimeError(f"Error del servidor de modelo: {cuerpo.get('error')}")
+        _anotar_medidas(cuerpo)
+        return cuerpo["resultado"]
+
+    if respuesta.status_code != 200:
+        raise RuntimeError(f"Error del servidor de modelo: {respuesta.text}")
+    for linea in respuesta.iter_lines(decode_unicode=True):
+        if not linea:
+            continue
+        mensaje = json.loads(linea)
+        if "texto" in mensaje:
+            on_text(mensaje["texto"])
+        elif "resultado" in mensaje:
+            _anotar_medidas(mensaje)
+            return mensaje["resultado"]
+        else:
+            raise RuntimeError(f"Error del servidor de modelo: {mensaje.get('error')}")
+    raise RuntimeError("El servidor de modelo cerró la conexión sin devolver el resultado")
+
+
+# Cliente de generar_grupo (ver inference_engine.py): varios prompts que el servidor genera juntos compartiendo
+# la KV-cache de su prefijo común. codigos_filas son las preguntas de cada prompt y reintento pide muestrear con
+# la decodificación restringida (ver per_question.py). Devuelve la lista de JSON
+def generate_group(lista_messages, codigos_filas=None, max_tokens=1500, reintento=False):
+    datos = {"prompts": lista_messages, "max_tokens": max_tokens, "codigos_filas": codigos_filas, "retry": reintento}
+    respuesta = _enviar("/generate_group", datos)
+    cuerpo = respuesta.json()
+    if respuesta.status_code != 200:
+        raise RuntimeError(f"Error del servidor de modelo: {cuerpo.get('error')}")
+    _anotar_medidas(cuerpo)
+    return cuerpo["resultados"]
+
+
+# POST al servidor de modelo; mientras el modelo se está cargando (503) se espera y se reintenta
+def _enviar(ruta, datos, stream=False):
+    limite = time.time() + SERVER_WAIT_READY_SECONDS
+    while True:
+        respuesta = _sesion.post(
+            f"{MODEL_SERVER_URL}{ruta}",
+            params={"stream": "1"} if stream else None,
+            json=datos,
+            stream=stream,
+            timeout=(SERVER_CONNECT_TIMEOUT, SERVER_READ_TIMEOUT)
+        )
+        if respuesta.status_code == 503 and time.time() < limite:
+            respuesta.close()
+            time.sleep(int(respuesta.headers.get("Retry-After", 10)))
+            continue
+        return respuesta
+
+
+def _anotar_medidas(mensaje):
+    for clave, valor in (mensaje.get("medidas") or {}).items():
+        anotar(clave, valor)
@@ -0,0 +1,87 @@
+import time
+import threading
+import logging
+from model_utils import load_model, generate_output
+from prompts import build_prompt, LLM_MODEL_NAME
+
+logger = logging.getLogger(__name__)
+
+# Fases de la carga y el porcentaje aproximado de progreso al empezar cada una
+FASES = {
+    "pending": 0,
+    "loading_tokenizer": 5,
+    "loading_model": 15,
+    "loading_draft": 60,
+    "preparing_schema": 70,
+    "preparing_prefix": 75,
+    "warming_up": 85,
+    "ready": 100,
+    "failed": 100
+}
+
+_estado = {"fase": "pending", "inicio": None, "fin": None, "error": None}
+_modelo = {"model": None, "tokenizer": None, "model_name": LLM_MODEL_NAME}
+_listo = threading.Event()
+_hilo = None
+
+
+def _cambiar_fase(fase):
+    _estado["fase"] = fase
+    logger.info(f"Carga del modelo: {fase}")
+
+
+# Arrancar la carga del modelo en segundo plano. al_terminar(model, tokenizer) se llama cuando está listo
+def iniciar_carga(al_terminar=None):
+    global _hilo
+    if _hilo is not None:
+        return
+    _hilo = threading.Thread(target=_cargar, args=(al_terminar,), name="model-loader", daemon=True)
+    _hilo.start()
+
+
+def _cargar(al_terminar):
+    _estado["inicio"] = time.time()
+    try:
+        model, tokenizer, model_name = load_model(progreso=_cambiar_fase)
+        # Generación corta de calentamiento para inicializar kernels y reservas de memoria
+        _cambiar_fase("warming_up")
+        generate_output(model, tokenizer, build_prompt("Warm-up."), max_tokens=8)
+        _modelo.update({"model": model, "tokenizer": tokenizer, "model_name": model_name})
+        if al_terminar:
+            al_terminar(model, tokenizer)
+        _estado["fin"] = time.time()
+        _cambiar_fase("ready")
+        _listo.set()
+        logger.info(f"Modelo {model_name} listo en {_estado['fin'] - _estado['inicio']:.1f} s")
+    except Exception as e:
+        logger.exception("Error cargando el modelo")
+        _estado["error"] = str(e)
+        _estado["fin"] = time.time()
+        _cambiar_fase("failed")
+
+
+def modelo_listo():
+    return _listo.is_set()
+
+
+# Esperar a que termine la carga (para los programas de línea de comandos). Devuelve si el modelo está listo
+def esperar_carga(timeout=None):
+    _listo.wait(timeout)
+    return modelo_listo()
+
+
+def obtener_modelo():
+    return _modelo["model"], _modelo["tokenizer"], _modelo["model_name"]
+
+
+# Estado de la carga en formato JSON para los endpoints de salud
+def estado_carga():
+    inicio, fin = _estado["inicio"], _estado["fin"]
+    return {
+        "ready": modelo_listo(),
+        "phase": _estado["fase"],
+        "progress": FASES.get(_estado["fase"], 0),
+        "model": _modelo["model_name"],
+        "elapsed_seconds": round((fin or time.time()) - inicio, 1) if inicio else 0,
+        "error": _estado["error"]
+    }
@@ -0,0 +1,189 @@
+import sys
+import json
+import time
+import queue
+import threading
+import logging
+import configparser
+from flask import Flask, Response, request, jsonify
+from prompts import CHECKLIST
+from metrics import exportar
+
+# Cargamos configuraciones para leer properties.txt
+config = configparser.ConfigParser()
+config.read("properties.txt")
+
+# Backend del servidor: "hf" carga el modelo de Hugging Face, "stub" responde sin modelo (para pruebas)
+SERVER_BACKEND = config.get("MODEL_SERVER", "server.backend", fallback="hf")
+SERVER_HOST = config.get("MODEL_SERVER", "server.host", fallback="127.0.0.1")
+SERVER_PORT = config.getint("MODEL_SERVER", "server.port", fallback=5001)
+# Retardo por fragmento del backend stub, para simular la generación
+STUB_DELAY_MS = config.getint("MODEL_SERVER", "server.stub_delay_ms", fallback=20)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+app = Flask(__name__)
+
+_backend = {"nombre": SERVER_BACKEND}
+
+
+# ---------------- BACKENDS ----------------
+
+# Backend stub: devuelve siempre la misma revisión, fragmento a fragmento
+def _generar_stub(messages, max_tokens=1500, on_text=None, tiempos=None, codigos=None):
+    resultado = {
+        codigo: {"answer": "N/A", "justification": "Response generated by the stub backend."}
+        for codigo in (codigos or CHECKLIST)
+    }
+    texto = json.dumps(resultado, indent=4)
+    if on_text:
+        for i in range(0, len(texto), 16):
+            time.sleep(STUB_DELAY_MS / 1000)
+            on_text(texto[i:i + 16])
+    return resultado
+
+
+def _generar_grupo_stub(lista_messages, max_tokens=1500, tiempos=None, codigos_filas=None, reintento=False):
+    return [
+        _generar_stub(messages, max_tokens, codigos=codigos)
+        for messages, codigos in zip(lista_messages, codigos_filas or [None] * len(lista_messages))
+    ]
+
+
+def _estado_stub():
+    return {"ready": True, "phase": "ready", "progress": 100, "model": "stub", "elapsed_seconds": 0, "error": None}
+
+
+# Backend de Hugging Face: el modelo se carga en segundo plano y las peticiones pasan por el motor de lotes
+def _iniciar_hf():
+    from inference_engine import iniciar_motor, generar, generar_grupo
+    from model_loader import iniciar_carga, estado_carga, obtener_modelo
+
+    def generar_hf(messages, max_tokens=1500, on_text=None, tiempos=None, codigos=None):
+        _, tokenizer, _ = obtener_modelo()
+        return generar(tokenizer, messages, max_tokens, on_text=on_text, tiempos=tiempos, codigos=codigos)
+
+    def generar_grupo_hf(lista_messages, max_tokens=1500, tiempos=None, codigos_filas=None, reintento=False):
+        _, tokenizer, _ = obtener_modelo()
+        return generar_grupo(
+            tokenizer, lista_messages, max_tokens, tiempos=tiempos, codigos_filas=codigos_filas, reintento=reintento
+        )
+
+    _backend["generar"] = generar_hf
+    _backend["generar_grupo"] = generar_grupo_hf
+    _backend["estado"] = estado_carga
+    iniciar_carga(iniciar_motor)
+
+
+def iniciar_backend(nombre=SERVER_BACKEND):
+    _backend["nombre"] = nombre
+    if nombre == "stub":
+        _backend["generar"] = _generar_stub
+        _backend["generar_grupo"] = _generar_grupo_stub
+        _backend["estado"] = _estado_stub
+    elif nombre == "hf":
+        _iniciar_hf()
+    else:
+        raise ValueError(f"Backend del servidor de modelo desconocido: {nombre}")
+    logger.info(f"Servidor de modelo con backend '{nombre}'")
+
+
+# ---------------- API ----------------
+
+@app.route("/health/live")
+def health_live():
+    return jsonify({"status": "alive", "backend": _backend["nombre"]})
+
+
+@app.route("/health/ready")
+def health_ready():
+    estado = _backend["estado"]()
+    return jsonify(estado), (200 if estado["ready"] else 503)
+
+
+# Métricas del motor de inferencia en formato Prometheus
+@app.route("/metrics")
+def metricas():
+    return Response(exportar(), mimetype="text/plain; version=0.0.4")
+
+
+# Generar la revisión de un prompt. Con ?stream=1 la respuesta es NDJSON:
+# una línea {"texto": ...} por fragmento y una última línea con {"resultado": ...} o {"error": ...}.
+# El resultado va acompañado de "medidas" con los tiempos y tokens de la generación.
+# "codigos" (opcional) limita la revisión a esas preguntas del checklist
+@app.route("/generate", methods=["POST"])
+def generate():
+    if not _backend["estado"]()["ready"]:
+        return jsonify({"error": "Model is warming up"}), 503, {"Retry-After": "10"}
+    datos = request.get_json()
+    messages = datos["messages"]
+    max_tokens = int(datos.get("max_tokens", 1500))
+    codigos = datos.get("codigos")
+
+    if request.args.get("stream") != "1":
+        try:
+            medidas = {}
+            resultado = _backend["generar"](messages, max_tokens, tiempos=medidas, codigos=codigos)
+            return jsonify({"resultado": resultado, "medidas": medidas})
+        except Exception as e:
+            logger.exception("Error generando la revisión")
+            return jsonify({"error": str(e)}), 500
+
+    salida = queue.Queue()
+
+    def ejecutar():
+        try:
+            medidas = {}
+            resultado = _backend["generar"](
+                messages, max_tokens, on_text=lambda texto: salida.put({"texto": texto}), tiempos=medidas,
+                codigos=codigos
+            )
+            salida.put({"resultado": resultado, "medidas": medidas})
+        except Exception as e:
+            logger.exception("Error generando la revisión")
+            salida.put({"error": str(e)})
+
+    threading.Thread(target=ejecutar, daemon=True).start()
+
+    def lineas():
+        while True:
+            mensaje = salida.get()
+            yield json.dumps(mensaje) + "\n"
+            if "texto" not in mensaje:
+                return
+
+    return Response(lineas(), mimetype="application/x-ndjson")
+
+
+# Generar varios prompts juntos (revisión por preguntas, ver per_question.py): {"prompts": [...], "max_tokens": ...,
+# "codigos_filas": [...], "retry": false} -> {"resultados": [...], "medidas": {...}}
+@app.route("/generate_group", methods=["POST"])
+def generate_group():
+    if not _backend["estado"]()["ready"]:
+        return jsonify({"error": "Model is warming up"}), 503, {"Retry-After": "10"}
+    datos = request.get_json()
+    try:
+        medidas = {}
+        resultados = _backend["generar_grupo"](
+            datos["prompts"], int(datos.get("max_tokens", 1500)), tiempos=medidas, codigos_filas=datos.get("codigos_filas"),
+            reintento=bool(datos.get("retry"))
+        )
+        return jsonify({"resultados": resultados, "medidas": medidas})
+    except Exception as e:
+        logger.exception("Error generando el grupo de prompts")
+        return jsonify({"error": str(e)}), 500
+
+
+#   python model_server.py [--stub] [--port 5001]
+if __name__ == "__main__":
+    argumentos = sys.argv[1:]
+    puerto = SERVER_PORT
+    if "--port" in argumentos:
+        puerto = int(argumentos[argumentos.index("--port") + 1])
+    iniciar_backend("stub" if "--stub" in argumentos else SERVER_BACKEND)
+    app.run(host=SERVER_HOST, port=puerto, debug=False, threaded=True)
@@ -1,295 +1,413 @@
-from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig
-from PyPDF2 import PdfReader
+from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig, LogitsProcessorList
+from transformers.generation.streamers import BaseStreamer
 import torch, json
-import shortuuid
+import copy
+import os
+from collections import OrderedDict
+import time
+import logging
 import configparser
-from pymongo import MongoClient
-from bson import ObjectId
+from pdf_extraction import extraer_texto
+from constrained_decoding import automata_checklist, tabla_vocabulario, ProcesadorJSON
+from metrics import Contador, Histograma
+from prompts import LLM_MODEL_NAME, CHECKLIST, build_prompt, CONSTRAINED_DECODING, JUSTIFICATION_MAX_CHARS
 
 # Cargamos configuraciones para leer properties.txt
 config = configparser.ConfigParser()
 config.read("properties.txt")
 
-# Leemos las configuraciones de la base de datos en properties.txt para aumentar la seguridad
-URL_BD = config["MONGODB"]["mongo.url"]
-DATABASE_NAME = config["MONGODB"]["mongo.database"]
-COLLECTION_NAME = config["MONGODB"]["mongo.collection"]
-
-# Leemos el nombre del modelo del archivo properties.txt, 
-# en caso de querer cambiarlo bastaría con modificar el archivo properties.txt
-LLM_MODEL_NAME = config["LLM"]["model_name"]
-
-# Cargar el modelo (ejecución en GPU + CPU) y el tokenizador
-def load_model():
+logger = logging.getLogger(__name__)
+
+# Métricas de la generación (ver metrics.py)
+PREFILL_SEGUNDOS = Histograma("llm_prefill_seconds", "Time from generate() start to the first generated token of a batch")
+DECODE_SEGUNDOS = Histograma("llm_decode_seconds", "Time spent decoding after the first token of a batch")
+TOKENS_POR_SEGUNDO = Histograma(
+    "llm_decode_tokens_per_second", "Generated tokens per second of decode in a batch",
+    cubos=(1, 5, 10, 20, 50, 100, 200, 500, 1000)
+)
+TOKENS_GENERADOS = Contador("llm_generated_tokens_total", "Tokens generated by the model")
+TOKENS_PROMPT = Contador("llm_prompt_tokens_total", "Prompt tokens processed by the model")
+LOTES = Contador("llm_batches_total", "Calls to model.generate")
+JSON_PARSEADO = Contador("llm_json_parse_total", "Model outputs parsed as JSON, by result")
+PREFIJO_COMPARTIDO = Contador(
+    "llm_shared_prefix_tokens_total", "Prompt tokens prefilled once and shared by every prompt of a batch"
+)
+
+# Backend de inferencia: "cuda" (GPU con pesos de 8 bits), "cpu" o "auto" (cuda si hay una GPU disponible)
+MODEL_BACKEND = config.get("LLM", "backend", fallback="auto")
+# Opciones del backend cpu: hilos de torch (0 = los que decida torch), tipo de los pesos (auto = bfloat16 si la CPU
+# lo soporta, si no float32), cuantización dinámica de las capas lineales a int8 y compilación del grafo con torch.compile
+CPU_THREADS = config.getint("LLM", "cpu_threads", fallback=0)
+CPU_DTYPE = config.get("LLM", "cpu_dtype", fallback="auto")
+CPU_QUANTIZATION = config.get("LLM", "cpu_quantization", fallback="none")
+CPU_COMPILE = config.getboolean("LLM", "cpu_compile", fallback=False)
+
+# Modelo borrador opcional para la decodificación especulativa (asistida): un modelo pequeño de la misma familia,
+# con el mismo tokenizador, propone varios tokens y el modelo principal los verifica en una sola pasada.
+# Vacío = desactivada. Solo se usa con lotes de un prompt
+DRAFT_MODEL_NAME = config.get("LLM", "draft_model_name", fallback="").strip()
+
+# Reutilizar la KV-cache del prefijo fijo del prompt (sistema, ejemplo y checklist) entre peticiones
+PREFIX_CACHE = config.getboolean("LLM", "prefix_cache", fallback=True)
+
+# Temperatura de los reintentos (revisión por preguntas, ver per_question.py): repetir con la decodificación
+# voraz daría la misma salida, así que se muestrea y con la decodificación restringida aunque esté desactivada
+RETRY_TEMPERATURE = config.getfloat("LLM", "retry_temperature", fallback=0.7)
+
+# Prefijo fijo del prompt con su KV-cache precalculada (se rellena en load_model)
+_prefijo = None
+
+# Autómata de la decodificación restringida (se crea en load_model o en la primera generación)
+_automata = None
+
+# Autómatas de subconjuntos de preguntas (revisiones incrementales y por preguntas), los usados más recientemente
+_automatas_parciales = OrderedDict()
+MAX_AUTOMATAS_PARCIALES = 32
+
+# Modelo borrador cargado (se rellena en load_model)
+_borrador = None
+
+# Cargar el modelo con el backend configurado y el tokenizador.
+# progreso (opcional) se llama con el nombre de cada fase de la carga
+def load_model(progreso=None):
+    progreso = progreso or (lambda fase: None)
     model_name = LLM_MODEL_NAME
+    progreso("loading_tokenizer")
     tokenizer = AutoTokenizer.from_pretrained(model_name)
-    bnb_config = BitsAndBytesConfig(load_in_8bit=True)
-    model = AutoModelForCausalLM.from_pretrained(
+    # Relleno por la izquierda para poder generar varios prompts en un mismo lote
+    tokenizer.padding_side = "left"
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    progreso("loading_model")
+    backend = backend_modelo()
+    model = BACKENDS_MODELO[backend](model_name)
+    logger.info(f"Modelo {model_name} cargado con el backend {backend} ({model.dtype})")
+    if DRAFT_MODEL_NAME:
+        progreso("loading_draft")
+        cargar_borrador(backend)
+    if CONSTRAINED_DECODING:
+        progreso("preparing_schema")
+        preparar_automata(model, tokenizer)
+    if PREFIX_CACHE:
+        progreso("preparing_prefix")
+        preparar_prefijo(model, tokenizer)
+    return model, tokenizer, model_name
+
+# Backend cuda: ejecución en GPU + CPU con los pesos cuantizados a 8 bits
+def _cargar_cuda(model_name, cuantizar=True):
+    return AutoModelForCausalLM.from_pretrained(
         model_name,
         device_map="auto",
-        quantization_config=bnb_config,  
+        quantization_config=BitsAndBytesConfig(load_in_8bit=True) if cuantizar else None,
         dtype=torch.float16
     )
-    return model, tokenizer, model_name
 
-# Extraemos el texto del PDF usando PyPDF2
+# Comprobamos en /proc/cpuinfo si la CPU tiene instrucciones bfloat16 (AVX512-BF16 o AMX)
+def _cpu_soporta_bf16():
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+def _dtype_cpu():
+    if CPU_DTYPE == "auto":
+        return torch.bfloat16 if _cpu_soporta_bf16() else torch.float32
+    return getattr(torch, CPU_DTYPE)
+
+# Backend cpu: pensado para nodos sin GPU
+def _cargar_cpu(model_name, cuantizar=True):
+    if CPU_THREADS > 0:
+        torch.set_num_threads(CPU_THREADS)
+    int8 = cuantizar and CPU_QUANTIZATION == "dynamic_int8"
+    if CPU_QUANTIZATION not in ("none", "dynamic_int8"):
+        raise ValueError(f"Cuantización en CPU desconocida: {CPU_QUANTIZATION}")
+    # La cuantización dinámica parte de pesos float32
+    model = AutoModelForCausalLM.from_pretrained(model_name, dtype=torch.float32 if int8 else _dtype_cpu())
+    model.eval()
+    if int8:
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if CPU_COMPILE:
+        model.forward = torch.compile(model.forward, dynamic=True)
+    return model
+
+# Backends de inferencia disponibles: nombre -> función que carga el modelo
+BACKENDS_MODELO = {
+    "cuda": _cargar_cuda,
+    "cpu": _cargar_cpu
+}
+
+def backend_modelo():
+    if MODEL_BACKEND == "auto":
+        return "cuda" if torch.cuda.is_available() else "cpu"
+    if MODEL_BACKEND not in BACKENDS_MODELO:
+        raise ValueError(f"Backend de inferencia desconocido: {MODEL_BACKEND}")
+    return MODEL_BACKEND
+
+# Cargar el modelo borrador de la decodificación especulativa con el mismo backend
+# (sin cuantizar, es lo bastante pequeño)
+def cargar_borrador(backend=None):
+    global _borrador
+    _borrador = BACKENDS_MODELO[backend or backend_modelo()](DRAFT_MODEL_NAME, cuantizar=False)
+    return _borrador
+
+# Extraemos el texto del PDF con el backend configurado en properties.txt (ver pdf_extraction.py)
 def pdf_to_text(file):
-    reader = PdfReader(file)
-    text = ""
-    for page in reader.pages:
-        page_text = page.extract_text()
-        if page_text:
-            text += page_text + "\n"
-    return text.strip()
-
-# Construimos el prompt para la revisión científica (en inglés),
-# para ello usamos el texto extraído del PDF
-def build_prompt(texto_pdf):
-    return [
-        {
-            "role": "system",
-            "content": (
-                "You are a scientific reviewer specialized in experimental software engineering. "
-                "Respond ONLY in valid JSON format. Do not include explanations or markdown."
-            )
-        },
-        {
-            "role": "user",
-            "content": (
-                "You are a scientific reviewer specialized in experimental software engineering. "
-                "Your task is to evaluate a scientific article based on a 10-question checklist (Q1.1 to Q10). "
-                "For each question, provide your answer and a brief justification.\n\n"
-                "The output must be in JSON format, where each question is a key with an object containing:\n"
-                "- 'answer': Must be exactly 'Yes', 'No', or 'N/A'\n"
-                "- 'justification': A brief explanation (maximum 2 sentences) based on the article content.\n\n"
-                "Example output format:\n"
-                "{\n"
-                "    \"Q1.1\": {\n"
-                "        \"answer\": \"Yes\",\n"
-                "        \"justification\": \"The null hypothesis is explicitly stated in section 2.1 of the methodology.\"\n"
-                "    },\n"
-                "    \"Q1.2\": {\n"
-                "        \"answer\": \"No\",\n"
-                "        \"justification\": \"The document does not mention any alternative hypothesis.\"\n"
-                "    },\n"
-                "    \"Q2\": {\n"
-                "        \"answer\": \"N/A\",\n"
-                "        \"justification\": \"Sample size calculation is not applicable to this type of qualitative research.\"\n"
-                "    },\n"
-                "    \"Q3\": {\n"
-                "        \"answer\": \"Yes\",\n"
-                "        \"justification\": \"Random selection is described in section 3.2.\"\n"
-                "    },\n"
-                "    \"Q4\": {\n"
-                "        \"answer\": \"Yes\",\n"
-                "        \"justification\": \"Random assignment to treatment groups is clearly documented.\"\n"
-                "    },\n"
-                "    \"Q5\": {\n"
-                "        \"answer\": \"No\",\n"
-                "        \"justification\": \"Test assumptions such as normality are not discussed.\"\n"
-                "    },\n"
-                "    \"Q6\": {\n"
-                "        \"answer\": \"Yes\",\n"
-                "        \"justification\": \"Linear models are defined and discussed in section 4.\"\n"
-                "    },\n"
-                "    \"Q7\": {\n"
-                "        \"answer\": \"Yes\",\n"
-                "        \"justification\": \"Results are interpreted with reference to p-values and confidence intervals.\"\n"
-                "    },\n"
-                "    \"Q8\": {\n"
-                "        \"answer\": \"Yes\",\n"
-                "        \"justification\": \"The authors do not calculate or discuss post hoc power.\"\n"
-                "    },\n"
-                "    \"Q9\": {\n"
-                "        \"answer\": \"No\",\n"
-                "        \"justification\": \"Multiple testing corrections like Bonferroni are not mentioned.\"\n"
-                "    },\n"
-                "    \"Q10\": {\n"
-                "        \"answer\": \"Yes\",\n"
-                "        \"justification\": \"Descriptive statistics including means and counts are reported in Table 1.\"\n"
-                "    }\n"
-                "}\n\n"
-                "Checklist:\n"
-                "Q1.1 Are null hypotheses explicitly defined?\n"
-                "Q1.2 Are alternative hypotheses explicitly defined?\n"
-                "Q2 Has the required sample size been calculated?\n"
-                "Q3 Have subjects been randomly selected?\n"
-                "Q4 Have subjects been randomly assigned to treatments?\n"
-                "Q5 Have the test assumptions (i.e., normality and heteroskedasticity) been checked or, at least, discussed?\n"
-                "Q6 Has the definition of linear models been discussed?\n"
-                "Q7 Have the analysis results been interpreted by making reference to relevant statistical concepts, such as p-values, confidence intervals, and power?\n"
-                "Q8 Do researchers avoid calculating and discussing post hoc power?\n"
-                "Q9 Is multiple testing, e.g., Bonferroni correction, reported and accounted for?\n"
-                "Q10 Are descriptive statistics, such as means and counts, reported?\n\n"
-                "IMPORTANT: Respond ONLY with the JSON object. Do not add any text before or after the JSON.\n\n"
-                "Now evaluate this article text:\n\n" + texto_pdf
-            )
-        }
-    ]
+    texto, _ = extraer_texto(file.read())
+    return texto
 
 # Generamos la salida del modelo en formato JSON con un límite de 1500 tokens
-def generate_output(model, tokenizer, messages, max_tokens=1500):
-    text = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-    model_inputs = tokenizer([text], return_tensors="pt").to(model.device)
+def generate_output(model, tokenizer, messages, max_tokens=1500, codigos=None):
+    return generate_outputs_batch(model, tokenizer, [messages], max_tokens, codigos=codigos)[0]
+
+# Texto fijo con el que empiezan todos los prompts de build_prompt una vez aplicada la plantilla de chat
+def texto_prefijo(tokenizer):
+    marca = "\x00ARTICULO\x00"
+    texto = tokenizer.apply_chat_template(build_prompt(marca), tokenize=False, add_generation_prompt=True)
+    return texto[:texto.index(marca)]
+
+# Calculamos una sola vez los past_key_values del prefijo fijo para reutilizarlos en cada petición
+def preparar_prefijo(model, tokenizer):
+    global _prefijo
+    texto = texto_prefijo(tokenizer)
+    ids = tokenizer(texto, add_special_tokens=False, return_tensors="pt").input_ids.to(model.device)
+    with torch.no_grad():
+        cache = model(input_ids=ids, use_cache=True).past_key_values
+    _prefijo = {"texto": texto, "ids": ids, "cache": cache}
+    logger.info(f"KV-cache del prefijo del prompt calculada ({ids.shape[1]} tokens)")
+    return _prefijo
+
+# Tabla de vocabulario y autómata del esquema del checklist, se calculan una sola vez por tokenizador
+def preparar_automata(model, tokenizer):
+    global _automata
+    _automata = automata_checklist(tokenizer, list(CHECKLIST), JUSTIFICATION_MAX_CHARS, _eos_ids(model, tokenizer))
+    return _automata
+
+# Autómata para las preguntas de codigos (None = checklist completo)
+def automata_preguntas(model, tokenizer, codigos=None):
+    if not codigos or list(codigos) == list(CHECKLIST):
+        if _automata is None or _automata.tabla is not tabla_vocabulario(tokenizer):
+            preparar_automata(model, tokenizer)
+        return _automata
+    clave = tuple(codigos)
+    automata = _automatas_parciales.pop(clave, None)
+    if automata is None or automata.tabla is not tabla_vocabulario(tokenizer):
+        automata = automata_checklist(tokenizer, list(codigos), JUSTIFICATION_MAX_CHARS, _eos_ids(model, tokenizer))
+    _automatas_parciales[clave] = automata
+    while len(_automatas_parciales) > MAX_AUTOMATAS_PARCIALES:
+        _automatas_parciales.popitem(last=False)
+    return automata
+
+# Tokens de fin de secuencia del modelo
+def _eos_ids(model, tokenizer):
+    eos_ids = model.generation_config.eos_token_id
+    if eos_ids is None:
+        eos_ids = tokenizer.eos_token_id
+    if isinstance(eos_ids, int):
+        eos_ids = [eos_ids]
+    return eos_ids
+
+# Entradas para generate reutilizando la KV-cache de un prefijo: el relleno va entre el prefijo
+# y el resto del prompt, así el prefijo ocupa las mismas posiciones en todas las filas del lote
+def _entradas_con_prefijo(tokenizer, textos, device, prefijo):
+    n = len(textos)
+    ids_prefijo = prefijo["ids"]
+    sufijos = tokenizer(
+        [texto[len(prefijo["texto"]):] for texto in textos],
+        add_special_tokens=False, padding=True, return_tensors="pt"
+    ).to(device)
+    input_ids = torch.cat([ids_prefijo.expand(n, -1), sufijos.input_ids], dim=1)
+    attention_mask = torch.cat([
+        torch.ones((n, ids_prefijo.shape[1]), dtype=sufijos.attention_mask.dtype, device=device),
+        sufijos.attention_mask
+    ], dim=1)
+    # generate modifica la caché, así que la del prefijo fijo se copia en cada llamada
+    # (la de un prefijo común se calcula para este lote y no hace falta copiarla)
+    cache = copy.deepcopy(prefijo["cache"]) if prefijo is _prefijo else prefijo["cache"]
+    if n > 1:
+        cache.batch_repeat_interleave(n)
+    return {"input_ids": input_ids, "attention_mask": attention_mask, "past_key_values": cache}
+
+# Prefijo común a todos los prompts del lote hasta su último salto de línea, si va más allá del prefijo fijo
+# (en la revisión por preguntas, ver per_question.py, es el prompt con el artículo entero). Su KV-cache se calcula
+# una sola vez, partiendo de la del prefijo fijo si la hay, y la comparten todas las filas: el artículo se procesa
+# una vez por lote y no una vez por pregunta. Devuelve el prefijo fijo (o None) si no hay nada más en común
+def _prefijo_comun(model, tokenizer, textos):
+    base = _prefijo if _prefijo is not None and all(texto.startswith(_prefijo["texto"]) for texto in textos) else None
+    if len(textos) < 2:
+        return base
+    comun = os.path.commonprefix(textos)
+    comun = comun[:comun.rfind("\n") + 1]
+    inicio = len(base["texto"]) if base is not None else 0
+    if len(comun) <= inicio:
+        return base
+    ids = tokenizer(comun[inicio:], add_special_tokens=False, return_tensors="pt").input_ids.to(model.device)
+    with torch.no_grad():
+        cache = model(
+            input_ids=ids, past_key_values=copy.deepcopy(base["cache"]) if base is not None else None, use_cache=True
+        ).past_key_values
+    if base is not None:
+        ids = torch.cat([base["ids"], ids], dim=1)
+    PREFIJO_COMPARTIDO.inc(ids.shape[1] * (len(textos) - 1))
+    return {"texto": comun, "ids": ids, "cache": cache}
+
+# Streamer para generate que reparte el texto de cada fila del lote a su callback a medida que se decodifica.
+# También anota cuándo llega el primer token generado, que marca el fin del prefill
+class StreamerLote(BaseStreamer):
+    def __init__(self, tokenizer, callbacks):
+        self.tokenizer = tokenizer
+        self.callbacks = callbacks
+        self.ids = [[] for _ in callbacks]
+        self.emitido = ["" for _ in callbacks]
+        self.prompt_recibido = False
+        self.primer_token = None
+
+    def put(self, value):
+        # La primera llamada trae los ids del prompt
+        if not self.prompt_recibido:
+            self.prompt_recibido = True
+            return
+        if self.primer_token is None:
+            self.primer_token = time.perf_counter()
+        for fila, token in enumerate(value.reshape(len(self.callbacks), -1).tolist()):
+            self.ids[fila].extend(token)
+            self._emitir(fila)
+
+    def end(self):
+        for fila in range(len(self.callbacks)):
+            self._emitir(fila)
+
+    def _emitir(self, fila):
+        if self.callbacks[fila] is None:
+            return
+        texto = self.tokenizer.decode(self.ids[fila], skip_special_tokens=True)
+        # Esperamos si el último token deja un carácter UTF-8 a medias
+        if texto.endswith("\ufffd") or len(texto) <= len(self.emitido[fila]):
+            return
+        self.callbacks[fila](texto[len(self.emitido[fila]):])
+        self.emitido[fila] = texto
+
+# Generamos la salida de varios prompts en una sola llamada a model.generate,
+# los prompts se rellenan por la izquierda para que todos terminen en la misma posición.
+# Si se pasan callbacks, cada uno recibe el texto de su prompt a medida que se genera.
+# Si se pasa una lista en medidas, se rellena con los tiempos y tokens de cada prompt.
+# codigos (opcional) son las preguntas que piden todos los prompts del lote, si no son todas las del checklist;
+# codigos_filas (opcional), las que pide cada prompt cuando no son las mismas en todo el lote
+# Con reintento se muestrea a RETRY_TEMPERATURE y siempre con la decodificación restringida
+def generate_outputs_batch(model, tokenizer, lista_messages, max_tokens=1500, callbacks=None, medidas=None, codigos=None,
+                           codigos_filas=None, reintento=False):
+    textos = [
+        tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+        for messages in lista_messages
+    ]
+    # La decodificación asistida solo admite un prompt por llamada y no parte de una KV-cache ya calculada,
+    # así que con el borrador no se reutiliza la del prefijo
+    asistente = _borrador if _borrador is not None and len(textos) == 1 else None
+    # El prefill empieza con la KV-cache del prefijo común, si la hay
+    inicio = time.perf_counter()
+    prefijo = _prefijo_comun(model, tokenizer, textos) if asistente is None else None
+    if prefijo is not None:
+        model_inputs = _entradas_con_prefijo(tokenizer, textos, model.device, prefijo)
+    else:
+        model_inputs = tokenizer(textos, return_tensors="pt", padding=True).to(model.device)
+    logits_processor = None
+    if CONSTRAINED_DECODING or reintento:
+        if codigos_filas is not None:
+            automata = [automata_preguntas(model, tokenizer, codigos_fila) for codigos_fila in codigos_filas]
+        else:
+            automata = automata_preguntas(model, tokenizer, codigos)
+        logits_processor = LogitsProcessorList([ProcesadorJSON(automata, max_tokens)])
+    if asistente is not None:
+        contadores, ganchos = _contar_pasadas(model, asistente)
+    streamer = StreamerLote(tokenizer, callbacks or [None] * len(textos))
     generated_ids = model.generate(
         max_new_tokens=max_tokens,
-        temperature=0.1, # grado de libertad en la generación
+        temperature=RETRY_TEMPERATURE if reintento else 0.1, # grado de libertad en la generación
         top_p=0.8,
-        do_sample=False,
-        pad_token_id=tokenizer.eos_token_id,
+        do_sample=reintento,
+        pad_token_id=tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id,
+        streamer=streamer,
+        logits_processor=logits_processor,
+        assistant_model=asistente,
         **model_inputs
     )
-
-    output = tokenizer.decode(
-        generated_ids[0][model_inputs.input_ids.shape[1]:],
+    fin = time.perf_counter()
+    if asistente is not None:
+        for gancho in ganchos:
+            gancho.remove()
+        generados = generated_ids.shape[1] - model_inputs["input_ids"].shape[1]
+        _registrar_aceptacion(contadores, generados, fin - inicio)
+    _medir_lote(model, tokenizer, model_inputs, generated_ids, streamer, inicio, fin, medidas)
+
+    outputs = tokenizer.batch_decode(
+        generated_ids[:, model_inputs["input_ids"].shape[1]:],
         skip_special_tokens=True
     )
+    return [parsear_salida(output) for output in outputs]
+
+# Métricas de un lote: el prefill va desde el inicio de generate hasta el primer token y el resto es decode
+def _medir_lote(model, tokenizer, model_inputs, generated_ids, streamer, inicio, fin, medidas):
+    primer_token = streamer.primer_token or fin
+    prefill, decode = primer_token - inicio, fin - primer_token
+    eos_ids = set(_eos_ids(model, tokenizer))
+    filas = []
+    for fila, ids in enumerate(generated_ids[:, model_inputs["input_ids"].shape[1]:].tolist()):
+        # Tokens hasta el primer fin de secuencia (incluido), después solo hay relleno
+        generados = next((i + 1 for i, token in enumerate(ids) if token in eos_ids), len(ids))
+        filas.append({
+            "tokens_prompt": int(model_inputs["attention_mask"][fila].sum()),
+            "tokens_generados": generados,
+            "prefill_s": prefill,
+            "decode_s": decode,
+            "tokens_por_segundo": generados / decode if decode > 0 else 0.0,
+            "lote": len(generated_ids)
+        })
+    total = sum(f["tokens_generados"] for f in filas)
+    LOTES.inc()
+    PREFILL_SEGUNDOS.observar(prefill)
+    DECODE_SEGUNDOS.observar(decode)
+    TOKENS_GENERADOS.inc(total)
+    TOKENS_PROMPT.inc(sum(f["tokens_prompt"] for f in filas))
+    if decode > 0:
+        TOKENS_POR_SEGUNDO.observar(total / decode)
+    if medidas is not None:
+        medidas.extend(filas)
+
+# Contamos las pasadas del modelo principal y del borrador durante una generación asistida
+def _contar_pasadas(model, asistente):
+    contadores = {"principal": 0, "borrador": 0}
+
+    def contar(nombre):
+        def gancho(modulo, entradas, salida):
+            contadores[nombre] += 1
+        return gancho
+
+    ganchos = [
+        model.register_forward_hook(contar("principal")),
+        asistente.register_forward_hook(contar("borrador"))
+    ]
+    return contadores, ganchos
+
+# Estadísticas de aceptación de una generación asistida: en cada pasada el modelo principal verifica los tokens
+# que propuso el borrador y añade uno propio, así que los tokens aceptados son los generados menos las pasadas
+def _registrar_aceptacion(contadores, generados, segundos):
+    propuestos = contadores["borrador"]
+    aceptados = max(generados - contadores["principal"], 0)
+    tasa = aceptados / propuestos if propuestos else 0
+    logger.info(
+        f"Decodificación especulativa: {generados} tokens en {contadores['principal']} pasadas del modelo "
+        f"({generados / max(contadores['principal'], 1):.2f} tokens/pasada), {aceptados}/{propuestos} tokens "
+        f"del borrador aceptados ({tasa:.0%}), {segundos:.1f} s"
+    )
+    return {"generados": generados, "pasadas": contadores["principal"], "propuestos": propuestos, "aceptados": aceptados}
 
+# Convertimos el texto generado por el modelo en un diccionario
+def parsear_salida(output):
     try:
         data = json.loads(output)
+        JSON_PARSEADO.inc(result="ok")
     except:
         data = {"error": "Invalid JSON output", "raw": output}
+        JSON_PARSEADO.inc(result="error")
     return data
-
-# Generar un ID único para cada submission
-def get_id():
-    return shortuuid.uuid()
-
-# Nos conectamos a la bd de MongoDB
-def connect_bd():
-    client = MongoClient(URL_BD)
-    db = client[DATABASE_NAME]
-    collection = db[COLLECTION_NAME]
-    return collection
-
-# Insertar JSON en la bd
-def insertar_bd(json_doc):
-    collection = connect_bd()
-    collection.insert_one(json_doc)
-
-# Calcular el número de versión para añadir una nueva versión de una submission
-def recalcular_version(titulo, user):
-    collection = connect_bd()
-    docs = collection.find({"titulo": titulo, "id_user": user}, {"versiones.numero": 1, "_id": 0})
-    max_version = 0
-    for doc in docs:
-        if "versiones" in doc:
-            for v in doc["versiones"]:
-                if v["numero"] > max_version:
-                    max_version = v["numero"]
-    return max_version + 1
-
-# Comprobamos si el usuario tiene una submission con ese título
-def comprobar_existencia_submision(titulo, user):
-    collection = connect_bd()
-    filtro = {"titulo": titulo, "id_user": user}
-    doc = collection.find_one(filtro)
-
-    print("comprobar_existencia_submision:", doc)
-    return doc is not None
-
-# Creamos la estructura básica de una nueva submission
-def crear_submision(titulo, user, id_submision):
-    data = {
-        "id_sub": id_submision,
-        "id_user": user,
-        "titulo": titulo
-    }
-    return json.dumps(data, indent=4)
-
-
-# Modificar la estructura basica previamente creada para añadir una nueva versión (primera versión)
-def modificar_submision(json_total, version, resultado, fecha):
-    if isinstance(json_total, str):
-        json_data = json.loads(json_total)
-    else:
-        json_data = json_total
-
-    nueva_version = {
-        "numero": version,
-        "fecha": fecha,
-        "preguntas_respuestas": resultado
-    }
-
-    if "versiones" not in json_data:
-        json_data["versiones"] = []
-
-    json_data["versiones"].append(nueva_version)
-
-    return json_data  
-
-# Subir una nueva versión de una submission existente (versiones posteriores)
-def subir_nueva_version(titulo, id_user, respuestas_dict, fecha, version):
-    collection = connect_bd()
-
-    nueva_version = {
-        "numero": version,
-        "fecha": fecha,
-        "preguntas_respuestas": respuestas_dict
-    }
-
-    result = collection.update_one(
-        {"titulo": titulo, "id_user": id_user},
-        {"$push": {"versiones": nueva_version}}
-    )
-    print("RESULT", result)
-
-# Buscar un documento en la bd por título y usuario
-def buscar_en_bd(titulo, user):
-    collection = connect_bd()
-    doc = collection.find_one({"titulo": titulo, "id_user": user})
-
-    if doc:
-        print("buscar_en_bd: encontrado", doc)
-        print("Tipo:", type(doc))
-        return json.dumps(doc, indent=4, default=str)  # Convertir ObjectId a str
-    else:
-        return None
-
-# Buscar todos los títulos de las submissions de un usuario
-def buscar_titulos_bd(user):
-    collection = connect_bd()
-    titulos = collection.distinct("titulo", {"id_user": user})
-    return titulos
-
-# Buscar todas las versiones de una submission de un usuario
-def buscar_versiones_bd(titulo, user):
-    collection = connect_bd()
-    doc = collection.find_one({"titulo": titulo, "id_user": user}, {"versiones": 1, "_id": 0})
-
-    if doc and "versiones" in doc:
-        return doc["versiones"]
-    else:
-        return []
-
-# Función recursiva que se encarga de parsear de ObjectId a str 
-def convertir_objectids(obj):
-    if isinstance(obj, dict):
-        return {k: convertir_objectids(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [convertir_objectids(i) for i in obj]
-    elif isinstance(obj, ObjectId):
-        return str(obj)
-    else:
-        return obj
-
-# Extraer la información de una versión específica 
-def buscar_version_bd(titulo, user, version_num):
-    coleccion = connect_bd()
-    doc = coleccion.find_one(
-        {"titulo": titulo, "id_user": user},
-        {
-            "id_sub": 1,
-            "id_user": 1,
-            "id_pdf": 1,
-            "titulo": 1,
-            "versiones": {"$elemMatch": {"numero": version_num}}
-        }
-    )
-
-    if not doc:
-        print("No se encontró el documento o la versión.")
-        return None
-    
-    doc["_id"] = str(doc["_id"]) 
-    return doc
\ No newline at end of file
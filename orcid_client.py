@@ -0,0 +1,113 @@
+import time
+import logging
+import threading
+import configparser
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from metrics import Contador, Histograma, Indicador
+
+# Cliente de la API OAuth2 de ORCID: una sola sesión HTTP por proceso con pool de conexiones, tiempos de espera
+# y reintentos acotados, para que un ORCID lento no deje bloqueado un worker de la aplicación web.
+# La revocación del token al cerrar sesión se hace en segundo plano. Para pruebas sin conexión, ver orcid_stub.py
+
+# Cargamos configuraciones para leer properties.txt
+config = configparser.ConfigParser()
+config.read("properties.txt")
+
+CLIENT_ID = config["ORCID"]["orcid.client_id"]
+CLIENT_SECRET = config["ORCID"]["orcid.client_secret"]
+REDIRECT_URI = config["ORCID"]["orcid.redirect_uri"]
+ORCID_BASE = config["ORCID"]["orcid.base_url"].rstrip("/")
+# Tiempos de espera de conexión y lectura (segundos), reintentos y conexiones del pool
+ORCID_CONNECT_TIMEOUT = config.getfloat("ORCID", "orcid.connect_timeout", fallback=3)
+ORCID_READ_TIMEOUT = config.getfloat("ORCID", "orcid.read_timeout", fallback=10)
+ORCID_RETRIES = config.getint("ORCID", "orcid.retries", fallback=2)
+ORCID_POOL_SIZE = config.getint("ORCID", "orcid.pool_size", fallback=10)
+# Hilos que revocan tokens en segundo plano
+ORCID_REVOKE_WORKERS = max(config.getint("ORCID", "orcid.revoke_workers", fallback=2), 1)
+
+logger = logging.getLogger(__name__)
+
+PETICIONES = Contador("orcid_requests_total", "Requests to the ORCID OAuth API, by endpoint and result")
+DURACION = Histograma("orcid_request_seconds", "Duration of requests to the ORCID OAuth API, by endpoint")
+
+_revocaciones = {"pendientes": 0}
+_lock = threading.Lock()
+Indicador("orcid_revocations_pending", "Token revocations waiting to be sent to ORCID", lambda: _revocaciones["pendientes"])
+
+
+# Los POST solo se reintentan si no llegaron a procesarse (error de conexión o 502/503/504): el código de autorización
+# es de un solo uso, así que un tiempo de lectura agotado no se reintenta
+def _crear_sesion():
+    reintentos = Retry(
+        total=ORCID_RETRIES, connect=ORCID_RETRIES, read=0, status=ORCID_RETRIES,
+        status_forcelist=(502, 503, 504), allowed_methods=frozenset(["POST"]),
+        backoff_factor=0.5, raise_on_status=False
+    )
+    adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=ORCID_POOL_SIZE, max_retries=reintentos)
+    sesion = requests.Session()
+    sesion.mount("https://", adaptador)
+    sesion.mount("http://", adaptador)
+    sesion.headers["Accept"] = "application/json"
+    return sesion
+
+
+_sesion = _crear_sesion()
+_revocador = ThreadPoolExecutor(max_workers=ORCID_REVOKE_WORKERS, thread_name_prefix="orcid-revoke")
+
+
+def _post(endpoint, datos):
+    inicio = time.perf_counter()
+    try:
+        respuesta = _sesion.post(
+            f"{ORCID_BASE}/oauth/{endpoint}",
+            data=dict(datos, client_id=CLIENT_ID, client_secret=CLIENT_SECRET),
+            timeout=(ORCID_CONNECT_TIMEOUT, ORCID_READ_TIMEOUT)
+        )
+    except requests.RequestException:
+        PETICIONES.inc(endpoint=endpoint, result="error")
+        raise
+    finally:
+        DURACION.observar(time.perf_counter() - inicio, endpoint=endpoint)
+    PETICIONES.inc(endpoint=endpoint, result=str(respuesta.status_code))
+    return respuesta
+
+
+# URL de la página de autorización de ORCID a la que se redirige al usuario
+def url_autorizacion():
+    return f"{ORCID_BASE}/oauth/authorize?" + urlencode({
+        "client_id": CLIENT_ID,
+        "response_type": "code",
+        "scope": "/authenticate",
+        "prompt": "login",
+        "max_age": 0,
+        "redirect_uri": REDIRECT_URI
+    }, safe="/:")
+
+
+# Intercambiar el código de autorización por el token de acceso. Devuelve la respuesta de ORCID;
+# lanza requests.RequestException si ORCID no responde a tiempo
+def obtener_token(code):
+    return _post("token", {"grant_type": "authorization_code", "code": code, "redirect_uri": REDIRECT_URI})
+
+
+def _revocar(token):
+    try:
+        respuesta = _post("revoke", {"token": token})
+        if respuesta.status_code != 200:
+            logger.warning(f"ORCID no ha revocado el token ({respuesta.status_code}): {respuesta.text[:200]}")
+    except requests.RequestException as e:
+        logger.warning(f"Error al revocar el token en ORCID: {e}")
+    finally:
+        with _lock:
+            _revocaciones["pendientes"] -= 1
+
+
+# Revocar el token en segundo plano, la respuesta del logout no espera a ORCID
+def revocar_token(token):
+    with _lock:
+        _revocaciones["pendientes"] += 1
+    _revocador.submit(_revocar, token)
@@ -0,0 +1,115 @@
+import sys
+import time
+import logging
+import threading
+import configparser
+import shortuuid
+from urllib.parse import urlencode
+from flask import Flask, request, redirect, jsonify
+
+# Servidor ORCID de pruebas: implementa lo que usa la aplicación de la API OAuth2 de ORCID (autorización, token,
+# revocación y cierre de sesión) sin pedir credenciales, para probar y medir el login sin conexión.
+# Cada autorización crea un usuario nuevo. Se usa poniendo su dirección en orcid.base_url:
+#   python orcid_stub.py [--port 5002] [--delay-ms 0]
+
+# Cargamos configuraciones para leer properties.txt
+config = configparser.ConfigParser()
+config.read("properties.txt")
+
+STUB_HOST = config.get("ORCID", "orcid.stub_host", fallback="127.0.0.1")
+STUB_PORT = config.getint("ORCID", "orcid.stub_port", fallback=5002)
+# Retardo de las respuestas de token y revocación, para simular un ORCID lento
+STUB_DELAY_MS = config.getint("ORCID", "orcid.stub_delay_ms", fallback=0)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+app = Flask(__name__)
+
+# Códigos de autorización pendientes {código: orcid} y tokens emitidos {token: orcid}
+_codigos = {}
+_tokens = {}
+_lock = threading.Lock()
+_usuarios = {"ultimo": 0}
+
+
+def _esperar():
+    if STUB_DELAY_MS:
+        time.sleep(STUB_DELAY_MS / 1000)
+
+
+def _nuevo_orcid():
+    with _lock:
+        _usuarios["ultimo"] += 1
+        numero = f"{_usuarios['ultimo']:016d}"
+    return "-".join(numero[i:i + 4] for i in range(0, 16, 4))
+
+
+# Autorización: en lugar de la página de login de ORCID se redirige directamente con un código nuevo
+@app.route("/oauth/authorize")
+def authorize():
+    redirect_uri = request.args.get("redirect_uri")
+    if not redirect_uri or request.args.get("response_type") != "code":
+        return "Missing redirect_uri or response_type=code", 400
+    code = shortuuid.uuid()[:6]
+    orcid = _nuevo_orcid()
+    with _lock:
+        _codigos[code] = orcid
+    return redirect(f"{redirect_uri}?{urlencode({'code': code})}")
+
+
+# Token: cada código vale una sola vez, como en ORCID
+@app.route("/oauth/token", methods=["POST"])
+def token():
+    _esperar()
+    with _lock:
+        orcid = _codigos.pop(request.form.get("code", ""), None)
+    if request.form.get("grant_type") != "authorization_code" or orcid is None:
+        return jsonify({"error": "invalid_grant", "error_description": "Invalid authorization code"}), 400
+    access_token = shortuuid.uuid()
+    with _lock:
+        _tokens[access_token] = orcid
+    return jsonify({
+        "access_token": access_token,
+        "token_type": "bearer",
+        "refresh_token": shortuuid.uuid(),
+        "expires_in": 631138518,
+        "scope": "/authenticate",
+        "name": f"Stub User {orcid[-4:]}",
+        "orcid": orcid
+    })
+
+
+@app.route("/oauth/revoke", methods=["POST"])
+def revoke():
+    _esperar()
+    with _lock:
+        _tokens.pop(request.form.get("token", ""), None)
+    return "", 200
+
+
+# La página intermedia del logout abre esta URL en una ventana emergente
+@app.route("/signout")
+def signout():
+    return "<script>window.close()</script>Signed out"
+
+
+@app.route("/health")
+def health():
+    with _lock:
+        return jsonify({"codigos_pendientes": len(_codigos), "tokens": len(_tokens), "usuarios": _usuarios["ultimo"]})
+
+
+if __name__ == "__main__":
+    argumentos = sys.argv[1:]
+    puerto = STUB_PORT
+    if "--port" in argumentos:
+        puerto = int(argumentos[argumentos.index("--port") + 1])
+    if "--delay-ms" in argumentos:
+        STUB_DELAY_MS = int(argumentos[argumentos.index("--delay-ms") + 1])
+    logger.info(f"ORCID de pruebas en http://{STUB_HOST}:{puerto} (retardo {STUB_DELAY_MS} ms)")
+    app.run(host=STUB_HOST, port=puerto, debug=False, threaded=True)
@@ -0,0 +1,263 @@
+import io
+import os
+import sys
+import time
+import logging
+import configparser
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Cargamos configuraciones para leer properties.txt
+config = configparser.ConfigParser()
+config.read("properties.txt")
+
+# Backend de extracción, número de procesos y límites por documento
+PDF_BACKEND = config.get("PDF", "pdf.backend", fallback="pypdf2")
+PDF_WORKERS = config.getint("PDF", "pdf.workers", fallback=2) or os.cpu_count() or 1
+PDF_MAX_PAGES = config.getint("PDF", "pdf.max_pages", fallback=300)
+PDF_MAX_BYTES = config.getint("PDF", "pdf.max_bytes", fallback=50 * 1024 * 1024)
+# Por debajo de este número de páginas no compensa repartir el trabajo entre procesos
+PDF_PARALLEL_MIN_PAGES = config.getint("PDF", "pdf.parallel_min_pages", fallback=8)
+
+# Separador entre las páginas del texto extraído
+SALTO_PAGINA = "\f"
+
+# Firma con la que empieza un PDF (la especificación permite bytes basura antes, en los primeros 1024)
+FIRMA_PDF = b"%PDF-"
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# ---------------- BACKENDS ----------------
+# Cada backend sabe contar las páginas y extraer el texto de un rango de páginas [inicio, fin)
+
+def _paginas_pypdf2(pdf_bytes):
+    from PyPDF2 import PdfReader
+    return len(PdfReader(io.BytesIO(pdf_bytes)).pages)
+
+def _extraer_pypdf2(pdf_bytes, inicio, fin):
+    from PyPDF2 import PdfReader
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    for numero in range(inicio, fin):
+        yield reader.pages[numero].extract_text()
+
+def _paginas_pypdf(pdf_bytes):
+    from pypdf import PdfReader
+    return len(PdfReader(io.BytesIO(pdf_bytes)).pages)
+
+def _extraer_pypdf(pdf_bytes, inicio, fin):
+    from pypdf import PdfReader
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    for numero in range(inicio, fin):
+        yield reader.pages[numero].extract_text()
+
+def _paginas_pymupdf(pdf_bytes):
+    import fitz
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as documento:
+        return documento.page_count
+
+def _extraer_pymupdf(pdf_bytes, inicio, fin):
+    import fitz
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as documento:
+        for numero in range(inicio, fin):
+            yield documento[numero].get_text()
+
+def _paginas_pdfminer(pdf_bytes):
+    from pdfminer.pdfpage import PDFPage
+    return sum(1 for _ in PDFPage.get_pages(io.BytesIO(pdf_bytes)))
+
+def _extraer_pdfminer(pdf_bytes, inicio, fin):
+    from pdfminer.high_level import extract_text
+    for numero in range(inicio, fin):
+        yield extract_text(io.BytesIO(pdf_bytes), page_numbers=[numero])
+
+
+BACKENDS = {
+    "pypdf2": (_paginas_pypdf2, _extraer_pypdf2, "PyPDF2"),
+    "pypdf": (_paginas_pypdf, _extraer_pypdf, "pypdf"),
+    "pymupdf": (_paginas_pymupdf, _extraer_pymupdf, "fitz"),
+    "pdfminer": (_paginas_pdfminer, _extraer_pdfminer, "pdfminer")
+}
+
+
+# Backends cuya librería está instalada
+def backends_disponibles():
+    disponibles = []
+    for nombre, (_, _, modulo) in BACKENDS.items():
+        try:
+            __import__(modulo)
+            disponibles.append(nombre)
+        except ImportError:
+            pass
+    return disponibles
+
+
+# ---------------- EXTRACCIÓN ----------------
+
+# Se ejecuta en los procesos del pool: extrae un rango de páginas midiendo cada una
+def _extraer_rango(backend, pdf_bytes, inicio, fin):
+    _, extraer, _ = BACKENDS[backend]
+    resultado = []
+    paginas = extraer(pdf_bytes, inicio, fin)
+    for numero in range(inicio, fin):
+        t0 = time.perf_counter()
+        texto = next(paginas)
+        resultado.append((numero, texto or "", time.perf_counter() - t0))
+    return resultado
+
+
+# Pool de procesos compartido por todas las extracciones. Usamos "spawn" para no
+# duplicar con fork un proceso que tiene hilos y el modelo cargado. Cada proceso vuelve a ejecutar
+# el módulo principal como __mp_main__: app.py no arranca el servicio ni importa torch en ese caso
+# (ver iniciar_servicio). Lo crea el primer hilo que lo necesita, con el lock para no crear dos
+def _obtener_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+# Dividimos las páginas en tantos rangos contiguos como procesos
+def _rangos(num_paginas, partes):
+    tamano = -(-num_paginas // partes)
+    return [(inicio, min(inicio + tamano, num_paginas)) for inicio in range(0, num_paginas, tamano)]
+
+
+# Comprobar un PDF subido antes de guardarlo: tamaño máximo y firma %PDF. Lanza ValueError si no es válido
+def comprobar_pdf(pdf_bytes, nombre="El PDF"):
+    if len(pdf_bytes) > PDF_MAX_BYTES:
+        raise ValueError(f"{nombre} ocupa {len(pdf_bytes)} bytes, el máximo permitido es {PDF_MAX_BYTES}")
+    if FIRMA_PDF not in pdf_bytes[:1024]:
+        raise ValueError(f"{nombre} no es un PDF válido")
+
+
+# Extraemos el texto de un PDF (bytes) con el backend indicado.
+# Devuelve el texto y un informe con el número de páginas y el tiempo de cada una
+# Las páginas se separan con un salto de página, así la normalización del texto (text_normalization.py)
+# puede reconocer las cabeceras y los pies que se repiten en cada página
+def _unir_paginas(paginas):
+    return f"\n{SALTO_PAGINA}\n".join(texto_pagina.strip("\n") for _, texto_pagina, _ in paginas if texto_pagina).strip()
+
+
+def extraer_texto(pdf_bytes, backend=None, max_paginas=PDF_MAX_PAGES, paralelo=True):
+    backend = backend or PDF_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de extracción desconocido: {backend}")
+    if len(pdf_bytes) > PDF_MAX_BYTES:
+        raise ValueError(f"El PDF ocupa {len(pdf_bytes)} bytes, el máximo permitido es {PDF_MAX_BYTES}")
+
+    inicio = time.perf_counter()
+    contar_paginas, _, _ = BACKENDS[backend]
+    total_paginas = contar_paginas(pdf_bytes)
+    num_paginas = min(total_paginas, max_paginas) if max_paginas else total_paginas
+
+    if paralelo and PDF_WORKERS > 1 and num_paginas >= PDF_PARALLEL_MIN_PAGES:
+        pool = _obtener_pool()
+        futuros = [
+            pool.submit(_extraer_rango, backend, pdf_bytes, a, b)
+            for a, b in _rangos(num_paginas, PDF_WORKERS)
+        ]
+        paginas = [pagina for futuro in futuros for pagina in futuro.result()]
+    else:
+        paginas = _extraer_rango(backend, pdf_bytes, 0, num_paginas)
+
+    # Unimos las páginas de una sola vez (coste lineal)
+    texto = _unir_paginas(paginas)
+    informe = {
+        "backend": backend,
+        "paginas": num_paginas,
+        "paginas_totales": total_paginas,
+        "truncado": num_paginas < total_paginas,
+        "bytes": len(pdf_bytes),
+        "tiempos_paginas": [round(segundos, 4) for _, _, segundos in paginas],
+        "tiempo_total": round(time.perf_counter() - inicio, 4)
+    }
+    if informe["truncado"]:
+        logger.warning(f"PDF truncado a {num_paginas} de {total_paginas} páginas")
+    logger.info(f"Texto extraído con {backend}: {num_paginas} páginas en {informe['tiempo_total']} s")
+    return texto, informe
+
+
+# Extraemos el texto de varios PDFs a la vez repartiendo todos sus rangos de páginas entre los procesos del pool,
+# así también se aprovechan los procesos con muchos PDFs pequeños. Devuelve una lista de (texto, informe) en el
+# mismo orden; si un PDF no se puede leer su texto es None y el informe lleva el error
+def extraer_textos(lista_pdf_bytes, backend=None, max_paginas=PDF_MAX_PAGES):
+    backend = backend or PDF_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de extracción desconocido: {backend}")
+    contar_paginas, _, _ = BACKENDS[backend]
+    pool = _obtener_pool() if PDF_WORKERS > 1 else None
+
+    inicio = time.perf_counter()
+    pendientes = []
+    for pdf_bytes in lista_pdf_bytes:
+        try:
+            if len(pdf_bytes) > PDF_MAX_BYTES:
+                raise ValueError(f"El PDF ocupa {len(pdf_bytes)} bytes, el máximo permitido es {PDF_MAX_BYTES}")
+            total_paginas = contar_paginas(pdf_bytes)
+            num_paginas = min(total_paginas, max_paginas) if max_paginas else total_paginas
+            partes = PDF_WORKERS if num_paginas >= PDF_PARALLEL_MIN_PAGES else 1
+            rangos = _rangos(num_paginas, partes) if num_paginas else []
+            if pool is not None:
+                futuros = [pool.submit(_extraer_rango, backend, pdf_bytes, a, b) for a, b in rangos]
+            else:
+                futuros = [_extraer_rango(backend, pdf_bytes, a, b) for a, b in rangos]
+            pendientes.append((len(pdf_bytes), total_paginas, num_paginas, futuros, None))
+        except Exception as e:
+            pendientes.append((len(pdf_bytes), 0, 0, [], e))
+
+    resultados = []
+    for tamano, total_paginas, num_paginas, futuros, error in pendientes:
+        try:
+            if error is not None:
+                raise error
+            paginas = [pagina for futuro in futuros for pagina in (futuro.result() if pool is not None else futuro)]
+        except Exception as e:
+            logger.warning(f"No se pudo extraer el texto de un PDF: {e}")
+            resultados.append((None, {"backend": backend, "bytes": tamano, "error": str(e)}))
+            continue
+        texto = _unir_paginas(paginas)
+        resultados.append((texto, {
+            "backend": backend,
+            "paginas": num_paginas,
+            "paginas_totales": total_paginas,
+            "truncado": num_paginas < total_paginas,
+            "bytes": tamano,
+            "tiempos_paginas": [round(segundos, 4) for _, _, segundos in paginas]
+        }))
+    logger.info(f"Texto extraído de {len(resultados)} PDFs con {backend} en {time.perf_counter() - inicio:.2f} s")
+    return resultados
+
+
+# Comparar los backends instalados sobre uno o varios PDFs:
+#   python pdf_extraction.py articulo1.pdf articulo2.pdf [--backend pymupdf] [--serie]
+def main(argumentos):
+    backends = backends_disponibles()
+    if "--backend" in argumentos:
+        posicion = argumentos.index("--backend")
+        backends = [argumentos[posicion + 1]]
+        del argumentos[posicion:posicion + 2]
+    paralelo = "--serie" not in argumentos
+    rutas = [a for a in argumentos if a != "--serie"]
+
+    for ruta in rutas:
+        with open(ruta, "rb") as f:
+            pdf_bytes = f.read()
+        print(f"\n{ruta} ({len(pdf_bytes)} bytes)")
+        for backend in backends:
+            texto, informe = extraer_texto(pdf_bytes, backend, paralelo=paralelo)
+            tiempos = sorted(informe["tiempos_paginas"]) or [0]
+            print(
+                f"  {backend:10} {informe['paginas']:4} páginas  total {informe['tiempo_total']:.3f} s  "
+                f"media/página {sum(tiempos) / len(tiempos):.4f} s  máx/página {tiempos[-1]:.4f} s  "
+                f"{len(texto)} caracteres"
+            )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
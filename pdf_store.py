@@ -0,0 +1,131 @@
+import zlib
+import logging
+import threading
+import configparser
+from datetime import datetime
+import gridfs
+from bson import Binary
+from database import connect_bd
+from pdf_extraction import extraer_texto, extraer_textos, PDF_BACKEND, PDF_MAX_PAGES
+from review_cache import hash_pdf
+from metrics import Contador
+
+# Almacén de los PDFs subidos en GridFS, direccionado por contenido: el _id de cada archivo es el hash del PDF,
+# así un mismo PDF subido varias veces se guarda una sola vez. Junto al bucket se guarda comprimido el texto
+# extraído de cada PDF, de modo que volver a revisarlo (nueva versión, caché, cambio de modelo) no vuelve a leer el PDF
+
+# Cargamos configuraciones para leer properties.txt
+config = configparser.ConfigParser()
+config.read("properties.txt")
+
+# Bucket de GridFS (colecciones <bucket>.files y <bucket>.chunks) y colección del texto extraído
+PDF_BUCKET = config.get("MONGODB", "mongo.pdf_bucket", fallback="pdfs")
+PDF_TEXT_COLLECTION = f"{PDF_BUCKET}.texts"
+
+logger = logging.getLogger(__name__)
+
+TEXTOS = Contador("pdf_text_cache_total", "Extracted text lookups in the PDF store, by result")
+
+_fs = None
+_lock = threading.Lock()
+
+
+def _bucket():
+    global _fs
+    if _fs is None:
+        with _lock:
+            if _fs is None:
+                # La base de datos de la colección de textos, así el bucket y los textos van siempre juntos
+                _fs = gridfs.GridFS(connect_textos().database, collection=PDF_BUCKET)
+    return _fs
+
+
+def connect_textos():
+    return connect_bd(PDF_TEXT_COLLECTION)
+
+
+# Guardar un PDF si no está ya guardado. Devuelve su hash, que es su identificador (id_pdf)
+def guardar_pdf(pdf_bytes, nombre=None):
+    pdf_hash = hash_pdf(pdf_bytes)
+    fs = _bucket()
+    if not fs.exists(pdf_hash):
+        try:
+            fs.put(bytes(pdf_bytes), _id=pdf_hash, filename=nombre, subido=datetime.now())
+            logger.info(f"PDF {pdf_hash[:12]} guardado ({len(pdf_bytes)} bytes)")
+        except gridfs.errors.FileExists:
+            pass  # otra subida simultánea del mismo PDF lo ha guardado antes
+    return pdf_hash
+
+
+# Bytes de un PDF guardado, None si no existe
+def leer_pdf(pdf_hash):
+    try:
+        return _bucket().get(pdf_hash).read()
+    except gridfs.errors.NoFile:
+        return None
+
+
+# El texto depende del backend de extracción y del límite de páginas
+def _clave_texto(pdf_hash):
+    return f"{pdf_hash}:{PDF_BACKEND}:{PDF_MAX_PAGES}"
+
+
+def _texto_guardado(pdf_hash):
+    doc = connect_textos().find_one({"_id": _clave_texto(pdf_hash)}, {"texto": 1})
+    TEXTOS.inc(result="hit" if doc else "miss")
+    return zlib.decompress(doc["texto"]).decode("utf-8") if doc else None
+
+
+def _guardar_texto(pdf_hash, texto, informe):
+    comprimido = zlib.compress(texto.encode("utf-8"), 6)
+    connect_textos().update_one(
+        {"_id": _clave_texto(pdf_hash)},
+        {"$setOnInsert": {
+            "pdf_hash": pdf_hash,
+            "backend": PDF_BACKEND,
+            "texto": Binary(comprimido),
+            "caracteres": len(texto),
+            "bytes_comprimido": len(comprimido),
+            "paginas": informe.get("paginas"),
+            "creado": datetime.now()
+        }},
+        upsert=True
+    )
+
+
+# Texto de un PDF guardado: el ya extraído si lo hay y, si no, se extrae y se guarda comprimido.
+# pdf_bytes evita volver a leer de GridFS un PDF que se acaba de subir
+def texto_pdf(pdf_hash, pdf_bytes=None):
+    texto = _texto_guardado(pdf_hash)
+    if texto is not None:
+        return texto
+    if pdf_bytes is None:
+        pdf_bytes = leer_pdf(pdf_hash)
+        if pdf_bytes is None:
+            raise ValueError(f"No existe el PDF {pdf_hash}")
+    texto, informe = extraer_texto(bytes(pdf_bytes))
+    _guardar_texto(pdf_hash, texto, informe)
+    return texto
+
+
+# Texto de varios PDFs guardados como [(texto, informe)]: los que no están extraídos se extraen a la vez
+# (ver extraer_textos). Si un PDF no existe o no se puede leer, su texto es None y el informe lleva el error
+def textos_pdfs(hashes):
+    resultados = {}
+    pendientes = []
+    for pdf_hash in hashes:
+        texto = _texto_guardado(pdf_hash)
+        if texto is not None:
+            resultados[pdf_hash] = (texto, {"guardado": True})
+        elif pdf_hash not in pendientes:
+            pendientes.append(pdf_hash)
+
+    leidos = [(pdf_hash, leer_pdf(pdf_hash)) for pdf_hash in pendientes]
+    for pdf_hash, _ in (l for l in leidos if l[1] is None):
+        resultados[pdf_hash] = (None, {"error": "The PDF is no longer stored"})
+    leidos = [(pdf_hash, pdf_bytes) for pdf_hash, pdf_bytes in leidos if pdf_bytes is not None]
+    for (pdf_hash, _), (texto, informe) in zip(leidos, extraer_textos([pdf_bytes for _, pdf_bytes in leidos])):
+        if texto is not None:
+            _guardar_texto(pdf_hash, texto, informe)
+        resultados[pdf_hash] = (texto, informe)
+    return [resultados[pdf_hash] for pdf_hash in hashes]
@@ -0,0 +1,88 @@
+import json
+import logging
+import configparser
+from prompts import build_prompt, CHECKLIST
+from metrics import Contador, anotar
+
+# Revisión por preguntas: en lugar de un prompt que pide las diez preguntas del checklist en una sola salida larga
+# (que se decodifica token a token, y en la que una clave mal formada invalida todo el JSON), se hace un prompt corto
+# por pregunta sobre el mismo texto. Los prompts solo se diferencian al final (build_prompt pone la pregunta después
+# del artículo), así que se generan en un solo lote que comparte la KV-cache del artículo (ver generar_grupo en
+# inference_engine.py) y la latencia es la de una respuesta corta. Las preguntas que fallan se repiten solas,
+# muestreando y con la decodificación restringida (con la voraz de la primera vez saldría lo mismo)
+
+# Cargamos configuraciones para leer properties.txt
+config = configparser.ConfigParser()
+config.read("properties.txt")
+
+# Modo de revisión: "full" (un prompt con todo el checklist) o "per_question" (un prompt por pregunta)
+REVIEW_MODES = ("full", "per_question")
+REVIEW_MODE = config.get("LLM", "review_mode", fallback="full").strip()
+# Tokens máximos de la respuesta a una pregunta y reintentos de una pregunta sin respuesta válida
+PER_QUESTION_MAX_TOKENS = config.getint("LLM", "per_question_max_tokens", fallback=200)
+PER_QUESTION_RETRIES = max(config.getint("LLM", "per_question_retries", fallback=1), 0)
+
+logger = logging.getLogger(__name__)
+
+if REVIEW_MODE not in REVIEW_MODES:
+    logger.warning(f"Modo de revisión desconocido en review_mode: '{REVIEW_MODE}', se usa 'full'")
+    REVIEW_MODE = "full"
+
+PREGUNTAS = Contador("review_questions_total", "Checklist questions generated in per-question mode, by result")
+
+
+def modo_por_preguntas():
+    return REVIEW_MODE == "per_question"
+
+
+# Un prompt por pregunta, todos con el mismo texto
+def prompts_por_pregunta(texto, codigos):
+    return [build_prompt(texto, [codigo]) for codigo in codigos]
+
+
+# Respuesta de una pregunta dentro del JSON generado para ella, None si no es válida
+def respuesta_pregunta(resultado, codigo):
+    respuesta = resultado.get(codigo) if "error" not in resultado else None
+    if isinstance(respuesta, dict) and "answer" in respuesta:
+        return respuesta
+    return None
+
+
+# Revisar las preguntas de codigos (None = todo el checklist) con un prompt por pregunta.
+# generar_grupo(lista_messages, codigos_filas, max_tokens, callbacks, reintento) genera los prompts juntos y devuelve
+# sus JSON (con reintento, ver generate_outputs_batch en model_utils.py);
+# crear_callback (opcional) crea la función que recibe el texto generado para cada pregunta.
+# Devuelve (resultado, fallidas): el diccionario de preguntas_respuestas con las preguntas respondidas y las que
+# siguen sin respuesta válida tras los reintentos. Si no se responde ninguna, el resultado es el error de la primera
+def revisar_por_preguntas(generar_grupo, texto, codigos=None, crear_callback=None):
+    codigos = list(codigos or CHECKLIST)
+    respuestas, errores = {}, {}
+    pendientes = codigos
+    for intento in range(PER_QUESTION_RETRIES + 1):
+        if intento:
+            logger.warning(f"Repitiendo {len(pendientes)} preguntas sin respuesta válida: {pendientes}")
+        callbacks = [crear_callback() for _ in pendientes] if crear_callback else None
+        resultados = generar_grupo(
+            prompts_por_pregunta(texto, pendientes), [[codigo] for codigo in pendientes], PER_QUESTION_MAX_TOKENS, callbacks,
+            reintento=intento > 0
+        )
+        fallidas = []
+        for codigo, resultado in zip(pendientes, resultados):
+            respuesta = respuesta_pregunta(resultado, codigo)
+            if respuesta is None:
+                errores[codigo] = resultado
+                fallidas.append(codigo)
+            else:
+                respuestas[codigo] = respuesta
+                PREGUNTAS.inc(result="retried" if intento else "ok")
+        pendientes = fallidas
+        if not pendientes:
+            break
+
+    for codigo in pendientes:
+        PREGUNTAS.inc(result="failed")
+    anotar("preguntas_fallidas", pendientes)
+    if not respuestas:
+        error = errores[pendientes[0]]
+        return (error if "error" in error else {"error": "Missing answer", "raw": json.dumps(error)}), pendientes
+    return {codigo: respuestas[codigo] for codigo in codigos if codigo in respuestas}, pendientes
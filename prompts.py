@@ -0,0 +1,122 @@
+import json
+import hashlib
+import configparser
+
+# Texto del prompt de revisión y su sello de versión. No importa torch ni transformers: lo usan también
+# los procesos que no cargan el modelo (la web con servidor de modelo, los workers de PDFs, la caché de revisiones)
+
+# Cargamos configuraciones para leer properties.txt
+config = configparser.ConfigParser()
+config.read("properties.txt")
+
+# Leemos el nombre del modelo del archivo properties.txt, 
+# en caso de querer cambiarlo bastaría con modificar el archivo properties.txt
+LLM_MODEL_NAME = config["LLM"]["model_name"]
+
+# Decodificación restringida al esquema del checklist: la salida siempre es un JSON válido
+# con las claves Q1.1-Q10, respuestas Yes/No/N/A y justificaciones de como mucho justification_max_chars caracteres
+CONSTRAINED_DECODING = config.getboolean("LLM", "constrained_decoding", fallback=True)
+JUSTIFICATION_MAX_CHARS = config.getint("LLM", "justification_max_chars", fallback=300)
+
+# Preguntas del checklist de revisión, en el orden en que se piden al modelo
+CHECKLIST = {
+    "Q1.1": "Are null hypotheses explicitly defined?",
+    "Q1.2": "Are alternative hypotheses explicitly defined?",
+    "Q2": "Has the required sample size been calculated?",
+    "Q3": "Have subjects been randomly selected?",
+    "Q4": "Have subjects been randomly assigned to treatments?",
+    "Q5": "Have the test assumptions (i.e., normality and heteroskedasticity) been checked or, at least, discussed?",
+    "Q6": "Has the definition of linear models been discussed?",
+    "Q7": "Have the analysis results been interpreted by making reference to relevant statistical concepts, such as p-values, confidence intervals, and power?",
+    "Q8": "Do researchers avoid calculating and discussing post hoc power?",
+    "Q9": "Is multiple testing, e.g., Bonferroni correction, reported and accounted for?",
+    "Q10": "Are descriptive statistics, such as means and counts, reported?"
+}
+
+# Construimos el prompt para la revisión científica (en inglés),
+# para ello usamos el texto extraído del PDF.
+# Con codigos solo se piden esas preguntas: la indicación va después del artículo para que el principio
+# del prompt sea el mismo y se pueda reutilizar la KV-cache del prefijo
+def build_prompt(texto_pdf, codigos=None):
+    if codigos:
+        texto_pdf += (
+            "\n\nOnly evaluate these questions of the checklist: " + ", ".join(codigos) + ". "
+            "The JSON object must contain only these keys."
+        )
+    return [
+        {
+            "role": "system",
+            "content": (
+                "You are a scientific reviewer specialized in experimental software engineering. "
+                "Respond ONLY in valid JSON format. Do not include explanations or markdown."
+            )
+        },
+        {
+            "role": "user",
+            "content": (
+                "You are a scientific reviewer specialized in experimental software engineering. "
+                "Your task is to evaluate a scientific article based on a 10-question checklist (Q1.1 to Q10). "
+                "For each question, provide your answer and a brief justification.\n\n"
+                "The output must be in JSON format, where each question is a key with an object containing:\n"
+                "- 'answer': Must be exactly 'Yes', 'No', or 'N/A'\n"
+                "- 'justification': A brief explanation (maximum 2 sentences) based on the article content.\n\n"
+                "Example output format:\n"
+                "{\n"
+                "    \"Q1.1\": {\n"
+                "        \"answer\": \"Yes\",\n"
+                "        \"justification\": \"The null hypothesis is explicitly stated in section 2.1 of the methodology.\"\n"
+                "    },\n"
+                "    \"Q1.2\": {\n"
+                "        \"answer\": \"No\",\n"
+                "        \"justification\": \"The document does not mention any alternative hypothesis.\"\n"
+                "    },\n"
+                "    \"Q2\": {\n"
+                "        \"answer\": \"N/A\",\n"
+                "        \"justification\": \"Sample size calculation is not applicable to this type of qualitative research.\"\n"
+                "    },\n"
+                "    \"Q3\": {\n"
+                "        \"answer\": \"Yes\",\n"
+                "        \"justification\": \"Random selection is described in section 3.2.\"\n"
+                "    },\n"
+                "    \"Q4\": {\n"
+                "        \"answer\": \"Yes\",\n"
+                "        \"justification\": \"Random assignment to treatment groups is clearly documented.\"\n"
+                "    },\n"
+                "    \"Q5\": {\n"
+                "        \"answer\": \"No\",\n"
+                "        \"justification\": \"Test assumptions such as normality are not discussed.\"\n"
+                "    },\n"
+                "    \"Q6\": {\n"
+                "        \"answer\": \"Yes\",\n"
+                "        \"justification\": \"Linear models are defined and discussed in section 4.\"\n"
+                "    },\n"
+                "    \"Q7\": {\n"
+                "        \"answer\": \"Yes\",\n"
+                "        \"justification\": \"Results are interpreted with reference to p-values and confidence intervals.\"\n"
+                "    },\n"
+                "    \"Q8\": {\n"
+                "        \"answer\": \"Yes\",\n"
+                "        \"justification\": \"The authors do not calculate or discuss post hoc power.\"\n"
+                "    },\n"
+                "    \"Q9\": {\n"
+                "        \"answer\": \"No\",\n"
+                "        \"justification\": \"Multiple testing corrections like Bonferroni are not mentioned.\"\n"
+                "    },\n"
+                "    \"Q10\": {\n"
+                "        \"answer\": \"Yes\",\n"
+                "        \"justification\": \"Descriptive statistics including means and counts are reported in Table 1.\"\n"
+                "    }\n"
+                "}\n\n"
+                "Checklist:\n" +
+                "".join(f"{codigo} {pregunta}\n" for codigo, pregunta in CHECKLIST.items()) + "\n"
+                "IMPORTANT: Respond ONLY with the JSON object. Do not add any text before or after the JSON.\n\n"
+                "Now evaluate this article text:\n\n" + texto_pdf
+            )
+        }
+    ]
+
+# Sello de versión del prompt: cambia automáticamente si se modifica el texto fijo de build_prompt
+# o la configuración de la decodificación restringida
+PROMPT_VERSION = hashlib.sha256(json.dumps(
+    [build_prompt(""), JUSTIFICATION_MAX_CHARS if CONSTRAINED_DECODING else None]
+).encode("utf-8")).hexdigest()[:12]
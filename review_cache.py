@@ -0,0 +1,112 @@
+import hashlib
+import logging
+import configparser
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING
+from database import connect_bd, registrar_indice
+from prompts import LLM_MODEL_NAME, PROMPT_VERSION
+from text_normalization import VERSION_NORMALIZACION
+from evidence import EVIDENCE_MAX_TOKENS, EVIDENCE_PASSAGE_WORDS
+from per_question import REVIEW_MODE
+from pdf_extraction import PDF_BACKEND, PDF_MAX_PAGES
+
+# Cargamos configuraciones para leer properties.txt
+config = configparser.ConfigParser()
+config.read("properties.txt")
+
+# Colección de la caché de revisiones (junto a las submissions) y número máximo de entradas
+CACHE_COLLECTION = config.get("MONGODB", "mongo.cache_collection", fallback="review_cache")
+CACHE_MAX_ENTRIES = config.getint("CACHE", "cache.max_entries", fallback=1000)
+
+# Documento especial donde se acumulan los contadores de aciertos y fallos
+ID_ESTADISTICAS = "__stats__"
+
+logger = logging.getLogger(__name__)
+
+# Índice para la expulsión por último acceso
+registrar_indice(CACHE_COLLECTION, [("ultimo_acceso", ASCENDING)], name="ultimo_acceso")
+
+
+def connect_cache():
+    return connect_bd(CACHE_COLLECTION)
+
+
+# Hash del contenido del PDF
+def hash_pdf(pdf_bytes):
+    return hashlib.sha256(bytes(pdf_bytes)).hexdigest()
+
+
+# La clave combina el hash del PDF, el modelo, la versión del prompt, la extracción del texto (backend y páginas
+# máximas, ver pdf_extraction.py), la versión de la normalización, la selección de evidencias (evidence.py)
+# y el modo de revisión (completa o por preguntas, ver per_question.py),
+# de modo que cambiar cualquiera de ellos invalida las entradas antiguas
+def clave_cache(pdf_hash, modo=REVIEW_MODE):
+    return hashlib.sha256(
+        f"{pdf_hash}|{LLM_MODEL_NAME}|{PROMPT_VERSION}|{PDF_BACKEND}|{PDF_MAX_PAGES}|{VERSION_NORMALIZACION}"
+        f"|{EVIDENCE_MAX_TOKENS}|{EVIDENCE_PASSAGE_WORDS}|{modo}".encode("utf-8")
+    ).hexdigest()
+
+
+# Buscar una revisión ya generada: devuelve (resultado, huellas) o None si no está en caché.
+# Las huellas de las secciones (ver incremental.py) son None en las entradas guardadas sin ellas
+def buscar_en_cache(clave):
+    collection = connect_cache()
+    doc = collection.find_one_and_update(
+        {"_id": clave},
+        {"$set": {"ultimo_acceso": datetime.now()}, "$inc": {"aciertos": 1}},
+        {"resultado": 1, "huellas": 1}
+    )
+    contador = "hits" if doc else "misses"
+    collection.update_one({"_id": ID_ESTADISTICAS}, {"$inc": {contador: 1}}, upsert=True)
+    if doc:
+        logger.info(f"Revisión encontrada en caché ({clave[:12]})")
+        return doc["resultado"], doc.get("huellas")
+    return None
+
+
+# Guardar una revisión en caché, con las huellas de sus secciones para que la versión creada desde la caché
+# también se pueda revisar de forma incremental, y expulsar las menos usadas si se supera el límite
+def guardar_en_cache(clave, pdf_hash, resultado, huellas=None):
+    collection = connect_cache()
+    ahora = datetime.now()
+    collection.update_one(
+        {"_id": clave},
+        {
+            "$set": {"resultado": resultado, "huellas": huellas, "ultimo_acceso": ahora},
+            "$setOnInsert": {
+                "pdf_hash": pdf_hash,
+                "modelo": LLM_MODEL_NAME,
+                "version_prompt": PROMPT_VERSION,
+                "creado": ahora,
+                "aciertos": 0
+            }
+        },
+        upsert=True
+    )
+    _expulsar(collection)
+
+
+# Expulsión por tamaño: se conservan las CACHE_MAX_ENTRIES entradas usadas más recientemente
+def _expulsar(collection):
+    filtro = {"_id": {"$ne": ID_ESTADISTICAS}}
+    sobrantes = collection.count_documents(filtro) - CACHE_MAX_ENTRIES
+    if sobrantes <= 0:
+        return
+    antiguas = collection.find(filtro, {"_id": 1}).sort("ultimo_acceso", DESCENDING).skip(CACHE_MAX_ENTRIES)
+    ids = [doc["_id"] for doc in antiguas]
+    collection.delete_many({"_id": {"$in": ids}})
+    collection.update_one({"_id": ID_ESTADISTICAS}, {"$inc": {"evictions": len(ids)}}, upsert=True)
+    logger.info(f"Expulsadas {len(ids)} entradas de la caché de revisiones")
+
+
+# Contadores de la caché
+def estadisticas_cache():
+    collection = connect_cache()
+    stats = collection.find_one({"_id": ID_ESTADISTICAS}) or {}
+    return {
+        "entradas": collection.count_documents({"_id": {"$ne": ID_ESTADISTICAS}}),
+        "max_entradas": CACHE_MAX_ENTRIES,
+        "hits": stats.get("hits", 0),
+        "misses": stats.get("misses", 0),
+        "evictions": stats.get("evictions", 0)
+    }
@@ -0,0 +1,138 @@
+import re
+import json
+import threading
+
+# Tiempo que se conserva un canal cerrado para los clientes que se conecten tarde
+RETENCION_CANAL_SEGUNDOS = 120
+# Cada cuánto se manda un evento de "ping" a un cliente sin novedades
+PING_SEGUNDOS = 15
+
+# Inicio de cada respuesta del checklist dentro del JSON generado, p.ej. "Q1.1": {
+PATRON_PREGUNTA = re.compile(r'"(Q\d+(?:\.\d+)?)"\s*:\s*\{')
+
+_canales = {}
+_lock = threading.Lock()
+
+
+# ---------------- CANALES DE EVENTOS POR TRABAJO ----------------
+
+# Crear (si no existe) el canal de eventos de un trabajo
+def abrir_canal(job_id):
+    with _lock:
+        if job_id not in _canales:
+            _canales[job_id] = {"eventos": [], "cerrado": False, "cond": threading.Condition()}
+        return _canales[job_id]
+
+
+# Añadir un evento al canal, los suscriptores lo reciben en orden
+def publicar(job_id, tipo, datos):
+    canal = abrir_canal(job_id)
+    with canal["cond"]:
+        canal["eventos"].append((tipo, datos))
+        canal["cond"].notify_all()
+
+
+# Publicar el evento final y programar el borrado del canal
+def cerrar_canal(job_id, datos):
+    canal = abrir_canal(job_id)
+    with canal["cond"]:
+        canal["eventos"].append(("fin", datos))
+        canal["cerrado"] = True
+        canal["cond"].notify_all()
+    temporizador = threading.Timer(RETENCION_CANAL_SEGUNDOS, _borrar_canal, args=(job_id,))
+    temporizador.daemon = True
+    temporizador.start()
+
+
+def _borrar_canal(job_id):
+    with _lock:
+        _canales.pop(job_id, None)
+
+
+# Generador con los eventos de un trabajo desde el principio (los clientes que llegan tarde reciben lo ya publicado).
+# estado_final() se consulta en cada ping por si el trabajo terminó en otro proceso o antes de abrir el canal
+def suscribir(job_id, estado_final=None):
+    canal = abrir_canal(job_id)
+    leidos = 0
+    while True:
+        with canal["cond"]:
+            if leidos == len(canal["eventos"]) and not canal["cerrado"]:
+                canal["cond"].wait(PING_SEGUNDOS)
+            nuevos = canal["eventos"][leidos:]
+            leidos += len(nuevos)
+        for tipo, datos in nuevos:
+            yield tipo, datos
+            if tipo == "fin":
+                return
+        if not nuevos:
+            final = estado_final() if estado_final else None
+            if final is not None:
+                yield "fin", final
+                return
+            yield "ping", None
+
+
+# ---------------- PARSEO INCREMENTAL DEL JSON ----------------
+
+# Posición de la llave que cierra el objeto que empieza en "inicio", o None si aún no se ha generado
+def _cierre_objeto(texto, inicio):
+    profundidad = 0
+    en_cadena = False
+    escape = False
+    for i in range(inicio, len(texto)):
+        c = texto[i]
+        if en_cadena:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                en_cadena = False
+        elif c == '"':
+            en_cadena = True
+        elif c == "{":
+            profundidad += 1
+        elif c == "}":
+            profundidad -= 1
+            if profundidad == 0:
+                return i
+    return None
+
+
+# Buscamos las respuestas del checklist ya completas a partir de la posición "desde".
+# Devuelve la lista de (código, respuesta) y la posición desde la que seguir buscando
+def extraer_preguntas(texto, desde=0):
+    encontradas = []
+    posicion = desde
+    while True:
+        m = PATRON_PREGUNTA.search(texto, posicion)
+        if not m:
+            break
+        inicio = m.end() - 1
+        fin = _cierre_objeto(texto, inicio)
+        if fin is None:
+            # Objeto a medias: volveremos a mirar desde aquí cuando llegue más texto
+            return encontradas, m.start()
+        try:
+            encontradas.append((m.group(1), json.loads(texto[inicio:fin + 1])))
+        except ValueError:
+            pass
+        posicion = fin + 1
+    return encontradas, posicion
+
+
+# Función que recibe los fragmentos de texto del modelo y los publica en el canal del trabajo,
+# junto con cada respuesta del checklist en cuanto su objeto JSON se cierra.
+# Con tokens=False solo se publican las respuestas (en la revisión por preguntas hay varias salidas a la vez)
+def crear_emisor(job_id, tokens=True):
+    estado = {"texto": "", "posicion": 0}
+
+    def emitir(fragmento):
+        estado["texto"] += fragmento
+        if tokens:
+            publicar(job_id, "token", fragmento)
+        preguntas, estado["posicion"] = extraer_preguntas(estado["texto"], estado["posicion"])
+        for codigo, respuesta in preguntas:
+            publicar(job_id, "pregunta", {"codigo": codigo, "respuesta": respuesta})
+
+    return emitir
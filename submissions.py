@@ -0,0 +1,227 @@
+import json
+import shortuuid
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import BulkWriteError
+from bson import ObjectId
+from database import connect_bd, registrar_indice, COLLECTION_NAME
+from user_cache import leer_usuario, invalidar_usuario
+
+# Consultas y escrituras de las submissions y sus versiones en MongoDB (sin el modelo, ver model_utils.py)
+
+# Un usuario no puede tener dos submissions con el mismo título
+registrar_indice(COLLECTION_NAME, [("id_user", ASCENDING), ("titulo", ASCENDING)], unique=True, name="usuario_titulo")
+
+# Generar un ID único para cada submission
+def get_id():
+    return shortuuid.uuid()
+
+# Insertar JSON en la bd
+def insertar_bd(json_doc):
+    collection = connect_bd()
+    collection.insert_one(json_doc)
+    invalidar_usuario(json_doc["id_user"])
+
+# Insertar varias submissions de una vez (modo masivo, ver bulk.py). Con ordered=False un documento que falla
+# no impide insertar los demás; devuelve {posición: error} de los que no se pudieron insertar
+def insertar_varios_bd(json_docs):
+    if not json_docs:
+        return {}
+    collection = connect_bd()
+    try:
+        collection.insert_many(json_docs, ordered=False)
+    except BulkWriteError as e:
+        return {error["index"]: error for error in e.details.get("writeErrors", [])}
+    finally:
+        for user in {doc["id_user"] for doc in json_docs}:
+            invalidar_usuario(user)
+    return {}
+
+# Comprobamos si el usuario tiene una submission con ese título. Se consulta siempre MongoDB (con el índice
+# usuario_titulo) y no la caché de user_cache.py: la submission puede haberla creado otro proceso
+def comprobar_existencia_submision(titulo, user):
+    collection = connect_bd()
+    return collection.find_one({"id_user": user, "titulo": titulo}, {"_id": 1}) is not None
+
+# Creamos la estructura básica de una nueva submission
+# id_pdf es el hash del PDF en el almacén de pdf_store.py
+def crear_submision(titulo, user, id_submision, id_pdf=None):
+    data = {
+        "id_sub": id_submision,
+        "id_user": user,
+        "id_pdf": id_pdf,
+        "titulo": titulo
+    }
+    return json.dumps(data, indent=4)
+
+
+# Modificar la estructura basica previamente creada para añadir una nueva versión (primera versión).
+# tiempos (opcional) es el resumen de tiempos de la revisión (ver metrics.py) y huellas las de sus secciones
+# y evidencias, con las que se revisa de forma incremental la versión siguiente (ver incremental.py).
+# id_pdf es el PDF revisado en esa versión
+def modificar_submision(json_total, version, resultado, fecha, tiempos=None, huellas=None, id_pdf=None):
+    if isinstance(json_total, str):
+        json_data = json.loads(json_total)
+    else:
+        json_data = json_total
+
+    nueva_version = {
+        "numero": version,
+        "fecha": fecha,
+        "preguntas_respuestas": resultado
+    }
+    if tiempos is not None:
+        nueva_version["tiempos"] = tiempos
+    if huellas is not None:
+        nueva_version["huellas"] = huellas
+    if id_pdf is not None:
+        nueva_version["id_pdf"] = id_pdf
+
+    if "versiones" not in json_data:
+        json_data["versiones"] = []
+
+    json_data["versiones"].append(nueva_version)
+    # Contador de versiones de la submission, lo incrementa subir_nueva_version
+    json_data["ultima_version"] = version
+
+    return json_data  
+
+# Subir una nueva versión de una submission existente (versiones posteriores).
+# El número se asigna en el servidor con el contador "ultima_version" en la misma operación que añade la versión,
+# así dos subidas simultáneas nunca reciben el mismo número. Devuelve el documento con solo la versión nueva
+def subir_nueva_version(titulo, id_user, respuestas_dict, fecha, tiempos=None, huellas=None, id_pdf=None):
+    collection = connect_bd()
+    nueva_version = {
+        "numero": "$ultima_version",
+        # $literal evita que un texto del modelo que empiece por "$" se interprete como un campo
+        "fecha": {"$literal": fecha},
+        "preguntas_respuestas": {"$literal": respuestas_dict}
+    }
+    if tiempos is not None:
+        nueva_version["tiempos"] = {"$literal": tiempos}
+    if huellas is not None:
+        nueva_version["huellas"] = {"$literal": huellas}
+    # id_pdf de la submission: el PDF de su última versión
+    cambios = {}
+    if id_pdf is not None:
+        nueva_version["id_pdf"] = id_pdf
+        cambios["id_pdf"] = id_pdf
+
+    # Las submissions antiguas no tienen contador: se parte del mayor número de versión guardado
+    ultima_version = {"$ifNull": ["$ultima_version", {"$ifNull": [{"$max": "$versiones.numero"}, 0]}]}
+    doc = collection.find_one_and_update(
+        {"titulo": titulo, "id_user": id_user},
+        [
+            {"$set": {"ultima_version": {"$add": [ultima_version, 1]}, **cambios}},
+            {"$set": {"versiones": {"$concatArrays": [
+                {"$ifNull": ["$versiones", []]},
+                [nueva_version]
+            ]}}}
+        ],
+        projection={"id_sub": 1, "id_user": 1, "id_pdf": 1, "titulo": 1, "versiones": {"$slice": -1}},
+        return_document=ReturnDocument.AFTER
+    )
+    invalidar_usuario(id_user)
+
+    if not doc:
+        print("No se encontró la submission para añadir la versión.")
+        return None
+
+    doc["_id"] = str(doc["_id"])
+    return doc
+
+# Última versión de una submission (con sus respuestas y huellas), None si no existe
+def buscar_ultima_version(titulo, user):
+    collection = connect_bd()
+    doc = collection.find_one({"titulo": titulo, "id_user": user}, {"versiones": {"$slice": -1}, "_id": 0})
+    if doc and doc.get("versiones"):
+        return doc["versiones"][0]
+    return None
+
+# Buscar un documento en la bd por título y usuario
+def buscar_en_bd(titulo, user):
+    collection = connect_bd()
+    doc = collection.find_one({"titulo": titulo, "id_user": user})
+
+    if doc:
+        print("buscar_en_bd: encontrado", doc)
+        print("Tipo:", type(doc))
+        return json.dumps(doc, indent=4, default=str)  # Convertir ObjectId a str
+    else:
+        return None
+
+# Buscar todos los títulos de las submissions de un usuario (en caché hasta que el usuario escribe).
+# Solo para listarlos: para comprobar si existe una submission se usa comprobar_existencia_submision
+def buscar_titulos_bd(user):
+    def cargar():
+        collection = connect_bd()
+        return collection.distinct("titulo", {"id_user": user})
+    return leer_usuario(user, "titulos", cargar)
+
+# Historial de un usuario en una sola agregación: página de sus submissions (por título) con solo el número y la
+# fecha de cada versión, sin las respuestas. Devuelve (submissions, total de submissions).
+# Cada página queda en caché hasta que el usuario escribe (ver user_cache.py)
+def buscar_historial_bd(user, pagina=1, por_pagina=20):
+    submisiones, total = leer_usuario(
+        user, f"historial:{pagina}:{por_pagina}", lambda: list(_historial_bd(user, pagina, por_pagina))
+    )
+    return submisiones, total
+
+def _historial_bd(user, pagina, por_pagina):
+    collection = connect_bd()
+    resultado = list(collection.aggregate([
+        {"$match": {"id_user": user}},
+        {"$sort": {"titulo": 1}},
+        {"$facet": {
+            "total": [{"$count": "n"}],
+            "submisiones": [
+                {"$skip": (pagina - 1) * por_pagina},
+                {"$limit": por_pagina},
+                {"$project": {
+                    "_id": 0,
+                    "titulo": 1,
+                    "id_pdf": 1,
+                    "versiones": {"$map": {
+                        "input": {"$ifNull": ["$versiones", []]},
+                        "as": "v",
+                        "in": {"numero": "$$v.numero", "fecha": "$$v.fecha"}
+                    }}
+                }}
+            ]
+        }}
+    ]))
+    if not resultado:
+        return [], 0
+    total = resultado[0]["total"][0]["n"] if resultado[0]["total"] else 0
+    return resultado[0]["submisiones"], total
+
+# Función recursiva que se encarga de parsear de ObjectId a str 
+def convertir_objectids(obj):
+    if isinstance(obj, dict):
+        return {k: convertir_objectids(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [convertir_objectids(i) for i in obj]
+    elif isinstance(obj, ObjectId):
+        return str(obj)
+    else:
+        return obj
+
+# Extraer la información de una versión específica 
+def buscar_version_bd(titulo, user, version_num):
+    coleccion = connect_bd()
+    doc = coleccion.find_one(
+        {"titulo": titulo, "id_user": user},
+        {
+            "id_sub": 1,
+            "id_user": 1,
+            "id_pdf": 1,
+            "titulo": 1,
+            "versiones": {"$elemMatch": {"numero": version_num}}
+        }
+    )
+
+    if not doc:
+        print("No se encontró el documento o la versión.")
+        return None
+    
+    doc["_id"] = str(doc["_id"]) 
+    return doc
@@ -1,10 +1,15 @@
 import pytest
-from selenium import webdriver
+
+# Las pruebas unitarias (test_*.py salvo test_e2e.py) importan los módulos de la aplicación, que leen
+# properties.txt al importarse: se ejecutan desde la raíz del proyecto, como los benchmarks
+# (basta una copia de properties_ej.txt), y no necesitan Selenium ni la aplicación arrancada
 
 #   Esta fixture inicializa Microsoft Edge con tiempos de espera largos
 #   para soportar la lentitud del modelo de IA.
 @pytest.fixture(scope="function")
 def driver():
+    from selenium import webdriver
+
     options = webdriver.EdgeOptions()
     options.add_argument("--headless") 
 
@@ -22,4 +27,15 @@ def driver():
     
     yield driver
     
-    driver.quit()
\ No newline at end of file
+    driver.quit()
+
+
+#   Base de datos en memoria (mongomock, ver benchmarks/mongo_memoria.py) para las pruebas unitarias
+@pytest.fixture(scope="function")
+def bd_memoria(monkeypatch):
+    import database
+    from benchmarks.mongo_memoria import ClienteMemoria
+
+    cliente = ClienteMemoria()
+    monkeypatch.setattr(database, "_client", cliente)
+    yield cliente
@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+import pytest
+import bulk
+import jobs
+
+
+def _lote(run_id, estado, propietario, lease_hasta):
+    bulk.connect_lotes().insert_one({
+        "_id": run_id, "id_user": "a", "estado": estado, "items": [], "total": 0, "creado": datetime.now(),
+        "actualizado": datetime.now(), "propietario": propietario, "lease_hasta": lease_hasta
+    })
+
+
+def _sin_hilos(monkeypatch):
+    iniciados, registrados = [], []
+    monkeypatch.setattr(bulk, "iniciar_lote", lambda run_id, *a: iniciados.append(run_id))
+    monkeypatch.setattr(bulk, "registrar_concesiones", lambda *funciones: registrados.extend(funciones))
+    return iniciados, registrados
+
+
+# LOTE-01: un lote se reclama si es de este proceso y está en cola, o si su concesión caducó; nunca el de otro proceso vivo
+def test_reclamar_lote(bd_memoria):
+    pasado, futuro = datetime.now() - timedelta(minutes=1), datetime.now() + timedelta(minutes=1)
+    _lote("propio", bulk.ESTADO_EN_COLA, jobs.INSTANCE_ID, futuro)
+    _lote("vivo", bulk.ESTADO_EJECUTANDO, "otro:1", futuro)
+    _lote("en_cola_ajeno", bulk.ESTADO_EN_COLA, "otro:1", futuro)
+    _lote("muerto", bulk.ESTADO_EJECUTANDO, "otro:2", pasado)
+    _lote("antiguo", bulk.ESTADO_EN_COLA, None, None)
+    assert bulk._reclamar("vivo") is None
+    assert bulk._reclamar("en_cola_ajeno") is None
+    for run_id in ("propio", "muerto", "antiguo"):
+        lote = bulk._reclamar(run_id)
+        assert lote["estado"] == bulk.ESTADO_EJECUTANDO and lote["propietario"] == jobs.INSTANCE_ID
+        assert lote["lease_hasta"] > datetime.now()
+    assert bulk._reclamar("propio") is None
+
+
+# LOTE-02: al arrancar se retoman los lotes propios a medias y los caducados, y se registran la renovación y el barrido
+def test_recuperar_lotes(bd_memoria, monkeypatch):
+    iniciados, registrados = _sin_hilos(monkeypatch)
+    pasado, futuro = datetime.now() - timedelta(minutes=1), datetime.now() + timedelta(minutes=1)
+    _lote("propio", bulk.ESTADO_EJECUTANDO, jobs.INSTANCE_ID, futuro)
+    _lote("vivo", bulk.ESTADO_EJECUTANDO, "otro:1", futuro)
+    _lote("muerto", bulk.ESTADO_EJECUTANDO, "otro:2", pasado)
+    _lote("terminado", bulk.ESTADO_TERMINADO, "otro:2", pasado)
+    bulk.recuperar_lotes(None, None)
+    assert sorted(iniciados) == ["muerto", "propio"]
+    assert bulk.obtener_lote("propio")["estado"] == bulk.ESTADO_EN_COLA
+    assert len(registrados) == 2
+
+    # El barrido periódico retoma los lotes que caducan después
+    bulk.connect_lotes().update_one({"_id": "vivo"}, {"$set": {"lease_hasta": pasado}})
+    iniciados.clear()
+    registrados[1]()
+    assert sorted(iniciados) == ["muerto", "vivo"]
+
+
+# LOTE-03: un proceso solo renueva la concesión de sus lotes pendientes
+def test_renovar_concesiones_lotes(bd_memoria):
+    pasado = datetime.now() - timedelta(minutes=1)
+    _lote("propio", bulk.ESTADO_EJECUTANDO, jobs.INSTANCE_ID, pasado)
+    _lote("ajeno", bulk.ESTADO_EJECUTANDO, "otro:1", pasado)
+    _lote("terminado", bulk.ESTADO_TERMINADO, jobs.INSTANCE_ID, pasado)
+    bulk.renovar_concesiones_lotes()
+    assert bulk.obtener_lote("propio")["lease_hasta"] > datetime.now()
+    assert bulk.obtener_lote("ajeno")["lease_hasta"] < datetime.now()
+    assert bulk.obtener_lote("terminado")["lease_hasta"] < datetime.now()
+
+
+# LOTE-04: si un PDF del lote no es válido se rechaza el lote sin guardar ninguno
+def test_crear_lote_rechaza_pdf_invalido(bd_memoria, monkeypatch):
+    guardados = []
+    monkeypatch.setattr(bulk, "guardar_pdf", lambda pdf_bytes, nombre: guardados.append(nombre) or "hash")
+    with pytest.raises(ValueError):
+        bulk.crear_lote("a", [("uno.pdf", b"%PDF-1.4 ok"), ("dos.pdf", b"PK\x03\x04 zip")])
+    assert guardados == [] and bulk.connect_lotes().count_documents({}) == 0
@@ -0,0 +1,93 @@
+import json
+import pytest
+import torch
+from constrained_decoding import (
+    RESPUESTAS, ProcesadorJSON, plantilla_checklist, avanzar, automata_checklist
+)
+from benchmarks.modelo_minimo import crear_tokenizer
+
+CODIGOS = ["Q1.1", "Q2", "Q10"]
+
+
+@pytest.fixture(scope="module")
+def tokenizer():
+    return crear_tokenizer()
+
+
+# Decodificación voraz con logits aleatorios: sin la restricción la salida no tendría sentido
+def _generar(tokenizer, automatas, max_tokens, semilla=0):
+    generador = torch.Generator().manual_seed(semilla)
+    procesador = ProcesadorJSON(automatas, max_tokens)
+    filas = len(automatas)
+    prompt = torch.full((filas, 3), tokenizer.pad_token_id)
+    input_ids = prompt
+    terminadas = [False] * filas
+    for _ in range(max_tokens):
+        scores = torch.randn((filas, len(tokenizer)), generator=generador)
+        siguiente = procesador(input_ids, scores).argmax(dim=1)
+        siguiente = torch.where(torch.tensor(terminadas), tokenizer.pad_token_id, siguiente)
+        terminadas = [t or s == tokenizer.eos_token_id for t, s in zip(terminadas, siguiente.tolist())]
+        input_ids = torch.cat([input_ids, siguiente[:, None]], dim=1)
+        if all(terminadas):
+            break
+    return [tokenizer.decode(fila[prompt.shape[1]:], skip_special_tokens=True) for fila in input_ids]
+
+
+def _comprobar(salida, codigos):
+    datos = json.loads(salida)
+    assert list(datos) == codigos
+    for respuesta in datos.values():
+        assert respuesta["answer"] in RESPUESTAS
+        assert isinstance(respuesta["justification"], str)
+
+
+# JSON-01: la plantilla solo acepta textos que siguen el formato y termina al cerrar el objeto
+def test_plantilla_avanzar():
+    piezas = plantilla_checklist(["Q2"], 10)
+    valido = '{\n    "Q2": {\n        "answer": "N/A",\n        "justification": "Because."\n    }\n}'
+    assert avanzar(piezas, (0, 0), valido) == (len(piezas), 0)
+    assert avanzar(piezas, (0, 0), valido.replace("N/A", "Maybe")) is None
+    assert avanzar(piezas, (0, 0), valido.replace("Because.", "Far too long an answer")) is None
+
+
+# JSON-02: con logits aleatorios la salida restringida es siempre JSON válido con las preguntas pedidas
+def test_salida_restringida_es_json_valido(tokenizer):
+    automata = automata_checklist(tokenizer, CODIGOS, 40, [tokenizer.eos_token_id])
+    for semilla in range(3):
+        salida, = _generar(tokenizer, [automata], 400, semilla)
+        _comprobar(salida, CODIGOS)
+
+
+# JSON-03: con pocos tokens las justificaciones se cierran a tiempo para que el objeto quede completo
+def test_cierra_a_tiempo(tokenizer):
+    automata = automata_checklist(tokenizer, CODIGOS, 500, [tokenizer.eos_token_id])
+    max_tokens = automata.pendientes[0] + 5
+    salida, = _generar(tokenizer, [automata], max_tokens)
+    _comprobar(salida, CODIGOS)
+
+
+# JSON-04: cada fila del lote puede pedir preguntas distintas
+def test_automata_por_fila(tokenizer):
+    eos = [tokenizer.eos_token_id]
+    automatas = [automata_checklist(tokenizer, ["Q3"], 30, eos), automata_checklist(tokenizer, ["Q5", "Q6"], 30, eos)]
+    primera, segunda = _generar(tokenizer, automatas, 300)
+    _comprobar(primera, ["Q3"])
+    _comprobar(segunda, ["Q5", "Q6"])
+
+
+# JSON-05: el estado se deduce de los tokens recibidos, aunque vuelvan atrás (decodificación asistida)
+def test_estado_tras_volver_atras(tokenizer):
+    automata = automata_checklist(tokenizer, CODIGOS, 40, [tokenizer.eos_token_id])
+    texto = '{\n    "Q1.1": {\n        "answer": "Yes'
+    ids = tokenizer(texto, add_special_tokens=False).input_ids
+    prompt = [tokenizer.pad_token_id] * 3
+    scores = torch.zeros((1, len(tokenizer)))
+
+    procesador = ProcesadorJSON(automata)
+    procesador(torch.tensor([prompt]), scores)
+    procesador(torch.tensor([prompt + ids]), scores)
+    corto = procesador(torch.tensor([prompt + ids[:2]]), scores)
+
+    nuevo = ProcesadorJSON(automata)
+    nuevo(torch.tensor([prompt]), scores)
+    assert torch.equal(corto, nuevo(torch.tensor([prompt + ids[:2]]), scores))
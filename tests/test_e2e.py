@@ -73,6 +73,14 @@ def test_auth_orcid_redirection(driver):
     WebDriverWait(driver, 10).until(EC.url_contains("orcid.org"))
     assert "orcid.org" in driver.current_url
 
+# AUTH-07: Endpoints de salud disponibles sin login ni modelo cargado
+def test_auth_health_endpoints(driver):
+    driver.get(f"{BASE_URL}/health/live")
+    assert "alive" in driver.page_source
+
+    driver.get(f"{BASE_URL}/health/ready")
+    assert "phase" in driver.page_source
+
 # AUTH-03: Acceso al Dashboard (Requiere Login)
 def test_auth_dashboard_access(driver, login_simulado):
     driver.get(f"{BASE_URL}/dashboard")
@@ -174,6 +182,37 @@ def test_sub_duplicate_submission(driver, crear_pdf, login_simulado):
     texto_alerta = flash_msg.text.lower()
     assert "already exists" in texto_alerta
 
+# SUB-04: La subida se encola y la página de espera consulta el estado del trabajo (Requiere Login)
+def test_sub_job_queued(driver, crear_pdf, login_simulado):
+    driver.get(f"{BASE_URL}/nueva_submision")
+    driver.find_element(By.ID, "titulo").send_keys(generate_unique_title())
+    driver.find_element(By.ID, "file-input").send_keys(crear_pdf)
+    driver.find_element(By.ID, "analyze-btn").click()
+
+    # La respuesta es inmediata: página de espera con el id del trabajo
+    WebDriverWait(driver, 10).until(EC.url_contains("/trabajo/"))
+    job_url = driver.current_url.split("?")[0].rstrip("/")
+
+    # El endpoint de estado devuelve uno de los estados conocidos
+    driver.get(f"{job_url}/estado")
+    assert any(estado in driver.page_source for estado in ["queued", "running", "done"])
+
+# SUB-05: Revisión masiva, la subida crea un lote y la página de progreso consulta su estado (Requiere Login)
+def test_sub_bulk_upload(driver, crear_pdf, login_simulado):
+    driver.get(f"{BASE_URL}/bulk")
+    driver.find_element(By.ID, "file-input").send_keys(crear_pdf)
+    analyze_btn = WebDriverWait(driver, 5).until(
+        EC.visibility_of_element_located((By.ID, "analyze-btn"))
+    )
+    analyze_btn.click()
+
+    WebDriverWait(driver, 10).until(EC.url_contains("/bulk/"))
+    run_url = driver.current_url.split("?")[0].rstrip("/")
+    assert driver.find_elements(By.ID, "items")
+
+    driver.get(f"{run_url}/estado")
+    assert any(estado in driver.page_source for estado in ["queued", "running", "done"])
+
 # 3. PRUEBAS DE VERSIONADO (VER)
 
 # VER-01, VER-02, VER-03: Flujo de Nueva Versión (Requiere Login)
@@ -0,0 +1,55 @@
+from evidence import (
+    SEPARADOR_PASAJES, construir_indice, puntuar, dividir_en_pasajes, seleccionar_pasajes, seleccionar_evidencia,
+    estimar_tokens
+)
+
+RELLENO = "The weather in the city was mild and the streets were quiet during the whole afternoon."
+BONFERRONI = "We applied a Bonferroni correction to adjust for multiple comparisons across all tests."
+
+
+# Artículo largo: un pasaje de título, muchos de relleno y uno que responde a Q9 hacia la mitad
+def _articulo():
+    pasajes = ["A Study of Unit Testing. Abstract: we run an experiment."]
+    pasajes += [f"{RELLENO} Paragraph {i}." for i in range(60)]
+    pasajes.insert(30, BONFERRONI)
+    return "\n\n".join(pasajes)
+
+
+# EVI-01: BM25 puntúa más el pasaje con los términos de la consulta y nada los que no tienen ninguno
+def test_puntuar():
+    indice = construir_indice([RELLENO, BONFERRONI, "Multiple runs of the test."])
+    puntuaciones = puntuar(indice, "multiple comparisons Bonferroni correction")
+    assert puntuaciones[0] == 0
+    assert puntuaciones[1] > puntuaciones[2] > 0
+
+
+# EVI-02: los pasajes no parten líneas y se cierran en los saltos de párrafo
+def test_dividir_en_pasajes():
+    pasajes = dividir_en_pasajes(_articulo(), palabras_por_pasaje=10)
+    assert BONFERRONI in pasajes
+    assert all("\n" not in pasaje for pasaje in pasajes)
+
+
+# EVI-03: si el texto cabe en el presupuesto se envía completo
+def test_texto_que_cabe():
+    texto = "Short paper.\nWe applied a Bonferroni correction."
+    assert seleccionar_evidencia(texto, max_tokens=1000) == texto
+    assert seleccionar_evidencia(_articulo(), max_tokens=0) == _articulo()
+
+
+# EVI-04: con un presupuesto pequeño se envían el primer pasaje y los relevantes, marcando los huecos
+def test_seleccion_dentro_del_presupuesto():
+    seleccion = seleccionar_evidencia(_articulo(), max_tokens=200)
+    assert sum(estimar_tokens(partes) for partes in seleccion.split(SEPARADOR_PASAJES)) <= 200
+    assert seleccion.startswith("A Study of Unit Testing")
+    assert BONFERRONI in seleccion
+    assert SEPARADOR_PASAJES in seleccion
+
+
+# EVI-05: con codigos solo cuentan esas preguntas y cada una lleva sus pasajes
+def test_seleccion_por_preguntas():
+    pasajes = dividir_en_pasajes(_articulo())
+    elegidos, evidencias = seleccionar_pasajes(pasajes, 10_000, codigos=["Q9"])
+    assert list(evidencias) == ["Q9"]
+    assert BONFERRONI in pasajes[evidencias["Q9"][0]]
+    assert elegidos == list(range(len(pasajes)))
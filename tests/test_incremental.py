@@ -0,0 +1,87 @@
+import pytest
+import incremental
+from incremental import calcular_huellas, preguntas_a_revisar, combinar_respuestas, dividir_en_secciones
+from prompts import CHECKLIST
+
+RESULTADOS = "Table 2 reports means and standard deviations. The difference was significant with p < 0.05."
+
+
+def _articulo(resultados=RESULTADOS):
+    return "\n".join([
+        "A Study of Unit Testing", "Jane Doe", "Abstract",
+        "We study unit testing with students in a controlled experiment.",
+        "1 Introduction", "Unit testing is important. This paper reports a controlled experiment.",
+        "2 Hypotheses",
+        "The null hypothesis H0 states there is no difference. The alternative hypothesis H1 states a difference.",
+        "3 Experimental Design",
+        "Subjects were randomly assigned to treatment and control groups. A power analysis gave the sample size.",
+        "4 Analysis", "We fitted a linear mixed model. Normality was checked with Shapiro-Wilk and Levene tests.",
+        "5 Results", resultados,
+        "6 Conclusion", "Testing matters."
+    ])
+
+
+def _anterior(texto):
+    return {
+        "huellas": calcular_huellas(texto),
+        "preguntas_respuestas": {codigo: {"answer": "Yes", "justification": "."} for codigo in CHECKLIST}
+    }
+
+
+@pytest.fixture(autouse=True)
+def revision_incremental(monkeypatch):
+    monkeypatch.setattr(incremental, "INCREMENTAL_REVIEW", True)
+
+
+# INC-01: las secciones se reconocen por sus títulos; sin títulos se usan los pasajes
+def test_dividir_en_secciones():
+    titulos = [titulo for titulo, _ in dividir_en_secciones(_articulo())]
+    assert titulos == ["", "Abstract", "1 Introduction", "2 Hypotheses", "3 Experimental Design",
+                       "4 Analysis", "5 Results", "6 Conclusion"]
+    assert dividir_en_secciones("solo una linea sin titulos") == [("#1", "solo una linea sin titulos")]
+
+
+# INC-02: la misma versión (con otros saltos de línea y espacios) no vuelve a preguntar nada
+def test_misma_version_no_revisa_nada():
+    texto = _articulo()
+    reextraido = texto.replace("Unit testing is important. ", "Unit testing   is\nimportant. ")
+    assert preguntas_a_revisar(calcular_huellas(reextraido), _anterior(texto)) == []
+
+
+# INC-03: al cambiar los resultados se revisan sus preguntas y no las del diseño experimental
+def test_cambio_de_seccion():
+    nuevo = _articulo("Bonferroni correction was applied for multiple comparisons. The p-value was 0.01.")
+    codigos = preguntas_a_revisar(calcular_huellas(nuevo), _anterior(_articulo()))
+    assert {"Q7", "Q9"} <= set(codigos)
+    assert "Q2" not in codigos and "Q4" not in codigos
+
+
+# INC-04: sin huellas comparables, con otra versión de huellas o con una revisión fallida se revisa todo
+def test_sin_huellas_comparables():
+    huellas = calcular_huellas(_articulo())
+    assert preguntas_a_revisar(huellas, None) == list(CHECKLIST)
+    assert preguntas_a_revisar(huellas, {"preguntas_respuestas": {}}) == list(CHECKLIST)
+    otra_version = _anterior(_articulo())
+    otra_version["huellas"]["version"] = "otra"
+    assert preguntas_a_revisar(huellas, otra_version) == list(CHECKLIST)
+    fallida = _anterior(_articulo())
+    fallida["preguntas_respuestas"] = {"error": "JSON inválido"}
+    assert preguntas_a_revisar(huellas, fallida) == list(CHECKLIST)
+
+
+# INC-05: una pregunta sin respuesta válida en la versión anterior se vuelve a preguntar
+def test_pregunta_sin_respuesta():
+    anterior = _anterior(_articulo())
+    del anterior["preguntas_respuestas"]["Q5"]
+    assert preguntas_a_revisar(calcular_huellas(_articulo()), anterior) == ["Q5"]
+
+
+# INC-06: las respuestas nuevas sustituyen a las previas solo en las preguntas revisadas
+def test_combinar_respuestas():
+    previas = {codigo: {"answer": "No", "justification": "previa"} for codigo in CHECKLIST}
+    nuevas = {"Q7": {"answer": "Yes", "justification": "nueva"}}
+    combinadas = combinar_respuestas(previas, nuevas, ["Q7"])
+    assert list(combinadas) == list(CHECKLIST)
+    assert combinadas["Q7"]["justification"] == "nueva"
+    assert combinadas["Q2"]["justification"] == "previa"
+    assert combinar_respuestas(previas, {"error": "x"}, ["Q7"]) == {"error": "x"}
@@ -0,0 +1,192 @@
+import time
+import threading
+from datetime import datetime, timedelta
+import pytest
+import jobs
+import pdf_extraction
+from jobs import ColaJusta
+
+
+def _cola(trabajos):
+    cola = ColaJusta()
+    for user, job_id in trabajos:
+        cola.poner(user, job_id)
+    return cola
+
+
+# COLA-01: los trabajos salen por turnos entre usuarios, en orden dentro de cada usuario
+def test_cola_reparte_por_turnos():
+    cola = _cola([("a", "a1"), ("a", "a2"), ("a", "a3"), ("b", "b1"), ("c", "c1"), ("c", "c2")])
+    assert [cola.sacar() for _ in range(6)] == ["a1", "b1", "c1", "a2", "c2", "a3"]
+    assert cola.tamano() == 0
+
+
+# COLA-02: la posición de cada trabajo coincide con el orden en que sale
+def test_cola_posicion_coincide_con_el_orden():
+    trabajos = [("a", "a1"), ("a", "a2"), ("a", "a3"), ("a", "a4"), ("b", "b1"), ("c", "c1"), ("c", "c2")]
+    cola = _cola(trabajos)
+    posiciones = {job_id: cola.posicion(job_id) for _, job_id in trabajos}
+    orden = [cola.sacar() for _ in trabajos]
+    assert all(orden[posiciones[job_id] - 1] == job_id for job_id in posiciones)
+    assert cola.posicion("a1") is None
+
+
+# COLA-03: un usuario que vuelve a subir después de vaciar su cola pasa al final de la ronda
+def test_cola_usuario_vuelve_al_final():
+    cola = _cola([("a", "a1"), ("b", "b1")])
+    assert cola.sacar() == "a1"
+    cola.poner("a", "a2")
+    assert [cola.sacar(), cola.sacar()] == ["b1", "a2"]
+
+
+# COLA-04: sacar espera a que haya un trabajo
+def test_cola_sacar_espera():
+    cola = ColaJusta()
+    sacados = []
+    hilo = threading.Thread(target=lambda: sacados.append(cola.sacar()))
+    hilo.start()
+    cola.poner("a", "a1")
+    hilo.join(timeout=5)
+    assert sacados == ["a1"]
+
+
+def _encolados(n):
+    desde = jobs.connect_jobs().count_documents({})
+    jobs.connect_jobs().insert_many([
+        {"_id": f"j{desde + i}", "tipo": "nueva_submision", "id_user": "a", "titulo": str(i),
+         "estado": jobs.ESTADO_EN_COLA, "creado": datetime.now()}
+        for i in range(n)
+    ])
+
+
+# COLA-05: admisión hasta el máximo de trabajos en cola, después la espera estimada para el Retry-After
+def test_admitir_trabajo(bd_memoria, monkeypatch):
+    monkeypatch.setattr(jobs, "MAX_QUEUED", 3)
+    monkeypatch.setattr(jobs, "_otros_pendientes", [])
+    monkeypatch.setitem(jobs._servicio, "segundos", 60.0)
+    _encolados(2)
+    assert jobs.admitir_trabajo() is None
+    _encolados(3)
+    espera = jobs.admitir_trabajo()
+    assert espera is not None and espera > 0
+    assert jobs.estado_cola()["llena"]
+
+
+# COLA-06: los PDFs pendientes de las revisiones masivas cuentan como trabajos en cola; con la cola vacía se admite
+# una revisión masiva más grande que el máximo
+def test_admitir_cuenta_otros_pendientes(bd_memoria, monkeypatch):
+    monkeypatch.setattr(jobs, "MAX_QUEUED", 3)
+    monkeypatch.setattr(jobs, "_otros_pendientes", [])
+    assert jobs.admitir_trabajo(10) is None
+    jobs.registrar_pendientes(lambda: 2)
+    assert jobs.admitir_trabajo() is None
+    assert jobs.admitir_trabajo(2) is not None
+
+
+# COLA-07: sin límite siempre se admite
+def test_admitir_sin_limite(bd_memoria, monkeypatch):
+    monkeypatch.setattr(jobs, "MAX_QUEUED", 0)
+    _encolados(5)
+    assert jobs.admitir_trabajo() is None
+
+
+# COLA-08: con workers, cada PDF de una revisión masiva espera su turno en la cola de su usuario
+# y se ejecuta en el hilo que lo pide, no en el worker
+def test_ejecutar_en_turno(monkeypatch):
+    cola = ColaJusta()
+    monkeypatch.setattr(jobs, "_cola", cola)
+    monkeypatch.setattr(jobs, "_workers", [object()])
+    cola.poner("b", "b1")
+    resultados = []
+    hilo = threading.Thread(
+        target=lambda: resultados.append(jobs.ejecutar_en_turno("a", lambda x: (x * 2, threading.current_thread().name), 21)),
+        name="bulk-item"
+    )
+    hilo.start()
+    while cola.tamano() < 2:
+        time.sleep(0.01)
+    assert cola.sacar() == "b1"
+    turno = cola.sacar()
+    time.sleep(0.05)
+    assert resultados == []
+    turno.set()
+    hilo.join(timeout=5)
+    assert resultados == [(42, "bulk-item")]
+
+
+def _trabajo(job_id, estado, propietario, lease_hasta):
+    jobs.connect_jobs().insert_one({
+        "_id": job_id, "tipo": "nueva_submision", "id_user": "a", "titulo": job_id, "estado": estado,
+        "creado": datetime.now(), "iniciado": datetime.now(), "propietario": propietario, "lease_hasta": lease_hasta
+    })
+
+
+# COLA-09: se recuperan los trabajos pendientes con la concesión caducada o sin concesión, no los de procesos vivos
+def test_recuperar_caducados(bd_memoria, monkeypatch):
+    monkeypatch.setattr(jobs, "_cola", ColaJusta())
+    pasado, futuro = datetime.now() - timedelta(minutes=1), datetime.now() + timedelta(minutes=1)
+    _trabajo("muerto", jobs.ESTADO_EJECUTANDO, "otro:1", pasado)
+    _trabajo("antiguo", jobs.ESTADO_EN_COLA, None, None)
+    _trabajo("vivo", jobs.ESTADO_EJECUTANDO, "otro:2", futuro)
+    _trabajo("terminado", jobs.ESTADO_TERMINADO, "otro:1", pasado)
+    assert jobs.recuperar_caducados() == 2
+    assert sorted([jobs._cola.sacar(), jobs._cola.sacar()]) == ["antiguo", "muerto"]
+    muerto = jobs.obtener_trabajo("muerto")
+    assert muerto["estado"] == jobs.ESTADO_EN_COLA and muerto["propietario"] == jobs.INSTANCE_ID
+    assert muerto["lease_hasta"] > datetime.now()
+    assert jobs.obtener_trabajo("vivo")["estado"] == jobs.ESTADO_EJECUTANDO
+    assert jobs.recuperar_caducados() == 0
+
+
+# COLA-10: al arrancar se vuelven a encolar los trabajos propios que quedaron a medias, no los de otros procesos vivos
+def test_recuperar_trabajos_propios(bd_memoria, monkeypatch):
+    monkeypatch.setattr(jobs, "_cola", ColaJusta())
+    futuro = datetime.now() + timedelta(minutes=1)
+    _trabajo("propio", jobs.ESTADO_EJECUTANDO, jobs.INSTANCE_ID, futuro)
+    _trabajo("ajeno", jobs.ESTADO_EJECUTANDO, "otro:2", futuro)
+    jobs.recuperar_trabajos()
+    assert jobs._cola.tamano() == 1 and jobs._cola.sacar() == "propio"
+    assert jobs.obtener_trabajo("propio")["estado"] == jobs.ESTADO_EN_COLA
+    assert jobs.obtener_trabajo("ajeno")["estado"] == jobs.ESTADO_EJECUTANDO
+
+
+# COLA-11: un proceso solo renueva la concesión de sus trabajos pendientes
+def test_renovar_concesiones(bd_memoria):
+    pasado = datetime.now() - timedelta(minutes=1)
+    _trabajo("propio", jobs.ESTADO_EN_COLA, jobs.INSTANCE_ID, pasado)
+    _trabajo("ajeno", jobs.ESTADO_EN_COLA, "otro:1", pasado)
+    jobs.renovar_concesiones()
+    assert jobs.obtener_trabajo("propio")["lease_hasta"] > datetime.now()
+    assert jobs.obtener_trabajo("ajeno")["lease_hasta"] < datetime.now()
+
+
+# COLA-12: los PDFs de una revisión masiva no ocupan workers: con un solo worker se ejecutan varios a la vez
+def test_turnos_no_ocupan_workers(bd_memoria, monkeypatch):
+    monkeypatch.setattr(jobs, "_cola", ColaJusta())
+    monkeypatch.setattr(jobs, "_workers", [object()])
+    threading.Thread(target=jobs._worker, args=(None,), daemon=True).start()
+    barrera = threading.Barrier(3, timeout=5)
+    resultados = []
+    hilos = [
+        threading.Thread(target=lambda: resultados.append(jobs.ejecutar_en_turno("a", barrera.wait)))
+        for _ in range(3)
+    ]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join(timeout=10)
+    assert sorted(resultados) == [0, 1, 2]
+
+
+# COLA-13: un PDF demasiado grande o que no es un PDF se rechaza antes de guardarlo
+def test_encolar_rechaza_pdf_invalido(bd_memoria, monkeypatch):
+    guardados = []
+    monkeypatch.setattr(jobs, "guardar_pdf", lambda pdf_bytes, nombre: guardados.append(nombre) or "hash")
+    monkeypatch.setattr(pdf_extraction, "PDF_MAX_BYTES", 100)
+    monkeypatch.setattr(jobs, "_cola", ColaJusta())
+    for pdf_bytes in (b"<html>no es un PDF</html>", b"%PDF-1.4" + b"0" * 200):
+        with pytest.raises(ValueError):
+            jobs.encolar_trabajo("nueva_submision", "a", "T1", pdf_bytes)
+    assert guardados == [] and jobs.connect_jobs().count_documents({}) == 0
+    jobs.encolar_trabajo("nueva_submision", "a", "T1", b"%PDF-1.4 ok")
+    assert guardados == ["T1.pdf"]
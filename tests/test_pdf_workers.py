@@ -0,0 +1,71 @@
+import os
+import sys
+import json
+import subprocess
+
+# Los procesos del pool de extracción de PDFs (pdf_extraction.py) se crean con "spawn", que vuelve a ejecutar
+# el módulo principal (app.py con python app.py) con el nombre __mp_main__, como runpy.run_path aquí.
+# Cada ejecución va en su propio intérprete con MongoDB en memoria y anota lo que se arranca al importar app.py
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CODIGO = """
+import sys, json, runpy
+import database, jobs, bulk
+from benchmarks.mongo_memoria import ClienteMemoria
+
+database._client = ClienteMemoria()
+arrancado = []
+jobs.iniciar_workers = lambda *a, **k: arrancado.append("iniciar_workers")
+bulk.recuperar_lotes = lambda *a, **k: arrancado.append("recuperar_lotes")
+database.asegurar_indices = lambda *a, **k: arrancado.append("asegurar_indices")
+if sys.argv[1] != "__mp_main__":
+    import model_loader
+    model_loader.load_model = lambda *a, **k: arrancado.append("load_model")
+    model_loader.iniciar_carga = lambda *a, **k: arrancado.append("iniciar_carga")
+
+runpy.run_path("app.py", run_name=sys.argv[1])
+pesados = [m for m in ("torch", "transformers", "model_utils", "model_loader", "inference_engine") if m in sys.modules]
+print(json.dumps({"arrancado": arrancado, "pesados": pesados}))
+"""
+
+
+def _arrancado_al_importar(nombre_modulo):
+    resultado = subprocess.run(
+        [sys.executable, "-c", CODIGO, nombre_modulo], cwd=RAIZ, capture_output=True, text=True, timeout=300
+    )
+    assert resultado.returncode == 0, resultado.stderr
+    return json.loads(resultado.stdout.strip().splitlines()[-1])
+
+
+# PDF-01: un proceso del pool no carga el modelo, no arranca workers ni recupera lotes
+def test_proceso_del_pool_no_carga_el_modelo():
+    assert _arrancado_al_importar("__mp_main__")["arrancado"] == []
+
+
+# PDF-03: un proceso del pool no importa torch ni transformers (arranca rápido y sin la memoria de esas librerías)
+def test_proceso_del_pool_no_importa_torch():
+    assert _arrancado_al_importar("__mp_main__")["pesados"] == []
+
+
+# PDF-02: importado por gunicorn (app:app) sí arranca el servicio: carga el modelo o, con servidor de modelo, los workers
+def test_proceso_principal_arranca_el_servicio():
+    arrancado = _arrancado_al_importar("app")["arrancado"]
+    assert "asegurar_indices" in arrancado
+    assert "iniciar_carga" in arrancado or "iniciar_workers" in arrancado
+
+
+# PDF-04: varios hilos que piden el pool a la vez reciben el mismo (no se crean pools de más)
+def test_pool_unico_con_varios_hilos(monkeypatch):
+    import threading
+    import pdf_extraction
+
+    monkeypatch.setattr(pdf_extraction, "_pool", None)
+    pools = []
+    hilos = [threading.Thread(target=lambda: pools.append(pdf_extraction._obtener_pool())) for _ in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert len({id(pool) for pool in pools}) == 1
+    pools[0].shutdown()
@@ -0,0 +1,52 @@
+import inference_engine
+import per_question
+from per_question import revisar_por_preguntas
+
+
+# PREG-01: solo se repiten las preguntas sin respuesta válida y los reintentos piden muestrear (reintento=True)
+def test_reintentos_muestrean(monkeypatch):
+    monkeypatch.setattr(per_question, "PER_QUESTION_RETRIES", 1)
+    llamadas = []
+
+    def generar_grupo(lista_messages, codigos_filas, max_tokens, callbacks, reintento=False):
+        llamadas.append(([codigos[0] for codigos in codigos_filas], reintento))
+        return [
+            {"error": "Invalid JSON output", "raw": ""} if codigos == ["Q2"] and not reintento
+            else {codigos[0]: {"answer": "Yes", "justification": "."}}
+            for codigos in codigos_filas
+        ]
+
+    resultado, fallidas = revisar_por_preguntas(generar_grupo, "Texto.", ["Q1.1", "Q2", "Q3"])
+    assert llamadas == [(["Q1.1", "Q2", "Q3"], False), (["Q2"], True)]
+    assert list(resultado) == ["Q1.1", "Q2", "Q3"] and fallidas == []
+
+
+class _Tokenizador:
+    def apply_chat_template(self, messages, tokenize=False, add_generation_prompt=True):
+        return "".join(mensaje["content"] for mensaje in messages)
+
+    def __call__(self, texto):
+        return type("Codificado", (), {"input_ids": [ord(c) for c in texto]})()
+
+
+# PREG-02: en un grupo con un prefijo común largo solo cuentan para batch_max_tokens los tokens de detrás del prefijo,
+# así las preguntas no se reparten en varios lotes que vuelven a procesar el artículo
+def test_grupo_cuenta_solo_el_sufijo(monkeypatch):
+    peticiones = []
+    monkeypatch.setattr(inference_engine, "_motor", object())
+    monkeypatch.setattr(inference_engine._pendientes, "put", lambda peticion: peticiones.append(peticion) or peticion["hecho"].set())
+    articulo = "x" * 5000
+    lista_messages = [[{"role": "user", "content": articulo + pregunta}] for pregunta in ("Q1.1", "Q2", "Q10")]
+    inference_engine.generar_grupo(_Tokenizador(), lista_messages, 10, codigos_filas=[["Q1.1"], ["Q2"], ["Q10"]])
+    peticion = peticiones[0]
+    assert peticion["num_tokens"] == 5004 and peticion["num_tokens_sufijo"] <= 4
+
+    lotes = []
+    monkeypatch.setattr(inference_engine, "BATCH_MAX_TOKENS", 6000)
+    monkeypatch.setattr(
+        inference_engine, "generate_outputs_batch",
+        lambda model, tokenizer, messages, max_tokens, **kwargs: lotes.append(len(messages)) or [{}] * len(messages)
+    )
+    peticion["hecho"].clear()
+    inference_engine._generar_grupo(None, None, peticion)
+    assert lotes == [3] and peticion["error"] is None
@@ -0,0 +1,22 @@
+import review_cache
+from review_cache import clave_cache, buscar_en_cache, guardar_en_cache
+
+
+# RCACHE-01: cambiar el backend de extracción o las páginas máximas cambia la clave
+def test_clave_incluye_extraccion(monkeypatch):
+    clave = clave_cache("abc", modo="full")
+    monkeypatch.setattr(review_cache, "PDF_BACKEND", "otro")
+    clave_backend = clave_cache("abc", modo="full")
+    monkeypatch.setattr(review_cache, "PDF_MAX_PAGES", 1)
+    clave_paginas = clave_cache("abc", modo="full")
+    assert len({clave, clave_backend, clave_paginas}) == 3
+
+
+# RCACHE-02: las huellas se guardan con la revisión y se devuelven en un acierto
+def test_huellas_en_cache(bd_memoria):
+    huellas = {"secciones": {"methods": "h1"}}
+    assert buscar_en_cache("k1") is None
+    guardar_en_cache("k1", "abc", {"Q1.1": {"answer": "Yes"}}, huellas)
+    assert buscar_en_cache("k1") == ({"Q1.1": {"answer": "Yes"}}, huellas)
+    guardar_en_cache("k2", "abc", {"Q1.1": {"answer": "No"}})
+    assert buscar_en_cache("k2") == ({"Q1.1": {"answer": "No"}}, None)
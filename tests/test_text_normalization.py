@@ -0,0 +1,79 @@
+from pdf_extraction import SALTO_PAGINA
+from text_normalization import (
+    PASOS, normalizar_texto, quitar_numeros_pagina, quitar_cabeceras, unir_guiones, quitar_afiliaciones,
+    quitar_referencias
+)
+
+CABECERA = "Proceedings of the Conference on Testing 2024"
+
+
+# Páginas con cabecera, cuerpo (con una frase que se repite en todas) y número de página al pie.
+# Las cabeceras y los números se buscan en las tres primeras y últimas líneas de cada página
+def _paginas(n=4):
+    return [
+        [CABECERA] + [f"Body line {k} of page {i}." for k in range(3)] + ["The difference was significant."]
+        + [f"Closing line {k} of page {i}." for k in range(3)] + [str(i + 1)]
+        for i in range(n)
+    ]
+
+
+# NORM-01: los números de página solo se quitan en los bordes de la página
+def test_numeros_pagina():
+    cuerpo = ["Body", "More body", "12", "Even more body", "Last body line"]
+    paginas = [["3", "Title", "Intro"] + cuerpo + ["Page 3 of 12"]]
+    assert quitar_numeros_pagina(paginas) == [["Title", "Intro"] + cuerpo]
+
+
+# NORM-02: se quitan las cabeceras repetidas en los bordes, no las frases repetidas del interior
+def test_cabeceras():
+    paginas = quitar_cabeceras(_paginas())
+    assert all(CABECERA not in lineas for lineas in paginas)
+    assert all("The difference was significant." in lineas for lineas in paginas)
+    # Con menos de tres páginas no se puede saber qué es cabecera
+    assert quitar_cabeceras(_paginas(2)) == _paginas(2)
+
+
+# NORM-03: las palabras partidas a final de línea se unen, los guiones de palabras compuestas no
+def test_guiones():
+    assert unir_guiones("statis-\ntical analysis") == "statistical analysis"
+    assert unir_guiones("a well-\nKnown result") == "a well-\nKnown result"
+
+
+# NORM-04: las afiliaciones solo se quitan antes del resumen
+def test_afiliaciones():
+    texto = "\n".join([
+        "A Study of Unit Testing", "Jane Doe", "Department of Computer Science, University of Madrid",
+        "jane@uni.es", "Abstract", "Students of the University of Madrid took part."
+    ])
+    assert quitar_afiliaciones(texto).split("\n") == [
+        "A Study of Unit Testing", "Jane Doe", "Abstract", "Students of the University of Madrid took part."
+    ]
+
+
+# NORM-05: la bibliografía se quita hasta el apéndice; un título de referencias al principio no cuenta
+def test_referencias():
+    cuerpo = [f"Body line {i}." for i in range(10)]
+    texto = "\n".join(cuerpo + ["References", "[1] A. Author. A paper. 2020.", "Appendix A", "Extra tables."])
+    assert quitar_referencias(texto).split("\n") == cuerpo + ["Appendix A", "Extra tables."]
+    al_principio = "\n".join(["References"] + cuerpo)
+    assert quitar_referencias(al_principio) == al_principio
+
+
+# NORM-06: normalizar_texto aplica los pasos por página y de texto e informa de lo quitado en cada uno
+def test_normalizar_texto():
+    texto = SALTO_PAGINA.join("\n".join(lineas) for lineas in _paginas())
+    normalizado, informe = normalizar_texto(texto, pasos=PASOS, contar_tokens=lambda t: len(t.split()))
+    assert CABECERA not in normalizado
+    assert not any(linea.isdigit() for linea in normalizado.split("\n"))
+    assert SALTO_PAGINA not in normalizado and normalizado.count("The difference was significant.") == 4
+    assert informe["pasos"]["headers"] > 0 and informe["pasos"]["page_numbers"] > 0
+    assert informe["caracteres_despues"] == len(normalizado) < informe["caracteres_antes"]
+    assert informe["tokens_despues"] < informe["tokens_antes"]
+
+
+# NORM-07: sin pasos solo se quitan los saltos de página
+def test_sin_pasos():
+    texto = SALTO_PAGINA.join("\n".join(lineas) for lineas in _paginas())
+    normalizado, informe = normalizar_texto(texto, pasos=[])
+    assert normalizado == texto.replace(SALTO_PAGINA, "\n")
+    assert informe["pasos"] == {}
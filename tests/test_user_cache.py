@@ -0,0 +1,86 @@
+import user_cache
+from user_cache import CacheMemoria
+
+
+def _leer(cache, user, clave, valor):
+    generacion = cache.generacion(user)
+    guardado = cache.leer(user, clave)
+    if guardado is None:
+        cache.poner(user, clave, valor, generacion)
+    return guardado
+
+
+# CACHE-01: lo guardado se devuelve como copia hasta que caduca
+def test_memoria_ttl(monkeypatch):
+    ahora = [1000.0]
+    monkeypatch.setattr(user_cache.time, "monotonic", lambda: ahora[0])
+    cache = CacheMemoria(ttl=10, max_usuarios=5)
+    assert _leer(cache, "a", "titulos", ["T1"]) is None
+    copia = cache.leer("a", "titulos")
+    assert copia == ["T1"]
+    copia.append("T2")
+    assert cache.leer("a", "titulos") == ["T1"]
+    ahora[0] += 11
+    assert cache.leer("a", "titulos") is None
+
+
+# CACHE-02: por encima del máximo se expulsa el usuario usado hace más tiempo
+def test_memoria_lru():
+    cache = CacheMemoria(ttl=60, max_usuarios=2)
+    _leer(cache, "a", "titulos", ["A"])
+    _leer(cache, "b", "titulos", ["B"])
+    assert cache.leer("a", "titulos") == ["A"]
+    _leer(cache, "c", "titulos", ["C"])
+    assert cache.leer("b", "titulos") is None
+    assert cache.leer("a", "titulos") == ["A"]
+    assert cache.leer("c", "titulos") == ["C"]
+
+
+# CACHE-03: invalidar olvida al usuario y lo que se leyó de la base de datos antes de invalidar no se guarda
+def test_memoria_invalidar():
+    cache = CacheMemoria(ttl=60, max_usuarios=5)
+    _leer(cache, "a", "titulos", ["viejo"])
+    generacion = cache.generacion("a")
+    cache.invalidar("a")
+    cache.poner("a", "titulos", ["leido antes de invalidar"], generacion)
+    assert cache.leer("a", "titulos") is None
+
+
+# CACHE-04: leer_usuario solo consulta la base de datos en el primer acceso y tras invalidar
+def test_leer_usuario(monkeypatch):
+    monkeypatch.setattr(user_cache, "_cache", CacheMemoria(ttl=60, max_usuarios=5))
+    consultas = []
+
+    def cargar():
+        consultas.append(1)
+        return {"titulos": ["T1"]}
+
+    for _ in range(3):
+        assert user_cache.leer_usuario("a", "titulos", cargar) == {"titulos": ["T1"]}
+    assert len(consultas) == 1
+    user_cache.invalidar_usuario("a")
+    user_cache.leer_usuario("a", "titulos", cargar)
+    assert len(consultas) == 2
+
+
+# CACHE-05: sin caché se consulta siempre la base de datos
+def test_sin_cache(monkeypatch):
+    monkeypatch.setattr(user_cache, "_cache", None)
+    consultas = []
+    for _ in range(2):
+        user_cache.leer_usuario("a", "titulos", lambda: consultas.append(1) or ["T1"])
+    user_cache.invalidar_usuario("a")
+    assert len(consultas) == 2
+
+
+# CACHE-06: comprobar si existe una submission no usa la caché: ve las que crea otro proceso (sin invalidar la de este)
+def test_existencia_sin_cache(bd_memoria, monkeypatch):
+    import submissions
+    from database import connect_bd
+
+    monkeypatch.setattr(user_cache, "_cache", CacheMemoria(ttl=60, max_usuarios=5))
+    assert submissions.buscar_titulos_bd("a") == []
+    connect_bd().insert_one({"id_user": "a", "titulo": "T1"})
+    assert submissions.buscar_titulos_bd("a") == []
+    assert submissions.comprobar_existencia_submision("T1", "a")
+    assert not submissions.comprobar_existencia_submision("T2", "a")
@@ -0,0 +1,177 @@
+import re
+import math
+import hashlib
+import logging
+import configparser
+from collections import Counter
+from metrics import Contador, anotar
+from pdf_extraction import SALTO_PAGINA
+
+# Normalización del texto extraído antes de construir el prompt: quita lo que el checklist nunca necesita
+# (números de página, cabeceras y pies repetidos en cada página, guiones de partición de palabras, afiliaciones
+# de los autores y la bibliografía), que suele ser una parte importante de los tokens del prefill.
+# Las páginas llegan separadas por SALTO_PAGINA (ver pdf_extraction.py); sin él se omiten los pasos por página
+
+# Cargamos configuraciones para leer properties.txt
+config = configparser.ConfigParser()
+config.read("properties.txt")
+
+# Pasos disponibles, se aplican en este orden
+PASOS = ("page_numbers", "headers", "hyphenation", "affiliations", "references")
+# Pasos activos separados por comas (vacío = no normalizar)
+NORMALIZE_STEPS = [
+    paso.strip() for paso in config.get("PDF", "pdf.normalize", fallback=",".join(PASOS)).split(",") if paso.strip()
+]
+
+# Las cabeceras y pies se buscan entre las primeras y últimas líneas de cada página y deben repetirse
+# en al menos esta fracción de las páginas
+LINEAS_BORDE = 3
+FRACCION_CABECERA = 0.4
+# Líneas del principio del artículo en las que se buscan afiliaciones si no se encuentra el resumen o la introducción,
+# y palabras máximas de una línea de afiliación (una frase larga con "university" es del cuerpo del artículo)
+MAX_LINEAS_PORTADA = 40
+MAX_PALABRAS_AFILIACION = 15
+
+# Sube cuando cambian las reglas, así las revisiones en caché con otro texto no se reutilizan (ver review_cache.py)
+VERSION_REGLAS = 1
+VERSION_NORMALIZACION = hashlib.sha256(
+    f"{VERSION_REGLAS}|{','.join(p for p in PASOS if p in NORMALIZE_STEPS)}".encode("utf-8")
+).hexdigest()[:12]
+
+_NUMERO_PAGINA = re.compile(
+    r"^[\s\-–—]*(?:(?:page|p\.|pág\.|página)\s*)?\d{1,4}(?:\s*(?:of|/|de)\s*\d{1,4})?[\s\-–—]*$", re.IGNORECASE
+)
+_GUION_FIN_LINEA = re.compile(r"(?<=[A-Za-z])-\n[ \t]*(?=[a-z])")
+_INICIO_CUERPO = re.compile(r"^\s*(?:abstract\b|(?:\d{1,2}\.?|[IVX]{1,4}\.)?\s*introduction\s*:?$)", re.IGNORECASE)
+_AFILIACION = re.compile(
+    r"\S+@\S+\.[a-z]{2,}|\b(?:universit(?:y|ies|at|ät|é|à|e|a|dad)|department|dept\.|departamento|institut(?:e|o)?|"
+    r"school of|faculty of|facultad|laborator(?:y|ies)|college|polytechnic|research cent(?:er|re)|"
+    r"inc\.|gmbh|ltd\.?|corporation)\b|\b\d{4}-\d{4}-\d{4}-\d{3}[\dX]\b",
+    re.IGNORECASE
+)
+_REFERENCIAS = re.compile(
+    r"^\s*(?:\d{1,2}\.?|[IVX]{1,4}\.)?\s*(?:references|bibliography|literature cited|works cited|referencias)\s*:?\s*$",
+    re.IGNORECASE
+)
+_APENDICE = re.compile(r"^\s*(?:[A-Z]\.?\s+)?(?:appendix|appendices|supplementary material)\b", re.IGNORECASE)
+
+logger = logging.getLogger(__name__)
+
+_desconocidos = [paso for paso in NORMALIZE_STEPS if paso not in PASOS]
+if _desconocidos:
+    logger.warning(f"Pasos de normalización desconocidos en pdf.normalize: {_desconocidos}")
+
+CARACTERES_QUITADOS = Contador("text_normalization_chars_removed_total", "Characters removed from extracted text, by step")
+
+
+def _clave_linea(linea):
+    # Las cabeceras suelen llevar el número de página: se comparan sin los dígitos
+    return re.sub(r"\d+", "#", " ".join(linea.lower().split()))
+
+
+def _bordes(lineas):
+    indices = [i for i, linea in enumerate(lineas) if linea.strip()]
+    return set(indices[:LINEAS_BORDE] + indices[-LINEAS_BORDE:])
+
+
+# Números de página ("3", "- 3 -", "Page 3 of 12") en las primeras o últimas líneas de cada página
+def quitar_numeros_pagina(paginas):
+    return [
+        [linea for i, linea in enumerate(lineas) if not (i in _bordes(lineas) and _NUMERO_PAGINA.match(linea))]
+        for lineas in paginas
+    ]
+
+
+# Cabeceras y pies: líneas de los bordes de las páginas que se repiten en muchas páginas
+# y que nunca aparecen en el interior de una página (una frase repetida del cuerpo no es una cabecera)
+def quitar_cabeceras(paginas):
+    con_texto = [lineas for lineas in paginas if any(linea.strip() for linea in lineas)]
+    if len(con_texto) < 3:
+        return paginas
+    apariciones = Counter()
+    interior = set()
+    for lineas in con_texto:
+        bordes = _bordes(lineas)
+        apariciones.update({_clave_linea(lineas[i]) for i in bordes})
+        interior.update(_clave_linea(linea) for i, linea in enumerate(lineas) if i not in bordes)
+    minimo = max(2, math.ceil(FRACCION_CABECERA * len(con_texto)))
+    repetidas = {clave for clave, veces in apariciones.items() if veces >= minimo and clave and clave not in interior}
+    if not repetidas:
+        return paginas
+    return [
+        [linea for i, linea in enumerate(lineas) if not (i in _bordes(lineas) and _clave_linea(linea) in repetidas)]
+        for lineas in paginas
+    ]
+
+
+# Palabras partidas a final de línea ("statis-\ntical" -> "statistical")
+def unir_guiones(texto):
+    return _GUION_FIN_LINEA.sub("", texto)
+
+
+# Afiliaciones, correos y ORCID de los autores, solo antes del resumen o la introducción
+def quitar_afiliaciones(texto):
+    lineas = texto.split("\n")
+    fin = next((i for i, linea in enumerate(lineas) if _INICIO_CUERPO.match(linea)), None)
+    if fin is None:
+        fin = min(len(lineas), MAX_LINEAS_PORTADA)
+    portada = [
+        linea for linea in lineas[:fin]
+        if len(linea.split()) > MAX_PALABRAS_AFILIACION or not _AFILIACION.search(linea)
+    ]
+    return "\n".join(portada + lineas[fin:])
+
+
+# Bibliografía: desde el último título de referencias hasta el final o hasta un apéndice (que se conserva).
+# Un título de referencias en la primera mitad del texto no se tiene en cuenta
+def quitar_referencias(texto):
+    lineas = texto.split("\n")
+    inicio = next((i for i in range(len(lineas) - 1, -1, -1) if _REFERENCIAS.match(lineas[i])), None)
+    if inicio is None or inicio < len(lineas) // 2:
+        return texto
+    fin = next((i for i in range(inicio + 1, len(lineas)) if _APENDICE.match(lineas[i])), len(lineas))
+    return "\n".join(lineas[:inicio] + lineas[fin:])
+
+
+_PASOS_TEXTO = {
+    "hyphenation": unir_guiones,
+    "affiliations": quitar_afiliaciones,
+    "references": quitar_referencias
+}
+_PASOS_PAGINAS = {
+    "page_numbers": quitar_numeros_pagina,
+    "headers": quitar_cabeceras
+}
+
+
+# Normalizar el texto extraído de un PDF. Devuelve (texto, informe) con los caracteres quitados en cada paso
+# y, si se pasa contar_tokens, los tokens antes y después (también se anotan en el resumen de la revisión)
+def normalizar_texto(texto, pasos=None, contar_tokens=None):
+    pasos = NORMALIZE_STEPS if pasos is None else pasos
+    informe = {"caracteres_antes": len(texto), "pasos": {}}
+
+    paginas = [pagina.split("\n") for pagina in texto.split(SALTO_PAGINA)]
+    for paso in PASOS:
+        if paso in pasos and paso in _PASOS_PAGINAS:
+            antes = sum(len(linea) + 1 for lineas in paginas for linea in lineas)
+            paginas = _PASOS_PAGINAS[paso](paginas)
+            informe["pasos"][paso] = antes - sum(len(linea) + 1 for lineas in paginas for linea in lineas)
+    normalizado = "\n".join("\n".join(lineas).strip("\n") for lineas in paginas)
+
+    for paso in PASOS:
+        if paso in pasos and paso in _PASOS_TEXTO:
+            antes = len(normalizado)
+            normalizado = _PASOS_TEXTO[paso](normalizado)
+            informe["pasos"][paso] = antes - len(normalizado)
+    normalizado = normalizado.strip()
+
+    informe["caracteres_despues"] = len(normalizado)
+    for paso, caracteres in informe["pasos"].items():
+        CARACTERES_QUITADOS.inc(caracteres, step=paso)
+    if contar_tokens is not None:
+        informe["tokens_antes"] = contar_tokens(texto)
+        informe["tokens_despues"] = contar_tokens(normalizado)
+        anotar("tokens_texto_original", informe["tokens_antes"])
+        anotar("tokens_texto_normalizado", informe["tokens_despues"])
+        logger.info(f"Texto normalizado: {informe['tokens_antes']} -> {informe['tokens_despues']} tokens ({informe['pasos']})")
+    return normalizado, informe
@@ -0,0 +1,161 @@
+import copy
+import json
+import time
+import logging
+import threading
+import configparser
+from collections import OrderedDict
+from metrics import Contador
+
+# Caché de lectura de los datos de cada usuario que se consultan al navegar (títulos de sus submissions y páginas
+# del historial): solo cambian cuando ese mismo usuario sube algo, así que se guardan por orcid_id
+# y se invalidan en cuanto se escribe una submission o una versión suya (ver insertar_bd y subir_nueva_version).
+# Con "memory" la caché es de cada proceso; con varios procesos web (gunicorn) y workers en otros procesos
+# conviene "redis", compartida, para que la invalidación llegue a todos
+
+# Cargamos configuraciones para leer properties.txt
+config = configparser.ConfigParser()
+config.read("properties.txt")
+
+# Backend: "memory" (por defecto), "redis" o "none" (sin caché)
+USER_CACHE_BACKEND = config.get("CACHE", "cache.user_backend", fallback="memory").strip()
+# Segundos que vale una entrada y máximo de usuarios en memoria (se expulsan los usados hace más tiempo)
+USER_CACHE_TTL_SECONDS = config.getint("CACHE", "cache.user_ttl_seconds", fallback=300)
+USER_CACHE_MAX_USERS = config.getint("CACHE", "cache.user_max_users", fallback=1000)
+USER_CACHE_REDIS_URL = config.get("CACHE", "cache.redis_url", fallback="redis://localhost:6379/0")
+
+logger = logging.getLogger(__name__)
+
+CONSULTAS = Contador("user_cache_total", "Per-user cache lookups, by result")
+
+
+# Caché en memoria: {usuario: entrada} en orden de uso y {clave: (expira, valor)} en cada entrada.
+# La propia entrada es la generación: invalidar la quita, y lo que se leyó de la base de datos antes
+# de invalidar se guarda en la entrada vieja, que ya no se consulta
+class CacheMemoria:
+    def __init__(self, ttl, max_usuarios):
+        self.ttl = ttl
+        self.max_usuarios = max_usuarios
+        self.usuarios = OrderedDict()
+        self.lock = threading.Lock()
+
+    def generacion(self, user):
+        with self.lock:
+            entrada = self.usuarios.get(user)
+            if entrada is None:
+                entrada = self.usuarios[user] = {}
+                while len(self.usuarios) > self.max_usuarios:
+                    self.usuarios.popitem(last=False)
+            self.usuarios.move_to_end(user)
+            return entrada
+
+    def leer(self, user, clave):
+        with self.lock:
+            entrada = self.usuarios.get(user)
+            if entrada is None:
+                return None
+            self.usuarios.move_to_end(user)
+            guardado = entrada.get(clave)
+        if guardado is None or guardado[0] < time.monotonic():
+            return None
+        # Copia, así quien la use puede modificarla sin tocar la caché
+        return copy.deepcopy(guardado[1])
+
+    def poner(self, user, clave, valor, generacion):
+        with self.lock:
+            generacion[clave] = (time.monotonic() + self.ttl, copy.deepcopy(valor))
+
+    def invalidar(self, user):
+        with self.lock:
+            self.usuarios.pop(user, None)
+
+
+# Caché compartida en Redis: un hash por usuario con un JSON por clave, que caduca a los ttl segundos
+# (el límite de memoria y la expulsión LRU son los de Redis, maxmemory-policy allkeys-lru).
+# La generación es un contador que invalidar incrementa; solo se guarda lo leído si no ha cambiado
+class CacheRedis:
+    def __init__(self, url, ttl):
+        import redis
+        self.redis = redis
+        self.cliente = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def _claves(self, user):
+        return f"user_cache:{user}", f"user_cache:{user}:generacion"
+
+    def generacion(self, user):
+        return self.cliente.get(self._claves(user)[1])
+
+    def leer(self, user, clave):
+        valor = self.cliente.hget(self._claves(user)[0], clave)
+        return json.loads(valor) if valor is not None else None
+
+    def poner(self, user, clave, valor, generacion):
+        datos, clave_generacion = self._claves(user)
+        with self.cliente.pipeline() as tubo:
+            try:
+                tubo.watch(clave_generacion)
+                if tubo.get(clave_generacion) != generacion:
+                    return
+                tubo.multi()
+                tubo.hset(datos, clave, json.dumps(valor))
+                tubo.expire(datos, self.ttl)
+                tubo.execute()
+            except self.redis.WatchError:
+                pass
+
+    def invalidar(self, user):
+        datos, clave_generacion = self._claves(user)
+        with self.cliente.pipeline() as tubo:
+            tubo.incr(clave_generacion)
+            tubo.expire(clave_generacion, max(self.ttl, 3600))
+            tubo.delete(datos)
+            tubo.execute()
+
+
+def _crear_cache():
+    if USER_CACHE_BACKEND == "none" or USER_CACHE_TTL_SECONDS <= 0:
+        return None
+    if USER_CACHE_BACKEND == "redis":
+        return CacheRedis(USER_CACHE_REDIS_URL, USER_CACHE_TTL_SECONDS)
+    if USER_CACHE_BACKEND != "memory":
+        logger.warning(f"Backend de la caché de usuario desconocido: '{USER_CACHE_BACKEND}', se usa 'memory'")
+    return CacheMemoria(USER_CACHE_TTL_SECONDS, USER_CACHE_MAX_USERS)
+
+
+_cache = _crear_cache()
+
+
+# Valor de la caché para (user, clave); si no está, se obtiene con cargar() y se guarda.
+# Los valores deben poder guardarse como JSON (las tuplas vuelven como listas con redis)
+def leer_usuario(user, clave, cargar):
+    if _cache is None:
+        return cargar()
+    try:
+        valor = _cache.leer(user, clave)
+        if valor is not None:
+            CONSULTAS.inc(result="hit")
+            return valor
+        generacion = _cache.generacion(user)
+    except Exception as e:
+        # Si la caché compartida no responde se sigue con la base de datos
+        logger.warning(f"Error leyendo la caché de usuario: {e}")
+        CONSULTAS.inc(result="error")
+        return cargar()
+    CONSULTAS.inc(result="miss")
+    valor = cargar()
+    try:
+        _cache.poner(user, clave, valor, generacion)
+    except Exception as e:
+        logger.warning(f"Error guardando en la caché de usuario: {e}")
+    return valor
+
+
+# Olvidar todo lo guardado de un usuario, se llama después de cada escritura suya
+def invalidar_usuario(user):
+    if _cache is None:
+        return
+    try:
+        _cache.invalidar(user)
+    except Exception as e:
+        logger.error(f"Error invalidando la caché del usuario {user}: {e}")